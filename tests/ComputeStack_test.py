@@ -0,0 +1,171 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from tolstack.compute_stack import (
+    BATCH_ERROR,
+    BATCH_FAIL,
+    BATCH_RESULTS_SUFFIX,
+    BATCH_TEXT_SUFFIX,
+    expand_batch,
+    format_batch_table,
+    get_batch_output_name,
+    parse_info,
+    process_batch,
+)
+from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.GUITypes import OptionsWidget
+from tolstack.StackExport import read_records
+from tolstack.StackTypes import ExportType
+
+OPTIONS = dict(
+    print_usage=False,
+    conduct_sensitivity_analysis=False,
+    conduct_tolerance_contribution=True,
+    seed=5,
+)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        os.mkdir(os.path.join(self.root, "sub"))
+
+        self.good = os.path.join(self.root, "a.txt")
+        self.nested = os.path.join(self.root, "sub", "b.txt")
+        self.bad = os.path.join(self.root, "bad.txt")
+        shutil.copy("validation_inputs/test_input_v4.txt", self.good)
+        shutil.copy("validation_inputs/test_input_v4.txt", self.nested)
+        with open(self.bad, "w", encoding="utf-8") as file:
+            file.write("not an analysis\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expandBatch(self):
+        # outputs of earlier runs are not inputs
+        open(get_batch_output_name(self.good, BATCH_TEXT_SUFFIX), "w").close()
+
+        pattern = os.path.join(self.root, "**", "*.txt")
+        self.assertEqual(
+            expand_batch([self.nested, pattern]), [self.nested, self.good, self.bad]
+        )
+
+        # list files are relative to their directory, and missing files are kept as errors
+        list_file = os.path.join(self.root, "batch.lst")
+        with open(list_file, "w", encoding="utf-8") as file:
+            file.write("# inputs\nsub/*.txt\n\nmissing.txt\n")
+        self.assertEqual(
+            expand_batch(list_file=list_file),
+            [self.nested, os.path.join(self.root, "missing.txt")],
+        )
+
+    def test_processBatch(self):
+        rows = process_batch(
+            [self.good, self.bad], OPTIONS, use_cache=False, write_pdf=False, jobs=1
+        )
+
+        self.assertEqual([row["result"] for row in rows], [BATCH_FAIL, BATCH_ERROR])
+        self.assertEqual(rows[0]["failed"], ["E2", "E3", "E6"])
+        self.assertIsNone(rows[0]["error"])
+        self.assertIsNotNone(rows[1]["error"])
+
+        self.assertTrue(
+            os.path.exists(get_batch_output_name(self.good, BATCH_TEXT_SUFFIX))
+        )
+        with open(get_batch_output_name(self.good, BATCH_RESULTS_SUFFIX)) as file:
+            records = list(read_records(file, ExportType.JSON_LINES))
+        self.assertEqual(records, rows[0]["records"])
+        self.assertEqual(len(records), rows[0]["expressions"])
+        self.assertEqual(records[0]["seed"], 5)
+        self.assertFalse(
+            os.path.exists(get_batch_output_name(self.bad, BATCH_RESULTS_SUFFIX))
+        )
+
+        # exports of the whole batch hold the records of every file that was processed
+        export = os.path.join(self.root, "batch.csv")
+        process_batch(
+            [self.good, self.bad],
+            OPTIONS,
+            use_cache=False,
+            write_pdf=False,
+            jobs=1,
+            exports=[(export, ExportType.CSV)],
+        )
+        with open(export, newline="") as file:
+            self.assertEqual(
+                len(list(read_records(file, ExportType.CSV))), len(records)
+            )
+
+        lines = format_batch_table(rows)
+        self.assertEqual(len(lines), len(rows) + 3)
+        self.assertIn("1 out of bounds", lines[-1])
+
+        lines = format_batch_table(rows, "cache")
+        self.assertEqual(lines[-1], "Results cached in cache.")
+
+    def test_processBatchPool(self):
+        files = [self.good, self.nested, self.bad]
+        serial = process_batch(files, OPTIONS, False, write_pdf=False, jobs=1)
+        pooled = process_batch(files, OPTIONS, False, write_pdf=False, jobs=2)
+
+        for first, second in zip(serial, pooled):
+            self.assertEqual(first["file"], second["file"])
+            self.assertEqual(first["result"], second["result"])
+            self.assertEqual(first["failed"], second["failed"])
+
+
+class TestParseInfo(unittest.TestCase):
+    def test_precision(self):
+        info = open_from_name("validation_inputs/test_input_v4.txt")
+        SP = parse_info(info)
+        self.assertFalse(SP.adaptive)
+        self.assertIsNone(SP.rtol)
+
+        info[OptionsWidget.PRECISION] = "0.02"
+        SP = parse_info(info, parser=SP)
+        self.assertTrue(SP.adaptive)
+        for E in SP.expressions.values():
+            self.assertEqual(E.rtol, 0.02)
+
+        for text in ("0", "-1", "fine"):
+            with self.subTest(text=text):
+                info[OptionsWidget.PRECISION] = text
+                with self.assertRaises(ValueError):
+                    parse_info(info)
+
+
+class TestCommandLine(unittest.TestCase):
+    def test_missingInput(self):
+        process = subprocess.run(
+            [sys.executable, "-m", "tolstack.compute_stack"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("a filename or --batch is required", process.stderr)
+
+    def test_batchSingleFileOptions(self):
+        for args, message in (
+            (["input.txt"], "a filename cannot be given with --batch"),
+            (["--manifest", "run.json"], "--manifest cannot be used with --batch"),
+            (["--samples", "samples.npz"], "--samples cannot be used with --batch"),
+        ):
+            with self.subTest(args=args):
+                process = subprocess.run(
+                    [sys.executable, "-m", "tolstack.compute_stack"]
+                    + args
+                    + ["--batch", "*.txt"],
+                    capture_output=True,
+                    text=True,
+                )
+                self.assertEqual(process.returncode, 2)
+                self.assertIn(message, process.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
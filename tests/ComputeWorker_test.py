@@ -0,0 +1,152 @@
+import unittest
+
+from PyQt5.QtWidgets import QApplication
+
+from tolstack.compute_stack import process_info
+from tolstack.gui.ComputeWorker import ComputeWorker
+from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.GUITypes import DataWidget, OptionsWidget
+from tolstack.gui.gui import MainWindow
+
+
+def load_info():
+    info = open_from_name("validation_inputs/test_input_v4.txt")
+    info[OptionsWidget.SEED] = "5"
+    info[OptionsWidget.CONTRIBUTIONS] = True
+    info["SAVE_FILE"] = "validation_inputs/test_input_v4.txt"
+    return info
+
+
+class TestComputeWorker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def run_worker(self, worker, on_block=None):
+        results = {"blocks": [], "progress": [], "signals": []}
+        worker.block_ready.connect(lambda lines: results["blocks"].append(lines))
+        worker.progress.connect(lambda *p: results["progress"].append(p))
+        worker.succeeded.connect(lambda _: results["signals"].append("succeeded"))
+        worker.cancelled.connect(lambda _: results["signals"].append("cancelled"))
+        worker.failed.connect(lambda e: results["signals"].append(e))
+        if on_block is not None:
+            worker.block_ready.connect(on_block)
+
+        worker.start()
+        while not worker.wait(10):
+            self.app.processEvents()
+        self.app.processEvents()
+        return results
+
+    def test_streamedBlocks(self):
+        info = load_info()
+        results = self.run_worker(ComputeWorker(info))
+
+        self.assertEqual(results["signals"], ["succeeded"])
+        lines = [line for block in results["blocks"] for line in block]
+        self.assertEqual(lines, process_info(info)[0])
+
+        n = len(results["blocks"]) - 1
+        self.assertEqual(results["progress"], [(i, n) for i in range(n + 1)])
+
+    def test_reuseResults(self):
+        info = load_info()
+        worker = ComputeWorker(info)
+        emitted = []
+        worker.succeeded.connect(emitted.append)
+        results = self.run_worker(worker)
+
+        # formatting the same results again computes nothing
+        reused = ComputeWorker(info, results=emitted[0])
+        reused.succeeded.connect(emitted.append)
+        again = self.run_worker(reused)
+        self.assertIs(emitted[1], emitted[0])
+        self.assertEqual(again["blocks"], results["blocks"])
+
+    def test_cancel(self):
+        worker = ComputeWorker(load_info())
+        results = self.run_worker(
+            worker, on_block=lambda lines: worker.requestInterruption()
+        )
+
+        self.assertEqual(results["signals"], ["cancelled"])
+        self.assertLess(results["progress"][-1][0], results["progress"][-1][1])
+
+    def test_failed(self):
+        info = load_info()
+        info[OptionsWidget.SEED] = "seed"
+        results = self.run_worker(ComputeWorker(info))
+
+        self.assertEqual(len(results["signals"]), 1)
+        self.assertIsInstance(results["signals"][0], ValueError)
+
+
+class TestMainWindowComputation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def wait(self, window):
+        while window.worker is not None:
+            window.worker.wait(10)
+            self.app.processEvents()
+
+    def test_updateResults(self):
+        window = MainWindow()
+        window.result_cache = None
+        info = load_info()
+        window.set_analysis_information(info)
+        window.widgets[OptionsWidget.SEED].setText("5")
+        window.widgets[OptionsWidget.CONTRIBUTIONS].setChecked(True)
+
+        window.update_results()
+        self.assertFalse(window.progress_bar.isHidden())
+        self.wait(window)
+
+        info = window.get_analysis_information()
+        expected = "\n".join(process_info(info)[0])
+        self.assertEqual(window.text_edit.toPlainText(), expected)
+        self.assertIsNotNone(window.parser)
+        self.assertEqual(window.manifest["seed"], 5)
+        self.assertTrue(window.progress_bar.isHidden())
+
+    def test_revertedInputs(self):
+        window = MainWindow()
+        window.result_cache = None
+        info = load_info()
+
+        window.start_computation(info)
+        self.wait(window)
+
+        # a cancelled run still updates the live parser, so reverting its edit computes the
+        # results again rather than showing the earlier ones with the edited dimensions
+        edited = load_info()
+        edited[DataWidget.DIMENSIONS][0][2] = "9.9"
+        window.start_computation(edited)
+        window.cancel_computation()
+        self.wait(window)
+        window.start_computation(info)
+        self.wait(window)
+
+        expected = "\n".join(process_info(info)[0])
+        self.assertEqual(window.text_edit.toPlainText(), expected)
+
+    def test_requestWhileBusy(self):
+        window = MainWindow()
+        window.result_cache = None
+        window.set_analysis_information(load_info())
+
+        window.update_results()
+        first = window.worker
+        window.update_results()
+
+        # the running update is interrupted, and the latest request runs after it
+        self.assertIs(window.worker, first)
+        self.assertIsNotNone(window.pending_computation)
+        self.wait(window)
+        self.assertIsNone(window.pending_computation)
+        self.assertIsNotNone(window.manifest)
+
+
+if __name__ == "__main__":
+    unittest.main()
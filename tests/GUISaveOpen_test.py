@@ -61,7 +61,12 @@ class TestFileIOFunctions(unittest.TestCase):
             OptionsWidget.WHERE_USED: True,
             OptionsWidget.SENSITIVITY: False,
             OptionsWidget.CONTRIBUTIONS: True,
+            OptionsWidget.YIELD: True,
             OptionsWidget.SHOW_PLOTS: False,
+            OptionsWidget.SAMPLER: "sobol",
+            OptionsWidget.SEED: "1234",
+            OptionsWidget.ENGINE: "grid",
+            OptionsWidget.PRECISION: "0.02",
             OptionsWidget.IMAGE_FOLDER: "images",
             AnalysisWidget.TITLE: "Title",
             AnalysisWidget.DOCNO: "XXX-00000",
@@ -122,3 +127,82 @@ class TestFileIOFunctions(unittest.TestCase):
             self.assertEqual(self.dummy_info, loaded_info)
         finally:
             os.remove(tmp_filename)
+
+    def test_open_legacy_options(self):
+        # format 4.0 files have no sampling method in their options line
+        info = open_from_name("validation_inputs/test_input_v4.txt")
+
+        self.assertEqual(info[OptionsWidget.SAMPLER], "random")
+        self.assertEqual(info[OptionsWidget.MAX_IMG_HEIGHT], "3")
+        self.assertEqual(info[OptionsWidget.IMAGE_FOLDER], "images")
+        self.assertTrue(info[OptionsWidget.CONTRIBUTIONS])
+        self.assertFalse(info[OptionsWidget.YIELD])
+
+    def test_open_legacy_yield(self):
+        # format 5.0 files have no yield option in their options line
+        with NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp_file:
+            tmp_file.write("*VERSIONINFO, 0.8.7, 5.0\n")
+            tmp_file.write("*OPTIONS,False,False,True,False,True,mm,6,4,sobol,images\n")
+            tmp_filename = tmp_file.name
+
+        try:
+            info = open_from_name(tmp_filename)
+        finally:
+            os.remove(tmp_filename)
+
+        self.assertFalse(info[OptionsWidget.YIELD])
+        self.assertTrue(info[OptionsWidget.WHERE_USED])
+        self.assertTrue(info[OptionsWidget.CONTRIBUTIONS])
+        self.assertEqual(info[OptionsWidget.UNITS], "mm")
+        self.assertEqual(info[OptionsWidget.SAMPLER], "sobol")
+        self.assertEqual(info[OptionsWidget.SEED], "")
+
+    def test_open_legacy_engine(self):
+        # format 7.0 files have no evaluation engine in their options line
+        with NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp_file:
+            tmp_file.write("*VERSIONINFO, 0.8.7, 7.0\n")
+            tmp_file.write(
+                "*OPTIONS,False,False,False,False,False,True,mm,6,4,lhs,42,images\n"
+            )
+            tmp_filename = tmp_file.name
+
+        try:
+            info = open_from_name(tmp_filename)
+        finally:
+            os.remove(tmp_filename)
+
+        self.assertTrue(info[OptionsWidget.YIELD])
+        self.assertEqual(info[OptionsWidget.SAMPLER], "lhs")
+        self.assertEqual(info[OptionsWidget.SEED], "42")
+        self.assertEqual(info[OptionsWidget.ENGINE], "mc")
+        self.assertEqual(info[OptionsWidget.IMAGE_FOLDER], "images")
+
+    def test_open_legacy_precision(self):
+        # format 8.0 files have no adaptive precision in their options line
+        with NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp_file:
+            tmp_file.write("*VERSIONINFO, 0.8.7, 8.0\n")
+            tmp_file.write(
+                "*OPTIONS,False,False,False,False,False,True,mm,6,4,lhs,42,grid,images\n"
+            )
+            tmp_filename = tmp_file.name
+
+        try:
+            info = open_from_name(tmp_filename)
+        finally:
+            os.remove(tmp_filename)
+
+        self.assertEqual(info[OptionsWidget.ENGINE], "grid")
+        self.assertEqual(info[OptionsWidget.PRECISION], "")
+        self.assertEqual(info[OptionsWidget.IMAGE_FOLDER], "images")
+
+    def test_save_open_manifest(self):
+        manifest = {"seed": 2**100 + 1, "N": 250000, "sampler": "random"}
+        with NamedTemporaryFile(delete=False) as tmp_file:
+            tmp_filename = get_manifest_name(tmp_file.name)
+
+        try:
+            save_manifest(tmp_filename, manifest)
+            self.assertEqual(open_manifest(tmp_filename), manifest)
+        finally:
+            os.remove(tmp_filename)
+            os.remove(tmp_file.name)
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# Packages loaded on demand, for PDF output, plots, the GUI, or the sampling methods that need
+# them, which text runs of the core engine should not import
+DEFERRED_PACKAGES = {"scipy", "matplotlib", "reportlab", "PIL", "PyQt5"}
+
+# Budget for importing the core engine, beyond importing numpy, in microseconds. Importing it
+# takes under 0.1 s, against 0.3 s more for scipy.special and 1 s more for scipy.stats.
+CORE_IMPORT_BUDGET = 250_000
+
+
+def import_times(statement, runs=1):
+    """
+    Runs an import statement with python -X importtime in a fresh interpreter.
+
+    Returns:
+    dict[str, int]
+        The least cumulative import time of each module over the runs, in microseconds.
+    """
+    times = dict()
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            module = name.strip()
+            times[module] = min(times.get(module, sys.maxsize), int(cumulative))
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_deferredPackages(self):
+        for module in ("tolstack.StackParser", "tolstack.compute_stack"):
+            imported = {name.split(".")[0] for name in import_times(f"import {module}")}
+            self.assertFalse(imported & DEFERRED_PACKAGES, module)
+
+    def test_deferredPackagesRun(self):
+        # a text run with the pseudo-random sampler needs none of scipy.stats
+        statement = "; ".join(
+            [
+                "import sys",
+                "from tolstack.compute_stack import process_info",
+                "from tolstack.gui.FileIO import open_from_name",
+                "process_info(open_from_name('validation_inputs/test_input_v4.txt'))",
+                "print(','.join(sorted(sys.modules)))",
+            ]
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", statement],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertNotIn("scipy.stats", process.stdout.strip().split(","))
+
+    def test_coreImportTime(self):
+        times = import_times("import numpy; import tolstack.StackParser", runs=3)
+        self.assertLess(times["tolstack.StackParser"], CORE_IMPORT_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
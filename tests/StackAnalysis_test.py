@@ -0,0 +1,136 @@
+import unittest
+
+import numpy as np
+
+from tolstack.StackAnalysis import AnalysisResult, HISTOGRAM_BINS
+from tolstack.StackDim import SIGMA_LEVELS
+from tolstack.StackParser import StackParser
+from tolstack.StackTypes import EngineType
+
+DIMENSIONS = [
+    ["D1", "10", ".3", "-.3", "3S"],
+    ["D2", "5", ".1", "-.1", "U"],
+    ["D3", "2", ".2", "-.1", "2S"],
+]
+EXPRESSIONS = [
+    ["E1", "D1 / D2", "1.95", "2.05", "3S"],
+    ["E2", "D3 * 2", "", "", "W"],
+    ["E3", "D1 - D3", "7.5", "", "3S"],
+]
+
+
+class TestAnalysisResult(unittest.TestCase):
+    def setUp(self):
+        self.SP = StackParser(seed=3)
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=DIMENSIONS,
+            expressions_data=EXPRESSIONS,
+        )
+
+    def test_summaries(self):
+        results = AnalysisResult(self.SP).compute()
+        self.assertEqual(list(results.expressions), ["E1", "E2", "E3"])
+
+        for key, R in results.expressions.items():
+            E = self.SP.expressions[key]
+            value = E.evaluate()
+            self.assertIs(R.expr, E)
+            self.assertEqual(R.expansion, E.expand())
+            self.assertEqual(R.nom, value.nom)
+            self.assertEqual(R.center, value.center(E.method))
+            self.assertEqual(R.lower, value.lower(E.method))
+            self.assertEqual(R.upper, value.upper(E.method))
+            np.testing.assert_array_equal(
+                R.quantiles, [value.quantile(s) for s in SIGMA_LEVELS]
+            )
+
+    def test_bounds(self):
+        results = AnalysisResult(self.SP).compute()
+
+        # E1 spreads past its bounds, E2 has none, E3 clears its lower bound
+        E1 = results.expressions["E1"]
+        self.assertFalse(E1.lower_pass)
+        self.assertFalse(E1.upper_pass)
+        self.assertTrue(results.expressions["E2"].lower_pass)
+        self.assertTrue(results.expressions["E2"].upper_pass)
+        self.assertTrue(results.expressions["E3"].lower_pass)
+        self.assertTrue(results.expressions["E3"].upper_pass)
+
+    def test_analysesSelected(self):
+        R = AnalysisResult(self.SP).expression("E1")
+        self.assertIsNone(R.sensitivities)
+        self.assertIsNone(R.contributions)
+        self.assertIsNone(R.yield_estimate)
+        self.assertIsNone(R.histogram)
+
+        results = AnalysisResult(
+            self.SP,
+            sensitivity=True,
+            contributions=True,
+            yield_analysis=True,
+            histograms=True,
+        ).compute()
+        E = self.SP.expressions["E1"]
+        R = results.expressions["E1"]
+        self.assertEqual(R.sensitivities, E.sensitivities())
+        self.assertEqual(R.contributions, E.contributions())
+        self.assertEqual(R.yield_estimate.probability, E.estimate_yield().probability)
+
+        # no yield without bounds
+        self.assertIsNone(results.expressions["E2"].yield_estimate)
+
+    def test_histogram(self):
+        R = AnalysisResult(self.SP, histograms=True).expression("E1")
+        counts, edges = R.histogram
+        self.assertEqual(len(edges), HISTOGRAM_BINS + 1)
+        self.assertEqual(counts.sum(), R.value.dist().size)
+
+    def test_engine(self):
+        SP = StackParser(seed=3, engine=EngineType.CONVOLUTION)
+        SP.parse(
+            constants_data=[],
+            dimensions_data=DIMENSIONS,
+            expressions_data=EXPRESSIONS,
+        )
+        results = AnalysisResult(SP).compute()
+        self.assertEqual(SP.manifest()["engine"], str(EngineType.CONVOLUTION))
+
+        # linear statistical expressions are convolved, others fall back to Monte Carlo
+        E3 = results.expressions["E3"]
+        self.assertIs(E3.engine, EngineType.CONVOLUTION)
+        self.assertIsNone(E3.value.data)
+        self.assertEqual(len(E3.quantiles), len(SIGMA_LEVELS))
+        self.assertIs(results.expressions["E1"].engine, EngineType.MONTE_CARLO)
+        self.assertIs(results.expressions["E2"].engine, EngineType.MONTE_CARLO)
+
+    def test_adaptive(self):
+        N = {}
+        for rtol in (0.05, 0.005):
+            SP = StackParser(seed=3, rtol=rtol, adaptive=True)
+            SP.parse(
+                constants_data=[],
+                dimensions_data=DIMENSIONS,
+                expressions_data=EXPRESSIONS,
+            )
+            self.assertEqual(SP.expressions["E1"].rtol, rtol)
+            self.assertTrue(SP.manifest()["adaptive"])
+
+            # expressions draw their own samples until their limits converge
+            E1 = AnalysisResult(SP).expression("E1")
+            N[rtol] = E1.value.dist().size
+            self.assertNotEqual(N[rtol], SP.context.N)
+        self.assertLess(N[0.05], N[0.005])
+
+    def test_computeInOrder(self):
+        results = AnalysisResult(self.SP)
+        R = results.expression("E2")
+        self.assertEqual(list(results.expressions), ["E2"])
+
+        results.compute()
+        self.assertEqual(list(results.expressions), ["E1", "E2", "E3"])
+        self.assertIs(results.expressions["E2"], R)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+from scipy.stats import norm
+
+from tolstack.StackDim import StackDim, QUANTILE_LEVELS
+from tolstack.StackTypes import DistType
+from tolstack.StackConvolution import convolve_linear
+
+
+class TestConvolveLinear(unittest.TestCase):
+    def test_normal(self):
+        D1 = StackDim(10, 0.3, -0.3, DistType.NORMAL_3S)
+        D2 = StackDim(5, 0.4, -0.2, DistType.NORMAL_2S)
+
+        quantiles = convolve_linear(1, [(1, D1), (-2, D2)], QUANTILE_LEVELS)
+
+        # 1 + D1 - 2*D2 is normal with mean 1 + 10 - 2*5.1 and sigma sqrt(0.1^2 + (2*0.15)^2)
+        expected = 0.8 + norm.ppf(QUANTILE_LEVELS) * np.sqrt(0.1**2 + 0.3**2)
+        np.testing.assert_allclose(quantiles, expected, atol=1e-6)
+
+    def test_uniform(self):
+        U1 = StackDim(0, 1, -1, DistType.UNIFORM)
+
+        quantiles = convolve_linear(0, [(1, U1), (1, U1)], QUANTILE_LEVELS)
+
+        # the sum of two independent uniforms on [-1, 1] is triangular on [-2, 2]
+        p = QUANTILE_LEVELS
+        expected = np.where(p < 0.5, -2 + np.sqrt(8 * p), 2 - np.sqrt(8 * (1 - p)))
+        np.testing.assert_allclose(quantiles, expected, atol=1e-6)
+
+    def test_matchesSampling(self):
+        terms = [
+            (1, StackDim(2, 0.5, -0.5, DistType.UNIFORM)),
+            (-3, StackDim(1, 0.1, -0.1, DistType.UNIFORM)),
+            (0.5, StackDim(4, 0.2, -0.4, DistType.NORMAL_3S)),
+        ]
+        quantiles = convolve_linear(0, terms, QUANTILE_LEVELS)
+
+        rng = np.random.default_rng(0)
+        samples = sum(c * dim.sample(rng, 10**6)[0] for c, dim in terms)
+        expected = np.quantile(samples, QUANTILE_LEVELS)
+        np.testing.assert_allclose(quantiles, expected, atol=5e-3)
+
+    def test_constant(self):
+        C1 = StackDim(3, 0, 0, DistType.CONSTANT)
+        quantiles = convolve_linear(2, [(2, C1)], QUANTILE_LEVELS)
+        np.testing.assert_array_equal(quantiles, np.full(len(QUANTILE_LEVELS), 8))
+
+    def test_derived(self):
+        D1 = StackDim(1, 0.1, -0.1, DistType.DERIVED, np.zeros((1, 10)))
+        with self.assertRaises(ValueError):
+            convolve_linear(0, [(1, D1)], QUANTILE_LEVELS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
 from tolstack.StackDim import StackDim
-from tolstack.StackTypes import DistType
+from tolstack.StackTypes import DistType, EvalType
 
 from tolstack.StackUtils import (
     addCombination,
@@ -11,6 +11,7 @@ from tolstack.StackUtils import (
 )
 
 import numpy as np
+from scipy.stats import norm
 
 from tolstack.StackUtils import sinBounds, cosBounds, tanBounds
 
@@ -278,7 +279,7 @@ class TestNegateStackDims(unittest.TestCase):
         self.assertEqual(self.neg_dim.plus, 0.2)
         self.assertEqual(self.neg_dim.minus, -0.1)
 
-        # self.assertEqual(self.dim.data, -self.neg_dim.data)
+        self.assertTrue((self.dim.data == -self.neg_dim.data).all())
 
         self.assertEqual(self.dim.disttype, self.neg_dim.disttype)
         self.assertEqual(self.neg_dim.note, "Inverted.")
@@ -301,6 +302,133 @@ class TestNegateStackDims(unittest.TestCase):
         self.assertEqual(self.neg_derived_dim.key, "-dim+dim")
 
 
+class TestCommonRandomNumbers(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dim = StackDim(5.0, 0.1, -0.2, key="dim")
+
+    def test_sampledOnce(self):
+        self.assertIs(self.dim.dist(), self.dim.dist())
+
+    def test_selfDifference(self):
+        diff = self.dim - self.dim
+        self.assertTrue((diff.data == 0).all())
+
+    def test_scalarShiftReusesSamples(self):
+        shifted = self.dim + 3
+        self.assertTrue(np.allclose(shifted.data - self.dim.data, 3))
+
+    def test_sampleBounds(self):
+        self.assertEqual(self.dim.data.shape, (1, StackDim.N))
+        self.assertGreaterEqual(self.dim.data.min(), 4.8)
+        self.assertLessEqual(self.dim.data.max(), 5.1)
+
+
+class TestMoments(unittest.TestCase):
+    def test_uniform(self):
+        mean, var, kurtosis = StackDim(5.0, 0.1, -0.3).moments()
+        self.assertAlmostEqual(mean, 4.9)
+        self.assertAlmostEqual(var, 0.4**2 / 12)
+        self.assertAlmostEqual(kurtosis, -1.2)
+
+    def test_normal(self):
+        for disttype, scale in (
+            (DistType.NORMAL_1S, 1),
+            (DistType.NORMAL_2S, 2),
+            (DistType.NORMAL_3S, 3),
+        ):
+            with self.subTest(disttype=disttype):
+                mean, var, kurtosis = StackDim(5.0, 0.3, -0.3, disttype).moments()
+                self.assertAlmostEqual(mean, 5.0)
+                self.assertAlmostEqual(var, (0.3 / scale) ** 2)
+                self.assertEqual(kurtosis, 0)
+
+    def test_matchesSamples(self):
+        dim = StackDim(1.0, 0.2, -0.1, DistType.NORMAL_2S)
+        mean, var, _ = dim.moments()
+        self.assertAlmostEqual(np.mean(dim.dist()), mean, delta=1e-3)
+        self.assertAlmostEqual(np.var(dim.dist()), var, delta=1e-4)
+
+    def test_constant(self):
+        self.assertEqual(StackDim(2.0, 0, 0, DistType.CONSTANT).moments(), (2.0, 0, 0))
+
+    def test_derived(self):
+        with self.assertRaises(ValueError):
+            StackDim(1.0, 0, 0, DistType.DERIVED, np.ones((1, 3))).moments()
+
+
+class TestScalarConstants(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dim = StackDim(5.0, 0.1, -0.2, key="dim")
+        self.const = StackDim(2.0, 0, 0, DistType.CONSTANT, key="const")
+
+    def test_constantIsScalar(self):
+        self.assertTrue(self.const.is_scalar())
+        self.assertEqual(np.ndim(self.const.dist()), 0)
+        self.assertEqual(self.const.dist(), 2.0)
+
+    def test_zeroWidthIsScalar(self):
+        shifted = StackDim(1.0, 0.5, 0.5)
+        self.assertTrue(shifted.is_scalar())
+        self.assertEqual(shifted.dist(), 1.5)
+
+    def test_idealIsScalar(self):
+        ideal = self.dim.ideal()
+        self.assertEqual(np.ndim(ideal.dist()), 0)
+        self.assertEqual(ideal.dist(), 5.0)
+
+    def test_broadcastOperations(self):
+        for result in [
+            self.dim * self.const,
+            self.const / self.dim,
+            1 / self.dim,
+            self.dim**2,
+            2**self.dim,
+        ]:
+            self.assertEqual(result.dist().shape, (1, StackDim.N))
+
+        self.assertTrue(np.allclose((1 / self.dim).dist(), 1 / self.dim.dist()))
+
+    def test_constantArithmetic(self):
+        result = self.const * self.const + 1
+        self.assertEqual(np.ndim(result.dist()), 0)
+        self.assertEqual(result.center(EvalType.STATISTICAL_3S), 5.0)
+
+
+class TestQuantileCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dim = StackDim(5.0, 0.3, -0.3, DistType.NORMAL_3S, key="dim")
+
+    def test_matchesQuantile(self):
+        for method, sigma in [
+            (EvalType.STATISTICAL_1S, 1),
+            (EvalType.STATISTICAL_2S, 2),
+            (EvalType.STATISTICAL_3S, 3),
+        ]:
+            expected_lower = np.quantile(
+                self.dim.data, norm.sf(sigma), method="median_unbiased"
+            )
+            expected_upper = np.quantile(
+                self.dim.data, norm.cdf(sigma), method="median_unbiased"
+            )
+            self.assertAlmostEqual(self.dim.lower(method), expected_lower)
+            self.assertAlmostEqual(self.dim.upper(method), expected_upper)
+
+        expected_center = np.quantile(self.dim.data, 0.5, method="median_unbiased")
+        self.assertAlmostEqual(
+            self.dim.center(EvalType.STATISTICAL_1S), expected_center
+        )
+
+    def test_cachedUntilSamplesChange(self):
+        center = self.dim.center(EvalType.STATISTICAL_3S)
+        cached = self.dim._quantiles
+        self.dim.range(EvalType.STATISTICAL_3S)
+        self.assertIs(self.dim._quantiles, cached)
+
+        self.dim.data = self.dim.data + 1
+        self.assertIsNone(self.dim._quantiles)
+        self.assertAlmostEqual(self.dim.center(EvalType.STATISTICAL_3S), center + 1)
+
+
 class TestAddStackDims(unittest.TestCase):
     @classmethod
     def setUpClass(self) -> None:
@@ -0,0 +1,90 @@
+import io
+import unittest
+
+from tolstack.StackAnalysis import AnalysisResult
+from tolstack.StackExport import (
+    EXPORT_FIELDS,
+    ResultWriter,
+    export_record,
+    export_results,
+    read_records,
+)
+from tolstack.StackParser import StackParser
+from tolstack.StackTypes import ExportType
+
+DIMENSIONS = [
+    ["D1", "10", ".3", "-.3", "3S"],
+    ["D2", "5", ".1", "-.1", "U"],
+    ["D3", "2", ".2", "-.1", "2S"],
+]
+EXPRESSIONS = [
+    ["E1", "D1 / D2", "1.95", "2.05", "3S", "Ratio, with a comma"],
+    ["E2", "D3 * 2", "", "", "W"],
+]
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.SP = StackParser(seed=3)
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=DIMENSIONS,
+            expressions_data=EXPRESSIONS,
+        )
+
+    def test_record(self):
+        results = AnalysisResult(self.SP, sensitivity=True, yield_analysis=True)
+        record = export_record(results.expression("E1"), self.SP.manifest(), "a.txt")
+
+        self.assertEqual(tuple(record), EXPORT_FIELDS)
+        self.assertEqual(record["source"], "a.txt")
+        self.assertEqual(record["seed"], 3)
+        self.assertEqual(record["engine"], "Monte Carlo")
+        self.assertEqual(record["upper_bound"], 2.05)
+        self.assertFalse(record["pass"])
+        self.assertEqual(set(record["sensitivities"]), {"D1", "D2"})
+        self.assertIsNone(record["contributions"])
+        self.assertGreater(record["out_of_bounds_ppm"], 0)
+
+        # missing bounds are null, and so is the yield of expressions without bounds
+        record = export_record(results.expression("E2"), self.SP.manifest())
+        self.assertIsNone(record["lower_bound"])
+        self.assertIsNone(record["upper_bound"])
+        self.assertIsNone(record["out_of_bounds_ppm"])
+        self.assertTrue(record["pass"])
+
+    def test_adaptiveRecord(self):
+        SP = StackParser(seed=3, rtol=0.05, adaptive=True)
+        SP.parse(
+            constants_data=[],
+            dimensions_data=DIMENSIONS,
+            expressions_data=EXPRESSIONS,
+        )
+        result = AnalysisResult(SP).expression("E1")
+        record = export_record(result, SP.manifest())
+        self.assertEqual(record["N"], result.value.dist().size)
+        self.assertNotEqual(record["N"], SP.context.N)
+
+    def test_roundTrip(self):
+        results = AnalysisResult(self.SP, sensitivity=True, contributions=True)
+        streams = {export_type: io.StringIO() for export_type in ExportType}
+        writers = [ResultWriter(streams[t], t) for t in ExportType]
+        export_results(results, writers, source="a.txt")
+
+        expected = [
+            export_record(R, self.SP.manifest(), "a.txt")
+            for R in results.expressions.values()
+        ]
+        for export_type, stream in streams.items():
+            stream.seek(0)
+            self.assertEqual(list(read_records(stream, export_type)), expected)
+        self.assertEqual([writer.count for writer in writers], [2, 2])
+
+    def test_csvHeader(self):
+        stream = io.StringIO()
+        ResultWriter(stream, ExportType.CSV)
+        self.assertEqual(stream.getvalue(), ",".join(EXPORT_FIELDS) + "\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
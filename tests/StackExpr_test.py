@@ -1,7 +1,10 @@
 import unittest
 import numpy as np
 
+from tolstack.StackDim import StackDim
+from tolstack.StackExpr import StackExpr
 from tolstack.StackParser import StackParser
+from tolstack.StackTypes import DistType, EngineType
 from tolstack.gui.FileIO import open_from_name
 from tolstack.gui.GUITypes import DataWidget
 
@@ -249,6 +252,26 @@ class TestStackExprDerivatives(unittest.TestCase):
         self.assertAlmostEqual(nom, nominal_val)
         self.assertAlmostEqual(partial, 0)
 
+    def test_gradientMatchesDerivatives(self):
+        for key in ["E4", "E6", "E8", "E11", "E14"]:
+            expr = self.SP.expressions[key]
+            nom, gradient = expr.gradient()
+
+            self.assertEqual(list(gradient.keys()), expr.referenced_values())
+            for var, partial in gradient.items():
+                expected_nom, expected_partial = expr._evaluateDerivative(
+                    expr.root, var
+                )
+                self.assertAlmostEqual(nom, expected_nom)
+                self.assertAlmostEqual(partial, expected_partial)
+
+    def test_sensitivities(self):
+        # E8 = '(3*D1+2*D2)/D3'
+        sensitivities = self.SP.expressions["E8"].sensitivities()
+        self.assertAlmostEqual(sensitivities["D1"], 3 / 5)
+        self.assertAlmostEqual(sensitivities["D2"], 2 / 5)
+        self.assertAlmostEqual(sensitivities["D3"], -12 / 25)
+
 
 class TestStackExprExpand(unittest.TestCase):
     @classmethod
@@ -315,3 +338,353 @@ class TestStackExprExpand(unittest.TestCase):
 
         expanded = expr.expand()
         self.assertEqual(expanded, "(3 * D1 + 2 * D2) / D3")
+
+
+class TestStackExprEvaluationCache(unittest.TestCase):
+    def setUp(self) -> None:
+        # D1 = 2
+        # D2 = 3
+        # D3 = 5
+        self.SP = StackParser()
+
+        info = open_from_name("validation_inputs/test_expression_expand.txt")
+        self.SP.parse(
+            constants_data=info[DataWidget.CONSTANTS],
+            dimensions_data=info[DataWidget.DIMENSIONS],
+            expressions_data=info[DataWidget.EXPRESSIONS],
+        )
+
+    def test_sharedNodeEvaluatedOnce(self):
+        # E5 = 'D3-E3', E3 = 'D1 - D2'
+        e3 = self.SP.expressions["E3"].evaluate()
+        e5 = self.SP.expressions["E5"]
+        e5.evaluate()
+
+        self.assertIs(e5.cache.values[self.SP.expressions["E3"].root], e3)
+        self.assertIs(e5.cache.values[e5.root.right], e3)
+
+    def test_repeatedEvaluation(self):
+        expr = self.SP.expressions["E10"]
+        self.assertIs(expr.evaluate(), expr.evaluate())
+
+    def test_invalidatedOnValueMapChange(self):
+        expr = self.SP.expressions["E4"]
+        first = expr.evaluate()
+
+        value_map = dict(expr.value_map)
+        value_map["D2"] = value_map["D2"] * 2
+        second = expr.evaluate(value_map)
+
+        self.assertIsNot(first, second)
+        self.assertAlmostEqual(second.nom, 2 * first.nom)
+
+    def test_invalidateDependents(self):
+        # E4 = 'D2*(D1+5)', E5 = 'D3-(D1-D2)', E6 = 'D3-D2-D1'
+        values = {key: self.SP.expressions[key].evaluate() for key in ("E4", "E5")}
+        self.SP.expressions["E6"].contributions()
+        cache = self.SP.cache
+
+        cache.invalidate(["D3"])
+
+        self.assertIs(cache.values[self.SP.expressions["E4"].root], values["E4"])
+        self.assertNotIn(self.SP.expressions["E5"].root, cache.values)
+        self.assertIn(self.SP.expressions["E3"].root, cache.values)
+        self.assertEqual(cache.analyses, {})
+
+    def test_prune(self):
+        for expr in self.SP.expressions.values():
+            expr.evaluate()
+        roots = [self.SP.expressions[key].root for key in ("E1", "E2")]
+
+        self.SP.cache.prune(roots)
+
+        self.assertIn(self.SP.expressions["E2"].root, self.SP.cache.values)
+        self.assertNotIn(self.SP.expressions["E4"].root, self.SP.cache.values)
+        self.assertNotIn(self.SP.expressions["E10"].root, self.SP.cache.programs)
+
+
+class TestStackExprContributions(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[["C1", "2"]],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "3S"],
+            ],
+            expressions_data=[
+                ["E1", "D1 + C1*D2", "", "", "W"],
+                ["E2", "D1 + C1*D2", "", "", "3S"],
+            ],
+        )
+
+    def test_worstCase(self):
+        contributions = self.SP.expressions["E1"].contributions()
+        self.assertAlmostEqual(contributions["C1"], 0)
+        self.assertAlmostEqual(contributions["D1"], 0.3)
+        self.assertAlmostEqual(contributions["D2"], 0.2)
+
+    def test_statistical(self):
+        # sigma of D1 is 0.1, sigma of 2*D2 is 0.0667, so the +/-3 sigma half band is 0.3606
+        contributions = self.SP.expressions["E2"].contributions()
+        self.assertAlmostEqual(contributions["C1"], 0)
+        self.assertAlmostEqual(contributions["D1"], 0.3606 - 0.2, delta=0.01)
+        self.assertAlmostEqual(contributions["D2"], 0.3606 - 0.3, delta=0.01)
+
+
+class TestStackExprAdaptive(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "U"],
+            ],
+            expressions_data=[
+                ["E1", "D1 + D2", "", "", "1S"],
+                ["E2", "D1 + D2", "", "", "3S"],
+            ],
+        )
+
+    def test_converges(self):
+        for key in ("E1", "E2"):
+            with self.subTest(expression=key):
+                expr = self.SP.expressions[key]
+                result = expr.evaluate(adaptive=True, seed=0)
+                expected = expr.evaluate()
+                band = expected.range(expr.method)
+
+                self.assertLess(result.dist().size, StackDim.N)
+                self.assertAlmostEqual(
+                    result.lower(expr.method),
+                    expected.lower(expr.method),
+                    delta=0.05 * band,
+                )
+                self.assertAlmostEqual(
+                    result.upper(expr.method),
+                    expected.upper(expr.method),
+                    delta=0.05 * band,
+                )
+
+    def test_tailsNeedMoreSamples(self):
+        n_1s = self.SP.expressions["E1"].evaluate(adaptive=True, seed=0).dist().size
+        n_3s = self.SP.expressions["E2"].evaluate(adaptive=True, seed=0).dist().size
+        self.assertLess(n_1s, n_3s)
+
+    def test_rtolOverride(self):
+        expr = self.SP.expressions["E1"]
+        default = expr.evaluate(adaptive=True, seed=0).dist().size
+
+        expr.rtol = StackExpr.RTOL / 4
+        try:
+            tight = expr.evaluate(adaptive=True, seed=0).dist().size
+        finally:
+            expr.rtol = None
+        self.assertGreater(tight, default)
+
+    def test_reproducible(self):
+        expr = self.SP.expressions["E2"]
+        first = expr.evaluate(adaptive=True, seed=3)
+        second = expr.evaluate(adaptive=True, seed=3)
+        np.testing.assert_array_equal(first.dist(), second.dist())
+
+
+class TestStackExprAnalytic(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "3S"],
+                ["D3", "3", ".2", "-.2", "2S"],
+                ["D4", "0", "3", "-3", "3S"],
+                ["U1", "1", ".5", "-.5", "U"],
+            ],
+            expressions_data=[
+                ["E1", "D1 - 3*D2 - D3", "", "", "3S"],
+                ["E2", "D1 + U1", "", "", "1S"],
+                ["E3", "D1 + 0.01*D4*D4", "", "", "3S"],
+                ["E4", "cos(D4)", "", "", "3S"],
+                ["E5", "D1 - 3*D2 - D3", "", "", "W"],
+            ],
+        )
+
+    def assertMatchesMonteCarlo(self, expr, result):
+        expected = expr.evaluate()
+        band = expected.range(expr.method)
+        for sigma in (-3, -1, 0, 1, 3):
+            self.assertAlmostEqual(
+                result.quantile(sigma), expected.quantile(sigma), delta=0.02 * band
+            )
+
+    def test_linear(self):
+        expr = self.SP.expressions["E1"]
+        result = expr.evaluate(engine=EngineType.FIRST_ORDER)
+
+        self.assertEqual(expr.engine, EngineType.FIRST_ORDER)
+        self.assertIsNone(result.dist())
+        # D1 - 3*D2 - D3 has sigma sqrt(0.1^2 + 0.1^2 + 0.1^2)
+        self.assertAlmostEqual(result.quantile(0), -8.0)
+        self.assertAlmostEqual(result.quantile(3), -8.0 + 3 * np.sqrt(0.03))
+
+        # contributions use samples without changing the engine of the result
+        expr.contributions()
+        self.assertEqual(expr.engine, EngineType.FIRST_ORDER)
+        self.assertMatchesMonteCarlo(expr, result)
+
+    def test_worstCaseInterval(self):
+        result = self.SP.expressions["E1"].evaluate(engine=EngineType.FIRST_ORDER)
+        self.assertAlmostEqual(result.nom, -8.0)
+        self.assertAlmostEqual(result.plus, 0.8)
+        self.assertAlmostEqual(result.minus, -0.8)
+
+    def test_nonNormalFallback(self):
+        # the uniform input dominates, so the result is far from normal
+        expr = self.SP.expressions["E2"]
+        result = expr.evaluate(engine=EngineType.SECOND_ORDER)
+
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+        self.assertIsNotNone(result.dist())
+
+    def test_secondOrder(self):
+        expr = self.SP.expressions["E3"]
+
+        expr.evaluate(engine=EngineType.FIRST_ORDER)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+
+        result = expr.evaluate(engine=EngineType.SECOND_ORDER)
+        self.assertEqual(expr.engine, EngineType.SECOND_ORDER)
+        # the mean is shifted by 0.01 times the variance of D4
+        self.assertAlmostEqual(result.quantile(0), 10.01, places=6)
+        self.assertMatchesMonteCarlo(expr, result)
+
+    def test_derivedInputs(self):
+        # inputs known only by their samples fall back to Monte Carlo
+        SP = StackParser()
+        SP.parse(
+            constants_data=[],
+            dimensions_data=[["D1", "10", ".3", "-.3", "3S"]],
+            expressions_data=[["E1", "D1 - 3", "", "", "3S"]],
+        )
+        D1 = SP.dimensions["D1"]
+        samples = StackDim(
+            D1.nom, D1.plus, D1.minus, DistType.DERIVED, D1.dist().copy(), key="D1"
+        )
+
+        expr = SP.expressions["E1"]
+        for engine in EngineType:
+            with self.subTest(engine=engine):
+                result = expr.evaluate({"D1": samples}, engine=engine)
+                self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+                np.testing.assert_allclose(result.dist(), D1.dist() - 3)
+
+    def test_vanishingGradient(self):
+        expr = self.SP.expressions["E4"]
+        expr.evaluate(engine=EngineType.SECOND_ORDER)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+
+    def test_worstCaseMethod(self):
+        expr = self.SP.expressions["E5"]
+        expr.evaluate(engine=EngineType.FIRST_ORDER)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+
+
+class TestStackExprConvolution(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[["C1", "2"]],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "U"],
+                ["D3", "3", ".2", "-.2", "U"],
+            ],
+            expressions_data=[
+                ["E1", "D1 - C1*(D2 + D3)/4 + sind(30)", "", "", "3S"],
+                ["E2", "D2 - D2 + D3", "", "", "3S"],
+                ["E3", "D1 * D2", "", "", "3S"],
+                ["E4", "D1 - D2", "", "", "W"],
+            ],
+        )
+
+    def test_linear(self):
+        expr = self.SP.expressions["E1"]
+        result = expr.evaluate(engine=EngineType.CONVOLUTION)
+        self.assertEqual(expr.engine, EngineType.CONVOLUTION)
+        self.assertIsNone(result.dist())
+        self.assertAlmostEqual(result.quantile(0), 10 - 4 + 0.5)
+
+        expected = expr.evaluate()
+        band = expected.range(expr.method)
+        for sigma in (-3, -1, 0, 1, 3):
+            self.assertAlmostEqual(
+                result.quantile(sigma), expected.quantile(sigma), delta=0.02 * band
+            )
+
+    def test_cancellation(self):
+        # repeated references are perfectly correlated, so D2 cancels
+        expr = self.SP.expressions["E2"]
+        result = expr.evaluate(engine=EngineType.CONVOLUTION)
+        self.assertAlmostEqual(result.lower(expr.method), 2.8 + 0.4 * 0.00135, places=5)
+
+    def test_nonlinearFallback(self):
+        expr = self.SP.expressions["E3"]
+        result = expr.evaluate(engine=EngineType.CONVOLUTION)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+        self.assertIsNotNone(result.dist())
+
+    def test_worstCaseMethod(self):
+        expr = self.SP.expressions["E4"]
+        expr.evaluate(engine=EngineType.CONVOLUTION)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+
+
+class TestStackExprGrid(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["A", "30", "2", "-2", "3S"],
+                ["L", "20", ".5", "-.5", "U"],
+                ["D1", "1", ".1", "-.1", "U"],
+                ["D2", "2", ".1", "-.1", "U"],
+                ["D3", "3", ".1", "-.1", "U"],
+            ],
+            expressions_data=[
+                ["E1", "sind(A) * L", "", "", "3S"],
+                ["E2", "A*L*D1*D2*D3", "", "", "3S"],
+                ["E3", "sind(A) * L", "", "", "W"],
+            ],
+        )
+
+    def test_grid(self):
+        expr = self.SP.expressions["E1"]
+        result = expr.evaluate(engine=EngineType.GRID)
+        self.assertEqual(expr.engine, EngineType.GRID)
+        self.assertIsNone(result.dist())
+
+        expected = expr.evaluate()
+        band = expected.range(expr.method)
+        for sigma in (-3, -1, 0, 1, 3):
+            self.assertAlmostEqual(
+                result.quantile(sigma), expected.quantile(sigma), delta=0.02 * band
+            )
+
+    def test_tooManyInputs(self):
+        expr = self.SP.expressions["E2"]
+        result = expr.evaluate(engine=EngineType.GRID)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
+        self.assertIsNotNone(result.dist())
+
+    def test_worstCaseMethod(self):
+        expr = self.SP.expressions["E3"]
+        expr.evaluate(engine=EngineType.GRID)
+        self.assertEqual(expr.engine, EngineType.MONTE_CARLO)
@@ -5,7 +5,9 @@ from tolstack.gui.FormatText import (
     format_scientific,
     format_significant_figures,
     round_string,
+    format_yield,
 )
+from tolstack.StackYield import YieldEstimate
 
 
 class TestFormatShortest(unittest.TestCase):
@@ -146,3 +148,16 @@ class TestRoundString(unittest.TestCase):
 
     def test_no_rounding_high_digit_no_change(self):
         self.assertEqual(round_string("123494", 5), "12349")
+
+
+class TestFormatYield(unittest.TestCase):
+    def test_format_yield(self):
+        text = format_yield(None, YieldEstimate(6.8e-6, 1e-7, 65536))
+        self.assertEqual(
+            text.split("\n"),
+            [
+                "       Yield:",
+                "   Out of bounds:        6.8 PPM",
+                "          95% CI:      6.604 to 6.996 PPM",
+            ],
+        )
@@ -0,0 +1,146 @@
+import unittest
+
+import numpy as np
+from scipy.stats import norm
+
+from tolstack.StackDim import StackDim, QUANTILE_LEVELS
+from tolstack.StackParser import StackParser
+from tolstack.StackSampling import sample_parallel
+from tolstack.StackTypes import DistType, EngineType
+from tolstack.StackGrid import (
+    grid_cells,
+    propagate_grid,
+    weighted_quantiles,
+    MAX_GRID_INPUTS,
+)
+
+
+class TestGridCells(unittest.TestCase):
+    def test_normal(self):
+        dim = StackDim(10, 0.3, -0.3, DistType.NORMAL_3S)
+        values, weights = grid_cells(dim, 21)
+
+        self.assertAlmostEqual(weights.sum(), 1)
+        self.assertTrue(np.all(np.diff(values) > 0))
+        np.testing.assert_allclose(values - 10, -(values[::-1] - 10), atol=1e-12)
+        self.assertEqual(values[10], 10)
+
+    def test_uniform(self):
+        dim = StackDim(1, 0.5, -0.5, DistType.UNIFORM)
+        values, weights = grid_cells(dim, 20)
+
+        self.assertTrue(np.all((values > 0.5) & (values < 1.5)))
+        # the middle quantile of each cell of a uniform is its middle value
+        np.testing.assert_allclose(
+            values, 0.5 + np.cumsum(weights) - weights / 2, atol=1e-12
+        )
+
+
+class TestWeightedQuantiles(unittest.TestCase):
+    def test_equalWeights(self):
+        values = np.array([3.0, 1.0, 2.0, 4.0])
+        quantiles = weighted_quantiles(values, np.full(4, 0.25), [0.125, 0.5, 0.875])
+        np.testing.assert_allclose(quantiles, [1, 2.5, 4])
+
+
+class TestPropagateGrid(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "U"],
+                ["A", "30", "2", "-2", "3S"],
+                ["L", "20", ".5", "-.5", "U"],
+                ["D3", "3", ".2", "-.2", "2S"],
+                ["Z", "2", ".1", ".1", "U"],
+            ],
+            expressions_data=[
+                ["E1", "D1", "", "", "3S"],
+                ["E2", "D1 / D2", "", "", "3S"],
+                ["E3", "sind(A) * L", "", "", "3S"],
+                ["E4", "D1 / (D1 + D2)", "", "", "3S"],
+                ["E5", "D1 * D2 / D3 + L + A", "", "", "3S"],
+                ["E6", "Z * 3", "", "", "3S"],
+            ],
+        )
+
+    def program(self, key):
+        return self.SP.expressions[key].compile()
+
+    def test_normal(self):
+        quantiles = propagate_grid(self.program("E1"), QUANTILE_LEVELS)
+        expected = 10 + 0.1 * norm.ppf(QUANTILE_LEVELS)
+        np.testing.assert_allclose(quantiles, expected, atol=1e-3 * 0.6)
+
+    def test_matchesSampling(self):
+        for key in ("E2", "E3", "E4"):
+            with self.subTest(key=key):
+                program = self.program(key)
+                quantiles = propagate_grid(program, QUANTILE_LEVELS)
+
+                samples = sample_parallel(program, 2**20, seed=0)
+                expected = np.quantile(samples, QUANTILE_LEVELS)
+                band = expected[-1] - expected[0]
+                np.testing.assert_allclose(quantiles, expected, atol=0.005 * band)
+
+    def test_deterministic(self):
+        program = self.program("E3")
+        np.testing.assert_array_equal(
+            propagate_grid(program, QUANTILE_LEVELS),
+            propagate_grid(program, QUANTILE_LEVELS),
+        )
+
+    def test_resolution(self):
+        program = self.program("E2")
+        coarse = propagate_grid(program, QUANTILE_LEVELS, size=16)
+        fine = propagate_grid(program, QUANTILE_LEVELS)
+        self.assertFalse(np.allclose(coarse, fine, atol=1e-6))
+
+    def test_gridSize(self):
+        E2 = self.SP.expressions["E2"]
+        fine = E2.evaluate(engine=EngineType.GRID)
+        coarse = E2.evaluate(engine=EngineType.GRID, grid_size=16)
+        self.assertIs(E2.engine, EngineType.GRID)
+        np.testing.assert_array_equal(
+            [coarse.quantile(s) for s in (-3, 3)],
+            propagate_grid(self.program("E2"), QUANTILE_LEVELS, size=16)[[0, -1]],
+        )
+        self.assertNotEqual(coarse.quantile(3), fine.quantile(3))
+
+        # the grid size of the parser applies to all of its expressions
+        SP = StackParser(engine=EngineType.GRID, grid_size=16)
+        SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "U"],
+            ],
+            expressions_data=[["E2", "D1 / D2", "", "", "3S"]],
+        )
+        self.assertEqual(SP.manifest()["grid_size"], 16)
+        self.assertEqual(
+            SP.expressions["E2"].evaluate(engine=EngineType.GRID).quantile(3),
+            coarse.quantile(3),
+        )
+
+    def test_noInputs(self):
+        # zero-width dimensions are offset from their nominal value
+        program = self.program("E6")
+        self.assertEqual(program.leaves, [])
+        np.testing.assert_allclose(
+            propagate_grid(program, QUANTILE_LEVELS),
+            self.SP.expressions["E6"].evaluate().quantile(0),
+        )
+        np.testing.assert_allclose(propagate_grid(program, QUANTILE_LEVELS), 6.3)
+
+    def test_tooManyInputs(self):
+        program = self.program("E5")
+        self.assertGreater(len(program.leaves), MAX_GRID_INPUTS)
+        self.assertIsNone(propagate_grid(program, QUANTILE_LEVELS))
+
+
+if __name__ == "__main__":
+    unittest.main()
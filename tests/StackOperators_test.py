@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from tolstack.StackOperators import OPERATIONS, get_operator
+from tolstack.StackUtils import PRECEDENCE, OPERATORS, TRIG_OPERATORS
+
+
+class TestOperatorRegistry(unittest.TestCase):
+    def test_allOperatorsRegistered(self):
+        self.assertEqual(set(OPERATIONS), set(PRECEDENCE))
+
+    def test_arity(self):
+        for op in OPERATORS:
+            self.assertFalse(get_operator(op).unary)
+        for op in TRIG_OPERATORS + ["u-"]:
+            self.assertTrue(get_operator(op).unary)
+
+    def test_undefined(self):
+        with self.assertRaises(ValueError):
+            get_operator("log")
+
+    def test_format(self):
+        self.assertEqual(get_operator("^").format("A", "B"), "A ^ B")
+        self.assertEqual(get_operator("u-").format(None, "A"), "-A")
+        self.assertEqual(get_operator("cosd").format(None, "A"), "cosd(A)")
+
+    def test_kernelsMatchEvaluate(self):
+        x = np.linspace(0.5, 1.5, 5)
+        y = np.linspace(1.0, 2.0, 5)
+        for op, operator in OPERATIONS.items():
+            with self.subTest(operator=op):
+                out = np.empty_like(x)
+                if operator.unary:
+                    operator.kernel(y, out=out)
+                    expected = [operator.evaluate(None, v) for v in y]
+                else:
+                    operator.kernel(x, y, out=out)
+                    expected = [operator.evaluate(u, v) for u, v in zip(x, y)]
+                expected = [getattr(v, "nom", v) for v in expected]
+                np.testing.assert_allclose(out, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
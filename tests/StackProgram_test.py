@@ -0,0 +1,102 @@
+import unittest
+
+import numpy as np
+
+from tolstack.StackDim import StackDim
+from tolstack.StackParser import StackParser
+from tolstack.StackProgram import StackProgram, CONSTANT
+from tolstack.StackTree import TreeParser
+from tolstack.StackTypes import DistType
+from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.GUITypes import DataWidget
+
+
+class TestStackProgramAgainstEvaluate(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+
+        info = open_from_name("validation_inputs/test_expression_derivative.txt")
+        self.SP.parse(
+            info[DataWidget.CONSTANTS],
+            info[DataWidget.DIMENSIONS],
+            info[DataWidget.EXPRESSIONS],
+        )
+
+    def test_samples(self):
+        for key, expr in self.SP.expressions.items():
+            with self.subTest(expression=key):
+                expected = expr.evaluate()
+                result = expr.compile().evaluate()
+                np.testing.assert_allclose(result.dist(), expected.dist())
+
+    def test_intervals(self):
+        for key, expr in self.SP.expressions.items():
+            with self.subTest(expression=key):
+                expected = expr.evaluate()
+                result = expr.compile().evaluate()
+                self.assertAlmostEqual(result.nom, expected.nom)
+                self.assertAlmostEqual(result.plus, expected.plus)
+                self.assertAlmostEqual(result.minus, expected.minus)
+
+    def test_compileCached(self):
+        expr = self.SP.expressions["E8"]
+        self.assertIs(expr.compile(), expr.compile())
+
+
+class TestStackProgram(unittest.TestCase):
+    def setUp(self) -> None:
+        self.value_map = {
+            "A": StackDim(1.0, 0.1, -0.1, key="A"),
+            "B": StackDim(2.0, 0.2, -0.2, DistType.NORMAL_3S, key="B"),
+            "C": StackDim(3.0, 0, 0, DistType.CONSTANT, key="C"),
+        }
+        self.TP = TreeParser(self.value_map)
+
+    def compile(self, expression):
+        root = self.TP.construct_tree("E", expression)
+        return StackProgram(root, self.value_map, "E")
+
+    def test_derivedLeaf(self):
+        # derived values only have the samples they were given, and cannot be resampled
+        self.value_map["S"] = StackDim(
+            1.0, 0.1, -0.1, DistType.DERIVED, np.ones((1, 10)), key="S"
+        )
+        with self.assertRaisesRegex(ValueError, "S is known only by its samples"):
+            self.compile("A + S")
+
+    def test_constantFolding(self):
+        program = self.compile("A + C * 2 - sind(90)")
+        self.assertEqual(len(program.instructions), 2)
+        np.testing.assert_allclose(
+            program.run(), np.ravel(self.value_map["A"].dist()) + 5
+        )
+
+    def test_constantExpression(self):
+        program = self.compile("C * 2")
+        self.assertEqual(program.output, (CONSTANT, 6.0))
+        np.testing.assert_allclose(program.run(N=10), np.full(10, 6.0))
+
+    def test_registerReuse(self):
+        program = self.compile("A * B + A / B - B ^ 2")
+        self.assertEqual(program.leaves, ["A", "B"])
+        self.assertLess(program.n_registers, len(program.instructions))
+
+    def test_inputs(self):
+        program = self.compile("A - B")
+        result = program.run([np.arange(4.0), np.ones(4)])
+        np.testing.assert_allclose(result, np.arange(4.0) - 1)
+
+        with self.assertRaises(ValueError):
+            program.run([np.arange(4.0)])
+
+    def test_buffersReused(self):
+        program = self.compile("A * B + A")
+        first = program.run()
+        second = program.run()
+        self.assertTrue(np.shares_memory(first, second))
+        self.assertTrue(np.shares_memory(first, program._buffers))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from tolstack.compute_stack import parse_info
+from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.GUITypes import OptionsWidget
+from tolstack.StackParser import StackParser
+from tolstack.StackResultCache import ResultCache
+from tolstack.StackTypes import SamplerType
+
+DIMENSIONS = [
+    ["D1", "10", ".3", "-.3", "3S"],
+    ["D2", "5", ".1", "-.1", "U"],
+    ["D3", "2", ".2", "-.1", "2S"],
+]
+EXPRESSIONS = [
+    ["E1", "D1 / D2", "1.9", "2.05", "3S"],
+    ["E2", "D3 * 2", "", "", "WC"],
+]
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_getPut(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", {"value": 1.5})
+        self.assertEqual(self.cache.get("a"), {"value": 1.5})
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_evictLeastRecentlyUsed(self):
+        record = {"values": list(range(100))}
+        self.cache.put("a", record)
+        self.cache.put("b", record)
+        size = self.cache.size() // 2
+
+        # make a the most recently used, so that b is evicted first
+        os.utime(self.cache._path("a"), (0, 1))
+        os.utime(self.cache._path("b"), (0, 0))
+        self.cache.get("a")
+
+        self.cache.max_bytes = 2 * size + size // 2
+        self.cache.put("c", record)
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), record)
+        self.assertEqual(self.cache.get("c"), record)
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+
+    def test_corruptEntry(self):
+        self.cache.put("a", {"value": 1.5})
+        with open(self.cache._path("a"), "w") as file:
+            file.write("{")
+        self.assertIsNone(self.cache.get("a"))
+
+
+class TestAnalysisResults(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def parse(self, dimensions=DIMENSIONS, seed=7, sampler=SamplerType.RANDOM):
+        SP = StackParser(sampler=sampler, seed=seed, result_cache=self.cache)
+        SP.parse(
+            constants_data=[],
+            dimensions_data=dimensions,
+            expressions_data=EXPRESSIONS,
+        )
+        return SP
+
+    def assertSameValue(self, first, second, method):
+        self.assertEqual(first.nom, second.nom)
+        self.assertEqual(first.lower(method), second.lower(method))
+        self.assertEqual(first.center(method), second.center(method))
+        self.assertEqual(first.upper(method), second.upper(method))
+
+    def test_cachedValue(self):
+        E = self.parse().expressions["E1"]
+        computed = E.evaluate()
+        self.assertIsNotNone(computed.data)
+
+        E = self.parse().expressions["E1"]
+        cached = E.evaluate()
+        self.assertIsNone(cached.data)
+        self.assertSameValue(computed, cached, E.method)
+
+        # the plot histogram covers every sample
+        counts, edges = cached.sketch.histogram()
+        self.assertEqual(counts.sum(), computed.dist().size)
+        self.assertLessEqual(edges[0], computed.dist().min())
+        self.assertGreaterEqual(edges[-1], computed.dist().max())
+
+    def test_cachedAnalyses(self):
+        E = self.parse().expressions["E1"]
+        contributions = E.contributions()
+        estimate = E.estimate_yield()
+
+        E = self.parse().expressions["E1"]
+        self.assertEqual(E.contributions(), contributions)
+        self.assertEqual(E.estimate_yield().probability, estimate.probability)
+        self.assertIsNotNone(E.evaluate().data)
+
+    def test_dependencyCone(self):
+        SP = self.parse()
+        for E in SP.expressions.values():
+            E.evaluate()
+
+        # editing D3 invalidates E2 only
+        dimensions = DIMENSIONS[:2] + [["D3", "2", ".3", "-.1", "2S"]]
+        SP = self.parse(dimensions)
+        self.assertIsNone(SP.expressions["E1"].evaluate().data, "E1 cached")
+        self.assertIsNotNone(SP.expressions["E2"].evaluate().data, "E2 recomputed")
+
+        # a different seed invalidates both
+        SP = self.parse(seed=8)
+        self.assertIsNotNone(SP.expressions["E1"].evaluate().data)
+
+    def test_lowDiscrepancyLeaves(self):
+        self.parse(sampler=SamplerType.SOBOL).expressions["E1"].evaluate()
+
+        # adding a dimension changes the coordinates of the others
+        dimensions = DIMENSIONS + [["D4", "1", ".1", "-.1", "U"]]
+        E = self.parse(dimensions, sampler=SamplerType.SOBOL).expressions["E1"]
+        self.assertIsNotNone(E.evaluate().data)
+
+    def test_unseeded(self):
+        first = self.parse(seed=None)
+        self.assertIsNotNone(first.expressions["E1"].evaluate().data)
+
+        # the seed drawn for the dimensions is reused, so the results are cached
+        second = self.parse(seed=None)
+        self.assertEqual(second.manifest()["seed"], first.manifest()["seed"])
+        self.assertIsNone(second.expressions["E1"].evaluate().data)
+
+        # other dimensions draw their own seed
+        dimensions = DIMENSIONS + [["D4", "1", ".1", "-.1", "U"]]
+        other = self.parse(dimensions, seed=None)
+        self.assertNotEqual(other.manifest()["seed"], first.manifest()["seed"])
+
+    def test_unseededFile(self):
+        info = open_from_name("validation_inputs/test_input_v4.txt")
+        self.assertEqual(info[OptionsWidget.SEED], "")
+
+        first = parse_info(info, self.cache)
+        computed = {key: E.evaluate() for key, E in first.expressions.items()}
+        self.assertTrue(any(v.data is not None for v in computed.values()))
+
+        # opening the file again hits the cache for every sampled expression
+        second = parse_info(
+            open_from_name("validation_inputs/test_input_v4.txt"), self.cache
+        )
+        for key, E in second.expressions.items():
+            cached = E.evaluate()
+            self.assertIsNone(cached.data, key)
+            self.assertEqual(cached.nom, computed[key].nom, key)
+
+    def test_matchesUncached(self):
+        self.parse().expressions["E1"].evaluate()
+
+        SP = StackParser(seed=7)
+        SP.parse(
+            constants_data=[], dimensions_data=DIMENSIONS, expressions_data=EXPRESSIONS
+        )
+        uncached = SP.expressions["E1"]
+        cached = self.parse().expressions["E1"]
+        self.assertSameValue(uncached.evaluate(), cached.evaluate(), cached.method)
+        np.testing.assert_array_equal(
+            [uncached.evaluate().quantile(s) for s in (-3, 3)],
+            [cached.evaluate().quantile(s) for s in (-3, 3)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+
+from tolstack.StackAnalysis import AnalysisResult
+from tolstack.StackParser import StackParser
+from tolstack.StackSamples import SAMPLES_MANIFEST, load_samples, save_samples
+from tolstack.StackTypes import DistType
+
+DIMENSIONS = [
+    ["D1", "10", ".3", "-.3", "3S"],
+    ["D2", "5", ".1", "-.1", "U"],
+    ["D3", "2", "0", "0", "U"],
+]
+EXPRESSIONS = [
+    ["E1", "D1 / D2", "1.95", "2.05", "3S", "Ratio"],
+    ["E2", "D3 * 2", "", "", "W"],
+    ["E/3", "D1 - D2", "", "", "W"],
+]
+
+
+class TestSamples(unittest.TestCase):
+    def setUp(self):
+        self.SP = StackParser(seed=3)
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=DIMENSIONS,
+            expressions_data=EXPRESSIONS,
+        )
+        self.results = AnalysisResult(self.SP)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check_bundle(self, path):
+        manifest = save_samples(self.results, path)
+        bundle = load_samples(path)
+        self.assertEqual(bundle.manifest, manifest)
+        self.assertEqual(bundle.analysis["seed"], 3)
+
+        # zero-width dimensions and constant expressions have no samples
+        self.assertEqual(list(bundle.dimensions), ["D1", "D2"])
+        self.assertEqual(list(bundle.expressions), ["E1", "E/3"])
+
+        for key, dim in bundle.dimensions.items():
+            self.assertIsInstance(dim.data, np.memmap)
+            self.assertIs(dim.disttype, DistType.DERIVED)
+            np.testing.assert_array_equal(dim.data, self.SP.dimensions[key].data)
+
+        E1 = bundle["E1"]
+        value = self.results.expression("E1").value
+        self.assertIsInstance(E1.data, np.memmap)
+        self.assertEqual(
+            (E1.nom, E1.plus, E1.minus), (value.nom, value.plus, value.minus)
+        )
+        self.assertEqual(E1.note, "Ratio")
+        self.assertEqual(E1.quantile(3), value.quantile(3))
+
+        # the samples of every array are the same joint draws
+        np.testing.assert_allclose((E1 * bundle["D2"]).dist(), bundle["D1"].dist())
+
+    def test_directory(self):
+        path = os.path.join(self.directory.name, "samples")
+        self.check_bundle(path)
+        self.assertTrue(os.path.exists(os.path.join(path, SAMPLES_MANIFEST)))
+
+    def test_archive(self):
+        path = os.path.join(self.directory.name, "samples.npz")
+        self.check_bundle(path)
+
+        # archives are also plain .npz files
+        with np.load(path) as archive:
+            np.testing.assert_array_equal(
+                archive["expressions/E%2F3"],
+                self.results.expression("E/3").value.dist()[0],
+            )
+
+    def test_compressedArchive(self):
+        path = os.path.join(self.directory.name, "samples.npz")
+        save_samples(self.results, path)
+
+        # compressed members cannot be mapped, so they are read instead
+        compressed = os.path.join(self.directory.name, "compressed.npz")
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(
+            compressed, "w", zipfile.ZIP_DEFLATED
+        ) as target:
+            for name in source.namelist():
+                target.writestr(name, source.read(name))
+
+        bundle = load_samples(compressed)
+        self.assertNotIsInstance(bundle["D1"].data, np.memmap)
+        np.testing.assert_array_equal(bundle["D1"].data, self.SP.dimensions["D1"].data)
+
+
+if __name__ == "__main__":
+    unittest.main()
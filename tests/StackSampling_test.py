@@ -0,0 +1,411 @@
+import unittest
+
+import numpy as np
+from scipy.stats import norm
+
+from tolstack.StackDim import StackDim, QUANTILE_LEVELS
+from tolstack.StackParser import StackParser
+from tolstack.StackSampling import (
+    SampleContext,
+    sample_parallel,
+    sample_streaming,
+    quantile_standard_error,
+    unit_samples,
+    stream_seed,
+    DIMENSION_STREAM,
+)
+from tolstack.StackTypes import DistType, SamplerType
+from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.GUITypes import DataWidget
+
+
+class TestSampleContext(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dims = [
+            StackDim(1.0, 0.1, -0.1, key="A"),
+            StackDim(2.0, 0, 0, DistType.CONSTANT, key="C"),
+            StackDim(3.0, 0.3, -0.3, DistType.NORMAL_3S, key="B"),
+        ]
+        self.context = SampleContext(N=1000, rng=np.random.default_rng(0))
+        self.samples = self.context.draw(self.dims)
+
+    def test_leafMatrix(self):
+        self.assertEqual(self.samples.shape, (2, 1000))
+        self.assertTrue(self.samples.flags["C_CONTIGUOUS"])
+        self.assertEqual(self.context.keys, ["A", "B"])
+
+    def test_dimensionsViewRows(self):
+        self.assertTrue(np.shares_memory(self.dims[0].dist(), self.samples))
+        self.assertTrue(np.shares_memory(self.dims[2].dist(), self.samples))
+
+    def test_unknownLeaf(self):
+        with self.assertRaises(KeyError):
+            self.context.leaf_samples("C")
+
+
+class TestSeededSampling(unittest.TestCase):
+    def dims(self):
+        return [
+            StackDim(1.0, 0.1, -0.1, key="A"),
+            StackDim(3.0, 0.3, -0.3, DistType.NORMAL_3S, key="B"),
+            StackDim(5.0, 0.2, -0.2, key="C"),
+        ]
+
+    def draw(self, dims, seed, sampler=SamplerType.RANDOM):
+        context = SampleContext(N=1000, sampler=sampler, seed=seed)
+        context.draw(dims)
+        return context
+
+    def test_reproducible(self):
+        first = self.draw(self.dims(), 42)
+        second = self.draw(self.dims(), 42)
+        np.testing.assert_array_equal(first.samples, second.samples)
+        self.assertEqual(first.seed, 42)
+
+    def test_orderIndependent(self):
+        for sampler in SamplerType:
+            with self.subTest(sampler=sampler):
+                forward = self.draw(self.dims(), 42, sampler)
+                backward = self.draw(self.dims()[::-1], 42, sampler)
+                for key in "ABC":
+                    np.testing.assert_array_equal(
+                        forward.leaf_samples(key), backward.leaf_samples(key)
+                    )
+
+    def test_independentOfOtherDimensions(self):
+        all_dims = self.draw(self.dims(), 42)
+        one_dim = self.draw(self.dims()[:1], 42)
+        np.testing.assert_array_equal(
+            all_dims.leaf_samples("A"), one_dim.leaf_samples("A")
+        )
+
+    def test_dimensionStream(self):
+        context = self.draw(self.dims(), 7)
+        rng = np.random.default_rng(stream_seed(7, DIMENSION_STREAM, "B"))
+        expected = 3.0 + 0.1 * rng.standard_normal(1000)
+        np.testing.assert_allclose(context.leaf_samples("B")[0], expected)
+
+    def test_freshEntropy(self):
+        first = self.draw(self.dims(), None)
+        second = self.draw(self.dims(), None)
+        self.assertNotEqual(first.seed, second.seed)
+        self.assertFalse(np.array_equal(first.samples, second.samples))
+
+        # the entropy drawn is recorded, so the run can be repeated
+        repeat = self.draw(self.dims(), first.seed)
+        np.testing.assert_array_equal(first.samples, repeat.samples)
+
+    def test_redraw(self):
+        for sampler in SamplerType:
+            with self.subTest(sampler=sampler):
+                context = self.draw(self.dims(), 42, sampler)
+                before = context.samples.copy()
+
+                # the edited dimension gets the samples of a fresh draw, the others keep theirs
+                dims = self.dims()
+                dims[1] = StackDim(3.0, 0.6, -0.6, DistType.UNIFORM, key="B")
+                context.redraw(dims[1])
+                self.assertTrue(np.shares_memory(dims[1].dist(), context.samples))
+
+                fresh = self.draw(dims, 42, sampler)
+                np.testing.assert_array_equal(context.samples, fresh.samples)
+                np.testing.assert_array_equal(context.samples[[0, 2]], before[[0, 2]])
+
+
+class TestSeededParser(unittest.TestCase):
+    def parse(self, seed):
+        SP = StackParser(seed=seed)
+        SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".1", "-.1", "U"],
+            ],
+            expressions_data=[["E1", "D1 / D2", "1.9", "2.05", "3S"]],
+        )
+        return SP
+
+    def test_reproducible(self):
+        first = self.parse(3).expressions["E1"]
+        second = self.parse(3).expressions["E1"]
+        self.assertEqual(first.evaluate().quantile(3), second.evaluate().quantile(3))
+        self.assertEqual(
+            first.estimate_yield(N=4096).probability,
+            second.estimate_yield(N=4096).probability,
+        )
+        np.testing.assert_array_equal(
+            first.evaluate(adaptive=True).dist(), second.evaluate(adaptive=True).dist()
+        )
+
+    def test_manifest(self):
+        SP = self.parse(None)
+        manifest = SP.manifest()
+
+        self.assertEqual(manifest["seed"], SP.context.seed)
+        self.assertEqual(manifest["N"], StackDim.N)
+        self.assertEqual(manifest["sampler"], "random")
+        self.assertEqual(manifest["engine"], "Monte Carlo")
+        self.assertEqual(manifest["numpy_version"], np.__version__)
+
+        repeat = self.parse(manifest["seed"])
+        self.assertEqual(
+            SP.expressions["E1"].evaluate().quantile(-3),
+            repeat.expressions["E1"].evaluate().quantile(-3),
+        )
+
+
+class TestParserUpdate(unittest.TestCase):
+    DIMENSIONS = [
+        ["D1", "10", ".3", "-.3", "3S"],
+        ["D2", "5", ".1", "-.1", "U"],
+        ["D3", "2", ".2", "-.1", "2S"],
+    ]
+    EXPRESSIONS = [
+        ["E1", "D1 / D2", "1.9", "2.05", "3S"],
+        ["E2", "D3 * 2", "", "", "3S"],
+        ["E3", "E2 + D2", "", "", "W"],
+    ]
+
+    def parse(self, dimensions, expressions, parser=None):
+        if parser is None:
+            parser = StackParser(seed=11)
+            parser.parse([["C1", "2"]], dimensions, expressions)
+            return parser, set(parser.expressions)
+        return parser, parser.update([["C1", "2"]], dimensions, expressions)
+
+    def assertMatchesFresh(self, parser, dimensions, expressions):
+        fresh, _ = self.parse(dimensions, expressions)
+        self.assertEqual(list(parser.expressions), list(fresh.expressions))
+        self.assertEqual(dict(parser.where_used), dict(fresh.where_used))
+        for key, expr in parser.expressions.items():
+            np.testing.assert_array_equal(
+                expr.evaluate().dist(), fresh.expressions[key].evaluate().dist()
+            )
+
+    def test_unchanged(self):
+        parser, _ = self.parse(self.DIMENSIONS, self.EXPRESSIONS)
+        value = parser.expressions["E1"].evaluate()
+
+        _, affected = self.parse(self.DIMENSIONS, self.EXPRESSIONS, parser)
+
+        self.assertEqual(affected, set())
+        self.assertIs(parser.expressions["E1"].evaluate(), value)
+
+    def test_editDimension(self):
+        parser, _ = self.parse(self.DIMENSIONS, self.EXPRESSIONS)
+        value = parser.expressions["E1"].evaluate()
+
+        dimensions = [list(row) for row in self.DIMENSIONS]
+        dimensions[2][2] = ".4"
+        _, affected = self.parse(dimensions, self.EXPRESSIONS, parser)
+
+        self.assertEqual(affected, {"E2", "E3"})
+        self.assertIs(parser.expressions["E1"].evaluate(), value)
+        self.assertMatchesFresh(parser, dimensions, self.EXPRESSIONS)
+
+    def test_editExpression(self):
+        parser, _ = self.parse(self.DIMENSIONS, self.EXPRESSIONS)
+        e1 = parser.expressions["E1"]
+
+        expressions = [list(row) for row in self.EXPRESSIONS]
+        expressions[1][1] = "D3 * C1 + D1"
+        expressions.append(["E4", "E3 - D3", "", "", "W"])
+        _, affected = self.parse(self.DIMENSIONS, expressions, parser)
+
+        self.assertEqual(affected, {"E2", "E3", "E4"})
+        self.assertIs(parser.expressions["E1"], e1)
+        self.assertMatchesFresh(parser, self.DIMENSIONS, expressions)
+
+    def test_structuralEdit(self):
+        parser, _ = self.parse(self.DIMENSIONS, self.EXPRESSIONS)
+
+        # adding a dimension, or removing a tolerance, changes the samples of the analysis
+        for dimensions in (
+            self.DIMENSIONS + [["D4", "1", ".1", "-.1", "U"]],
+            self.DIMENSIONS[:2] + [["D3", "2", "0", "0", "2S"]],
+        ):
+            with self.subTest(dimensions=dimensions):
+                _, affected = self.parse(dimensions, self.EXPRESSIONS, parser)
+                self.assertEqual(affected, {"E1", "E2", "E3"})
+                self.assertMatchesFresh(parser, dimensions, self.EXPRESSIONS)
+
+    def test_failedUpdate(self):
+        parser, _ = self.parse(self.DIMENSIONS, self.EXPRESSIONS)
+
+        expressions = [list(row) for row in self.EXPRESSIONS]
+        expressions[1][1] = "D3 * D9"
+        with self.assertRaises(ValueError):
+            self.parse(self.DIMENSIONS, expressions, parser)
+
+        _, affected = self.parse(self.DIMENSIONS, self.EXPRESSIONS, parser)
+        self.assertEqual(affected, {"E1", "E2", "E3"})
+        self.assertMatchesFresh(parser, self.DIMENSIONS, self.EXPRESSIONS)
+
+
+class TestQuasiMonteCarlo(unittest.TestCase):
+    def test_latinHypercubeStrata(self):
+        points = unit_samples(SamplerType.LHS, 3, 1000, np.random.default_rng(0))
+        self.assertEqual(points.shape, (3, 1000))
+        for row in points:
+            # exactly one point in each of the N equal strata of each coordinate
+            strata = np.sort(np.floor(row * 1000))
+            np.testing.assert_array_equal(strata, np.arange(1000))
+
+    def test_sobolUnitCube(self):
+        points = unit_samples(SamplerType.SOBOL, 2, 1024, np.random.default_rng(0))
+        self.assertEqual(points.shape, (2, 1024))
+        self.assertTrue(np.all((points >= 0) & (points < 1)))
+
+    def test_random(self):
+        self.assertIsNone(unit_samples(SamplerType.RANDOM, 2, 10))
+
+    def test_inverseCDF(self):
+        for sampler in (SamplerType.SOBOL, SamplerType.LHS):
+            with self.subTest(sampler=sampler):
+                dims = [
+                    StackDim(1.0, 0.3, -0.3, DistType.NORMAL_3S, key="A"),
+                    StackDim(2.0, 0.1, -0.1, DistType.UNIFORM, key="B"),
+                ]
+                context = SampleContext(
+                    N=4096, rng=np.random.default_rng(0), sampler=sampler
+                )
+                samples = context.draw(dims)
+
+                # low-discrepancy points reproduce the moments much more closely than the
+                # 1/sqrt(N) error of pseudo-random sampling
+                self.assertAlmostEqual(samples[0].mean(), 1.0, delta=1e-3)
+                self.assertAlmostEqual(samples[0].std(), 0.1, delta=1e-3)
+                self.assertAlmostEqual(samples[1].mean(), 2.0, delta=1e-4)
+                self.assertTrue(np.all(np.abs(samples[1] - 2.0) <= 0.1))
+
+
+class TestParserSharedSamples(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+
+        info = open_from_name("validation_inputs/test_expression_expand.txt")
+        self.SP.parse(
+            constants_data=info[DataWidget.CONSTANTS],
+            dimensions_data=info[DataWidget.DIMENSIONS],
+            expressions_data=info[DataWidget.EXPRESSIONS],
+        )
+
+    def test_dimensionsSampledByContext(self):
+        for key, dim in self.SP.dimensions.items():
+            self.assertTrue(
+                np.array_equal(dim.dist(), self.SP.context.leaf_samples(key))
+            )
+
+    def test_repeatedReferencesCorrelated(self):
+        # E5 = 'D3-E3' = 'D3-(D1-D2)', E3 = 'D1 - D2'
+        e3 = self.SP.expressions["E3"].evaluate()
+        e5 = self.SP.expressions["E5"].evaluate()
+        d3 = self.SP.dimensions["D3"].dist()
+        self.assertTrue(np.allclose(e5.dist() + e3.dist(), d3))
+
+
+class TestSampleParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+
+        info = open_from_name("validation_inputs/test_expression_derivative.txt")
+        self.SP.parse(
+            info[DataWidget.CONSTANTS],
+            info[DataWidget.DIMENSIONS],
+            info[DataWidget.EXPRESSIONS],
+        )
+        self.program = self.SP.expressions["E8"].compile()
+
+    def test_reproducible(self):
+        first = sample_parallel(self.program, 10000, seed=42, chunk_size=1000)
+        second = sample_parallel(
+            self.program, 10000, seed=42, chunk_size=1000, max_workers=1
+        )
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(first.shape, (1, 10000))
+
+    def test_seeds(self):
+        first = sample_parallel(self.program, 1000, seed=1, chunk_size=100)
+        second = sample_parallel(self.program, 1000, seed=2, chunk_size=100)
+        self.assertFalse(np.array_equal(first, second))
+
+    def test_processes(self):
+        threads = sample_parallel(self.program, 3000, seed=7, chunk_size=1000)
+        processes = sample_parallel(
+            self.program, 3000, seed=7, chunk_size=1000, max_workers=2, processes=True
+        )
+        np.testing.assert_array_equal(threads, processes)
+
+    def test_distribution(self):
+        expr = self.SP.expressions["E8"]
+        expected = expr.evaluate()
+        result = expr.evaluate_parallel(N=100000, seed=3)
+        self.assertEqual(result.nom, expected.nom)
+        self.assertAlmostEqual(
+            result.upper(), expected.upper(), delta=0.02 * abs(expected.range())
+        )
+        self.assertAlmostEqual(
+            result.lower(), expected.lower(), delta=0.02 * abs(expected.range())
+        )
+
+
+class TestSampleStreaming(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+
+        info = open_from_name("validation_inputs/test_expression_derivative.txt")
+        self.SP.parse(
+            info[DataWidget.CONSTANTS],
+            info[DataWidget.DIMENSIONS],
+            info[DataWidget.EXPRESSIONS],
+        )
+
+    def test_exactQuantiles(self):
+        for key, expr in self.SP.expressions.items():
+            with self.subTest(expression=key):
+                program = expr.compile()
+                samples = sample_parallel(program, 20000, seed=5, chunk_size=1000)
+                sketch, quantiles = sample_streaming(
+                    program, 20000, seed=5, chunk_size=1000, bins=64
+                )
+
+                expected = np.quantile(
+                    samples, QUANTILE_LEVELS, method="median_unbiased"
+                )
+                np.testing.assert_array_equal(quantiles, expected)
+                self.assertEqual(sketch.count, 20000)
+                self.assertAlmostEqual(sketch.mean, samples.mean())
+
+    def test_summaryResult(self):
+        expr = self.SP.expressions["E8"]
+        expected = expr.evaluate_parallel(N=20000, seed=9)
+        result = expr.evaluate_streaming(N=20000, seed=9)
+
+        self.assertIsNone(result.dist())
+        self.assertIsNotNone(result.sketch)
+        for sigma in (-3, 0, 3):
+            self.assertEqual(result.quantile(sigma), expected.quantile(sigma))
+
+
+class TestQuantileStandardError(unittest.TestCase):
+    def test_normal(self):
+        # asymptotic standard error of the sample quantile is sqrt(p (1 - p) / n) / pdf(x_p)
+        samples = np.random.default_rng(0).standard_normal(100000)
+        levels = QUANTILE_LEVELS
+        expected = np.sqrt(levels * (1 - levels) / samples.size) / norm.pdf(
+            norm.ppf(levels)
+        )
+
+        errors = quantile_standard_error(samples, levels)
+        np.testing.assert_allclose(errors, expected, rtol=0.3)
+
+    def test_sorted(self):
+        samples = np.random.default_rng(1).uniform(size=1000)
+        levels = QUANTILE_LEVELS
+        np.testing.assert_array_equal(
+            quantile_standard_error(samples, levels),
+            quantile_standard_error(np.sort(samples), levels, is_sorted=True),
+        )
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from tolstack.StackDim import QUANTILE_LEVELS
+from tolstack.StackSketch import (
+    QuantileSketch,
+    quantile_ranks,
+    interpolate_quantiles,
+)
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(0)
+        self.samples = self.rng.normal(1.0, 0.5, 10000)
+
+    def test_moments(self):
+        sketch = QuantileSketch(0, 2, bins=64)
+        for chunk in np.split(self.samples, 10):
+            sketch.add(chunk)
+
+        self.assertEqual(sketch.count, self.samples.size)
+        self.assertAlmostEqual(sketch.mean, self.samples.mean())
+        self.assertAlmostEqual(sketch.std, self.samples.std(ddof=1))
+        self.assertEqual(sketch.min, self.samples.min())
+        self.assertEqual(sketch.max, self.samples.max())
+
+    def test_grows(self):
+        sketch = QuantileSketch(0.9, 1.1, bins=64)
+        sketch.add(self.samples)
+
+        self.assertLessEqual(sketch.origin, self.samples.min())
+        self.assertGreater(sketch.upper_edge, self.samples.max())
+        self.assertEqual(sketch.counts.sum(), self.samples.size)
+
+    def test_histogram(self):
+        sketch = QuantileSketch(-2, 4, bins=64)
+        sketch.add(self.samples)
+
+        counts, edges = sketch.histogram()
+        expected, _ = np.histogram(self.samples, bins=edges)
+        np.testing.assert_array_equal(counts, expected)
+
+    def test_merge(self):
+        total = QuantileSketch(0.9, 1.1, bins=64)
+        total.add(self.samples)
+
+        merged = QuantileSketch(0.9, 1.1, bins=64)
+        for chunk in np.array_split(np.sort(self.samples), 7):
+            part = QuantileSketch(0.9, 1.1, bins=64)
+            part.add(chunk)
+            merged.merge(part)
+
+        self.assertEqual(merged.width, total.width)
+        self.assertEqual(merged.origin, total.origin)
+        np.testing.assert_array_equal(merged.counts, total.counts)
+        self.assertAlmostEqual(merged.mean, total.mean)
+        self.assertAlmostEqual(merged.std, total.std)
+
+    def test_orderStatisticBin(self):
+        sketch = QuantileSketch(-2, 4, bins=64)
+        sketch.add(self.samples)
+
+        ordered = np.sort(self.samples)
+        for rank in (0, 17, 5000, 9999):
+            lo, hi = sketch.bin_edges(sketch.order_statistic_bin(rank))
+            self.assertTrue(lo <= ordered[rank] < hi)
+
+    def test_nonFinite(self):
+        sketch = QuantileSketch(0, 1, bins=8)
+        sketch.add(np.array([0.5, np.nan, np.inf]))
+        self.assertEqual(sketch.count, 1)
+
+
+class TestQuantileRanks(unittest.TestCase):
+    def test_matchesNumpy(self):
+        rng = np.random.default_rng(1)
+        for n in (1, 2, 5, 100, 1001):
+            with self.subTest(n=n):
+                samples = rng.normal(size=n)
+                ordered = np.sort(samples)
+
+                below, above, gamma = quantile_ranks(n, QUANTILE_LEVELS)
+                result = interpolate_quantiles(ordered[below], ordered[above], gamma)
+                expected = np.quantile(
+                    samples, QUANTILE_LEVELS, method="median_unbiased"
+                )
+                np.testing.assert_allclose(result, expected, rtol=0, atol=1e-15)
+
+
+if __name__ == "__main__":
+    unittest.main()
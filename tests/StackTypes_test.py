@@ -93,6 +93,47 @@ class TestGetEvalFromCode(unittest.TestCase):
         self.assertEqual(get_eval_from_code(" 3S "), EvalType.STATISTICAL_3S)
 
 
+class TestGetSigmaFromEval(unittest.TestCase):
+    def test_statistical(self):
+        self.assertEqual(get_sigma_from_eval(EvalType.STATISTICAL_1S), 1)
+        self.assertEqual(get_sigma_from_eval(EvalType.STATISTICAL_2S), 2)
+        self.assertEqual(get_sigma_from_eval(EvalType.STATISTICAL_3S), 3)
+
+    def test_worst_case(self):
+        self.assertIsNone(get_sigma_from_eval(EvalType.WORSTCASE))
+        self.assertIsNone(get_sigma_from_eval(EvalType.UNKNOWN))
+
+
+class TestGetSamplerFromCode(unittest.TestCase):
+    def test_codes(self):
+        self.assertEqual(get_sampler_from_code("random"), SamplerType.RANDOM)
+        self.assertEqual(get_sampler_from_code(" Sobol "), SamplerType.SOBOL)
+        self.assertEqual(get_sampler_from_code("LHS"), SamplerType.LHS)
+
+    def test_unknown_code(self):
+        self.assertIsNone(get_sampler_from_code("halton"))
+
+    def test_round_trip(self):
+        for sampler in SamplerType:
+            self.assertEqual(
+                get_sampler_from_code(get_code_from_sampler(sampler)), sampler
+            )
+
+
+class TestGetEngineFromCode(unittest.TestCase):
+    def test_codes(self):
+        self.assertEqual(get_engine_from_code("mc"), EngineType.MONTE_CARLO)
+        self.assertEqual(get_engine_from_code(" First-Order "), EngineType.FIRST_ORDER)
+        self.assertEqual(get_engine_from_code("grid"), EngineType.GRID)
+
+    def test_unknown_code(self):
+        self.assertIsNone(get_engine_from_code("quadrature"))
+
+    def test_round_trip(self):
+        for engine in EngineType:
+            self.assertEqual(get_engine_from_code(get_code_from_engine(engine)), engine)
+
+
 class TestEvalType(unittest.TestCase):
     def test_worstcase_str(self):
         self.assertEqual(str(EvalType.WORSTCASE), "Worst Case")
@@ -108,3 +149,12 @@ class TestEvalType(unittest.TestCase):
 
     def test_unknown_str(self):
         self.assertEqual(str(EvalType.UNKNOWN), "Unknown")
+
+
+class TestEngineType(unittest.TestCase):
+    def test_str(self):
+        self.assertEqual(str(EngineType.MONTE_CARLO), "Monte Carlo")
+        self.assertEqual(str(EngineType.FIRST_ORDER), "First-order moments")
+        self.assertEqual(str(EngineType.SECOND_ORDER), "Second-order moments")
+        self.assertEqual(str(EngineType.CONVOLUTION), "Convolution")
+        self.assertEqual(str(EngineType.GRID), "Density grid")
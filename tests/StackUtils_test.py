@@ -592,3 +592,25 @@ class TestTanBounds(unittest.TestCase):
     def test_discontinuity_in_modulo_range(self):
         with self.assertRaises(ValueError) as context:
             tanBounds((3 * np.pi / 2, np.pi / 8, -np.pi / 8))
+
+
+class TestMainEffect(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.x = rng.uniform(-1, 1, 40000)
+        self.z = rng.uniform(-1, 1, 40000)
+
+    def test_additive(self):
+        y = self.x**2 + self.z
+        effect = main_effect(self.x, y)
+        expected = self.x**2 - np.mean(self.x**2)
+        # bin means of 200 samples of z carry noise of about 0.04
+        self.assertLess(np.sqrt(np.mean((effect - expected) ** 2)), 0.06)
+
+    def test_no_effect(self):
+        effect = main_effect(self.x, self.z)
+        self.assertLess(np.std(effect), 0.1 * np.std(self.z))
+
+    def test_scalar_input(self):
+        effect = main_effect(2.0, self.z)
+        self.assertTrue((effect == 0).all())
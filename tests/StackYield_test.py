@@ -0,0 +1,113 @@
+import unittest
+import warnings
+
+import numpy as np
+from scipy.stats import norm
+
+from tolstack.StackParser import StackParser
+from tolstack.StackSampling import sample_parallel
+from tolstack.StackYield import estimate_yield, YieldEstimate
+
+
+class TestYieldEstimate(unittest.TestCase):
+    def test_ppm(self):
+        estimate = YieldEstimate(2e-6, 1e-7, 1000)
+        self.assertAlmostEqual(estimate.ppm, 2)
+
+        lower, upper = estimate.interval()
+        self.assertAlmostEqual(lower, 2 - 1.959964 * 0.1, places=5)
+        self.assertAlmostEqual(upper, 2 + 1.959964 * 0.1, places=5)
+
+    def test_intervalClipped(self):
+        lower, upper = YieldEstimate(1e-7, 1e-6, 1000).interval()
+        self.assertEqual(lower, 0)
+        self.assertGreater(upper, 1)
+
+
+class TestEstimateYield(unittest.TestCase):
+    @classmethod
+    def setUpClass(self) -> None:
+        self.SP = StackParser()
+        self.SP.parse(
+            constants_data=[],
+            dimensions_data=[
+                ["D1", "10", ".3", "-.3", "3S"],
+                ["D2", "5", ".4", "-.4", "3S"],
+                ["U1", "0", "1", "-1", "U"],
+                ["U2", "0", "1", "-1", "U"],
+                ["A", "30", "2", "-2", "3S"],
+                ["L", "20", ".5", "-.5", "U"],
+            ],
+            expressions_data=[
+                ["E1", "D1 - D2", "", "", "3S"],
+                ["E2", "U1 + U2", "", "", "3S"],
+                ["E3", "sind(A) * L", "", "", "3S"],
+                ["E4", "D1 * 1", "", "", "3S"],
+            ],
+        )
+
+    def program(self, key):
+        return self.SP.expressions[key].compile()
+
+    def assertWithinInterval(self, estimate, ppm):
+        lower, upper = estimate.interval(0.999)
+        self.assertLessEqual(lower, ppm)
+        self.assertGreaterEqual(upper, ppm)
+
+    def test_normalTails(self):
+        # D1 - D2 is normal with mean 5, bounds at 4.5 sigma give 6.8 PPM
+        sigma = np.sqrt(0.1**2 + (0.4 / 3) ** 2)
+        estimate = estimate_yield(
+            self.program("E1"), 5 - 4.5 * sigma, 5 + 4.5 * sigma, seed=0
+        )
+
+        expected = 2 * norm.cdf(-4.5) * 1e6
+        self.assertWithinInterval(estimate, expected)
+        self.assertLess(estimate.standard_error * 1e6, 0.05 * expected)
+
+    def test_farTail(self):
+        # D1 is normal with sigma 0.1, beyond which ndtr rounds to 1 at about 8.3 sigma
+        for sigmas in (9, -9):
+            with self.subTest(sigmas=sigmas), np.errstate(
+                all="raise"
+            ), warnings.catch_warnings():
+                warnings.simplefilter("error")
+                bound = 10 + sigmas * 0.1
+                bounds = {"upper": bound} if sigmas > 0 else {"lower": bound}
+                estimate = estimate_yield(self.program("E4"), seed=0, **bounds)
+
+                self.assertTrue(np.isfinite(estimate.ppm))
+                self.assertWithinInterval(estimate, norm.cdf(-9) * 1e6)
+
+    def test_uniformTail(self):
+        # U1 + U2 is triangular on [-2, 2], above 1.99 with probability 0.01^2 / 8
+        estimate = estimate_yield(self.program("E2"), upper=1.99, seed=0)
+        self.assertWithinInterval(estimate, 0.01**2 / 8 * 1e6)
+
+    def test_matchesSampling(self):
+        program = self.program("E3")
+        samples = sample_parallel(program, 2**20, seed=0)
+        lower, upper = np.quantile(samples, [0.005, 0.995])
+
+        estimate = estimate_yield(program, lower, upper, seed=0)
+        self.assertAlmostEqual(estimate.ppm, 10000, delta=500)
+
+    def test_unbounded(self):
+        estimate = estimate_yield(self.program("E1"), seed=0)
+        self.assertEqual(estimate.probability, 0)
+
+    def test_reproducible(self):
+        program = self.program("E1")
+        first = estimate_yield(program, 4, 6, seed=3)
+        second = estimate_yield(program, 4, 6, seed=3)
+        self.assertEqual(first.probability, second.probability)
+
+    def test_expression(self):
+        expr = self.SP.expressions["E4"]
+        expr.lower, expr.upper = 9.7, 10.3
+        estimate = expr.estimate_yield(N=2**14, seed=0)
+        self.assertWithinInterval(estimate, 2 * norm.cdf(-3) * 1e6)
+
+
+if __name__ == "__main__":
+    unittest.main()
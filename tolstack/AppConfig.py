@@ -1,10 +1,11 @@
 from pathlib import Path
+import os
 import sys
 
 
 class AppConfig:
     app_version = "0.8.7"
-    file_format_version = "4.0"
+    file_format_version = "9.0"
 
     if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
         bundle_dir = Path(sys._MEIPASS)
@@ -19,6 +20,10 @@ class AppConfig:
         bundle_dir / f"tolstack_error.log"
     ).resolve()
 
+    path_to_cache = (
+        Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "tolstack"
+    ).resolve()
+
     paths_to_fonts = [
         (bundle_dir / f"tolstack/content/fonts/sourceSans-regular.ttf").resolve(),
         (bundle_dir / f"tolstack/content/fonts/sourceSans-italic.ttf").resolve(),
@@ -32,6 +37,7 @@ if __name__ == "__main__":
     print(f"Path to help: {AppConfig.path_to_help}")
     print(f"Path to splash: {AppConfig.path_to_splash}")
     print(f"Path to error log: {AppConfig.path_to_error_log}")
+    print(f"Path to cache: {AppConfig.path_to_cache}")
 
     print("Fonts:")
     for p in AppConfig.paths_to_fonts:
@@ -0,0 +1,183 @@
+# Results of an analysis, computed once for the text report, the PDF report and the GUI
+
+from __future__ import annotations
+
+from math import isclose, isinf
+
+import numpy as np
+from numpy import ndarray
+
+from tolstack.StackDim import StackDim, SIGMA_LEVELS
+from tolstack.StackExpr import StackExpr
+from tolstack.StackParser import StackParser
+from tolstack.StackTypes import EngineType
+from tolstack.StackYield import YieldEstimate
+
+# Number of histogram bins of the distribution plots
+HISTOGRAM_BINS = 71
+
+
+class ExpressionResult:
+    """
+    Everything reported for one expression, from a single evaluation.
+
+    Attributes:
+    -----------
+    expr : StackExpr
+        The expression, for its key, definition, method and bounds.
+    expansion : str
+        The expression expanded down to constants and dimensions.
+    value : StackDim
+        The evaluated result.
+    engine : EngineType
+        The engine that evaluated the result, which falls back to Monte Carlo for expressions
+        the engine selected cannot evaluate.
+    nom : float
+        Nominal value of the result.
+    center, lower, upper : float
+        Center and limits of the result for the evaluation method of the expression.
+    upper_tol, lower_tol : float
+        Limits of the result relative to its center.
+    quantiles : ndarray
+        Quantiles of the result at SIGMA_LEVELS, or None for results without a distribution.
+    lower_pass, upper_pass : bool
+        Whether the result meets the lower and upper bounds of the expression. Missing bounds
+        are always met.
+    sensitivities : dict[str, float]
+        Partial derivatives of the expression by each referenced value, if requested.
+    contributions : dict[str, float]
+        Tolerance contribution of each referenced value, if requested.
+    yield_estimate : YieldEstimate
+        Estimated rate of falling outside the bounds, if requested and the expression has bounds.
+    histogram : tuple[ndarray, ndarray]
+        Counts and edges of the distribution of the result for plots, if requested.
+    """
+
+    def __init__(
+        self,
+        expr: StackExpr,
+        sensitivity: bool = False,
+        contributions: bool = False,
+        yield_analysis: bool = False,
+        histogram: bool = False,
+        engine: EngineType = EngineType.MONTE_CARLO,
+        adaptive: bool = False,
+    ) -> None:
+        self.expr = expr
+        self.expansion = expr.expand()
+
+        method = expr.method
+        value = expr.evaluate(adaptive=adaptive, engine=engine)
+        self.value = value
+        self.engine = expr.engine
+
+        self.nom = value.nom
+        self.center = value.center(method)
+        self.lower = value.lower(method)
+        self.upper = value.upper(method)
+        self.upper_tol = value.upper_tol(method)
+        self.lower_tol = value.lower_tol(method)
+
+        # results of the analytic engines carry their quantiles without samples
+        self.quantiles = None
+        if (
+            value.data is not None
+            or value.sketch is not None
+            or self.engine is not EngineType.MONTE_CARLO
+        ):
+            self.quantiles = np.array([value.quantile(s) for s in SIGMA_LEVELS])
+
+        self.lower_pass = _meets(expr.lower, self.lower, lower=True)
+        self.upper_pass = _meets(expr.upper, self.upper, lower=False)
+
+        self.sensitivities = expr.sensitivities() if sensitivity else None
+        self.contributions = expr.contributions() if contributions else None
+
+        self.yield_estimate = None
+        if yield_analysis and (not isinf(expr.lower) or not isinf(expr.upper)):
+            self.yield_estimate = expr.estimate_yield()
+
+        self.histogram = _histogram(value) if histogram else None
+
+    @property
+    def key(self) -> str:
+        return self.expr.key
+
+
+class AnalysisResult:
+    """
+    The results of every expression of a parsed analysis, with the analyses selected.
+
+    Expressions are computed all at once, or one at a time so that callers can report progress. The reports and the GUI only read the results, so an
+    analysis is evaluated once however many times and in whatever formats it is shown.
+
+    Attributes:
+    -----------
+    parser : StackParser
+        The parsed analysis, for its constants, dimensions, where used map, engine and
+        adaptive sampling.
+    sensitivity, contributions, yield_analysis, histograms : bool
+        The analyses computed for each expression.
+    expressions : dict[str, ExpressionResult]
+        The results computed so far, keyed by expression, and ordered as the expressions of the
+        parser once all are computed.
+    """
+
+    def __init__(
+        self,
+        parser: StackParser,
+        sensitivity: bool = False,
+        contributions: bool = False,
+        yield_analysis: bool = False,
+        histograms: bool = False,
+    ) -> None:
+        self.parser = parser
+        self.sensitivity = sensitivity
+        self.contributions = contributions
+        self.yield_analysis = yield_analysis
+        self.histograms = histograms
+        self.expressions = dict()
+
+    def expression(self, key: str) -> ExpressionResult:
+        """
+        Returns the result of an expression, computing it first if needed.
+        """
+        if key not in self.expressions:
+            self.expressions[key] = ExpressionResult(
+                self.parser.expressions[key],
+                self.sensitivity,
+                self.contributions,
+                self.yield_analysis,
+                self.histograms,
+                self.parser.engine,
+                self.parser.adaptive,
+            )
+        return self.expressions[key]
+
+    def compute(self) -> AnalysisResult:
+        """
+        Computes the results of all expressions that are not computed yet.
+        """
+        self.expressions = {
+            key: self.expression(key) for key in self.parser.expressions
+        }
+        return self
+
+
+def _meets(bound, actual, lower):
+    if isinf(bound):
+        return True
+    if isclose(bound, actual, abs_tol=1e-9):
+        return True
+    return bound <= actual if lower else actual <= bound
+
+
+def _histogram(value: StackDim) -> tuple[ndarray, ndarray]:
+    if value.sketch is not None:
+        # results evaluated in bounded memory only keep a histogram of their samples
+        counts, edges = value.sketch.histogram()
+        centers = (edges[:-1] + edges[1:]) / 2
+        return np.histogram(centers, bins=HISTOGRAM_BINS, weights=counts)
+    if value.data is None:
+        return None
+    return np.histogram(value.dist().flatten(), bins=HISTOGRAM_BINS)
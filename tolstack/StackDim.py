@@ -4,14 +4,10 @@ from __future__ import annotations
 
 from numpy.random import default_rng
 from numpy import ndarray
-from numpy import full
-from numpy import quantile
 from numpy import power as np_power
 import numpy as np
 
-from math import isclose
-
-from scipy.stats import norm
+from math import isclose, erfc, sqrt
 
 from tolstack.StackTypes import DistType, get_code_from_dist, EvalType
 
@@ -24,6 +20,11 @@ from tolstack.StackUtils import (
     tanBounds,
 )
 
+# Sigma levels reported by the statistical evaluation methods, and the matching quantile
+# levels such that each tail has the weight of a normal distribution beyond that sigma level.
+SIGMA_LEVELS = (-3, -2, -1, 0, 1, 2, 3)
+QUANTILE_LEVELS = np.array([erfc(-s / sqrt(2)) / 2 for s in SIGMA_LEVELS])
+
 
 class StackDim:
     """
@@ -48,7 +49,9 @@ class StackDim:
     disttype : DistType
         Type of the distribution for Monte Carlo propagation.
     data : ndarray
-        Data representing the distribution, either generated or provided.
+        Data representing the distribution, either provided or sampled once on first use.
+    sketch : QuantileSketch
+        Streaming summary of a derived distribution whose samples were not kept, or None.
     PN : str
         Part Number associated with the dimension.
     note : str
@@ -60,6 +63,16 @@ class StackDim:
     --------
     dist() -> ndarray:
         Returns the underlying distribution of this StackDim for Monte Carlo propagation.
+    is_scalar() -> bool:
+        Whether this StackDim is a constant or zero-width distribution, sampled as a scalar.
+    moments() -> tuple[float, float, float]:
+        Returns the mean, variance and excess kurtosis of the analytical distribution.
+    sample(rng, N, out, unit) -> ndarray:
+        Draws a fresh sample from the analytical distribution of this StackDim.
+    quantile(sigma: int) -> float:
+        Returns the cached quantile of the distribution at the given sigma level.
+    summarize(sketch, quantiles) -> None:
+        Replaces the samples of the distribution with a streaming summary and its quantiles.
     center(method: EvalType) -> float:
         Returns the center value for reports based on the evaluation method.
     lower(method: EvalType) -> float:
@@ -118,49 +131,162 @@ class StackDim:
             )
 
         self.disttype = disttype
-        if disttype is DistType.DERIVED:
-            self.data = distribution
-        else:
-            self.data = self.dist()
+        self.data = distribution
+        self.sketch = None
 
         self.PN = PN
         self.note = note.strip() if note else None
 
         self.key = key
 
+    @property
+    def data(self) -> ndarray:
+        # Analytical distributions are sampled lazily, so that a SampleContext can fill
+        # the samples for every leaf dimension of an analysis before any of them are used.
+        # Constants and zero-width distributions are stored as scalars and broadcast by numpy.
+        if self._data is None and self.disttype is not DistType.DERIVED:
+            if self.is_scalar():
+                self._data = np.float64(self.nom + self.plus)
+            else:
+                self._data = self.sample()
+        return self._data
+
+    @data.setter
+    def data(self, distribution: ndarray) -> None:
+        self._data = distribution
+        self._quantiles = None
+
+    def quantile(self, sigma: int) -> float:
+        """
+        Returns the quantile of the distribution at the given sigma level.
+
+        All of the reported quantiles (see SIGMA_LEVELS) are computed together on first use with a
+        single partition of the samples, and cached until the samples are replaced.
+
+        Parameters:
+        sigma (int): The sigma level, from -3 to 3, with 0 giving the median.
+
+        Returns:
+        float: The quantile such that the tail beyond it has the weight of a normal tail beyond sigma.
+        """
+        if self._quantiles is None:
+            self._quantiles = np.quantile(
+                self.data, QUANTILE_LEVELS, method="median_unbiased"
+            )
+        return self._quantiles[SIGMA_LEVELS.index(sigma)]
+
+    def summarize(self, sketch, quantiles: ndarray) -> None:
+        """
+        Replaces the samples of the distribution with a streaming summary.
+
+        Used for results evaluated in bounded memory, where the samples are never held at once.
+        Quantiles are then reported from the given values instead of from the samples.
+
+        Parameters:
+        sketch (QuantileSketch): Histogram and moments of the distribution.
+        quantiles (ndarray): Quantiles of the distribution at the sigma levels SIGMA_LEVELS.
+        """
+        self.data = None
+        self.sketch = sketch
+        self._quantiles = np.asarray(quantiles)
+
     def dist(self) -> ndarray:
         """
         Returns the underlying distribution of this StackDim for Monte Carlo propagation.
 
-        If the distribution type is a known analytical distribution, then select a new sample from that
-        distribution using the numpy random number generator. If the distribution is already a simulated
-        distribution from an operation on StackDims, then return a random permutation of the distribution.
-        Since mathematical operations on StackDims are performed elementwise, this simulates random sampling
-        from the unknown distribution as long as d << StackDim.N, where StackDim.N is the number of points
-        sampled, and d is the maximum depth of an expression tree containing this StackDim.
+        Samples are drawn once per StackDim and then reused (common random numbers), so that column i
+        of every distribution in an analysis corresponds to the same joint draw of the leaf dimensions.
+        Repeated references to the same dimension are therefore perfectly correlated, as they should be,
+        and no copy or permutation is made when the distribution is used in an operation.
 
         Returns:
         ndarray
             The underlying distribution for Monte Carlo propagation.
         """
+        return self.data
+
+    def is_scalar(self) -> bool:
+        """
+        Whether this StackDim has an analytical distribution with zero width, so is represented by a scalar.
+        """
+        return self.disttype is DistType.CONSTANT or (
+            self.disttype is not DistType.DERIVED and self.plus == self.minus
+        )
+
+    def moments(self) -> tuple[float, float, float]:
+        """
+        Returns the mean, variance and excess kurtosis of the analytical distribution of this StackDim.
+
+        Used to propagate moments through expressions without sampling.
+
+        Returns:
+        tuple[float, float, float]: The mean, variance and excess kurtosis.
+        """
+        _mean = self.nom + 0.5 * (
+            self.plus + self.minus
+        )  # center of range, not nominal
+        _width = self.plus - self.minus
+
         match self.disttype:
+            case DistType.CONSTANT:
+                return (self.nom, 0.0, 0.0)
             case DistType.UNIFORM:
-                return self._uniformDist()
+                return (_mean, _width**2 / 12, -1.2)
+            case DistType.NORMAL_1S:
+                return (_mean, (_width / 2) ** 2, 0.0)
+            case DistType.NORMAL_2S:
+                return (_mean, (_width / 4) ** 2, 0.0)
+            case DistType.NORMAL_3S:
+                return (_mean, (_width / 6) ** 2, 0.0)
+            case _:
+                raise ValueError(
+                    f"{self.key}: cannot compute moments of a {self.disttype} distribution."
+                )
+
+    def sample(
+        self, rng=None, N: int = None, out: ndarray = None, unit: ndarray = None
+    ) -> ndarray:
+        """
+        Draws a fresh sample from the analytical distribution of this StackDim.
+
+        Parameters:
+        rng (numpy.random.Generator): The generator to draw from, defaults to StackDim.rng.
+        N (int): The number of samples to draw, defaults to StackDim.N.
+        out (ndarray): Optional array of N float64 values to fill in place.
+        unit (ndarray): Optional N points in [0, 1), for example from a quasi-Monte Carlo
+            sequence, mapped through the inverse CDF of the distribution instead of drawing
+            from rng.
+
+        Returns:
+        ndarray
+            The samples, shaped (1, N) unless out was provided.
+        """
+        _rng = self.rng if rng is None else rng
+        _N = StackDim.N if N is None else N
+        _out = np.empty((1, _N)) if out is None else out
+
+        match self.disttype:
+            case DistType.UNIFORM:
+                self._uniformDist(_rng, _out, unit)
 
             case DistType.NORMAL_1S:
-                return self._normalDist(1)
+                self._normalDist(1, _rng, _out, unit)
 
             case DistType.NORMAL_2S:
-                return self._normalDist(2)
+                self._normalDist(2, _rng, _out, unit)
 
             case DistType.NORMAL_3S:
-                return self._normalDist(3)
+                self._normalDist(3, _rng, _out, unit)
 
             case DistType.CONSTANT:
-                return full((1, StackDim.N), self.nom)
+                _out.fill(self.nom)
 
             case _:
-                return self.rng.permutation(self.data)
+                raise ValueError(
+                    f"{self.key}: cannot sample a {self.disttype} distribution."
+                )
+
+        return _out
 
     def center(self, method=EvalType.WORSTCASE) -> float:
         """
@@ -184,7 +310,7 @@ class StackDim:
                 | EvalType.STATISTICAL_2S
                 | EvalType.STATISTICAL_3S
             ):
-                center = quantile(self.data, 0.5, method="median_unbiased")
+                center = self.quantile(0)
             case _:
                 raise ValueError(
                     f"{self.key}: cannot evaluate a center value with {method} method."
@@ -209,11 +335,11 @@ class StackDim:
             case EvalType.WORSTCASE:
                 lower = self.nom + self.minus
             case EvalType.STATISTICAL_1S:
-                lower = quantile(self.data, norm.sf(1), method="median_unbiased")
+                lower = self.quantile(-1)
             case EvalType.STATISTICAL_2S:
-                lower = quantile(self.data, norm.sf(2), method="median_unbiased")
+                lower = self.quantile(-2)
             case EvalType.STATISTICAL_3S:
-                lower = quantile(self.data, norm.sf(3), method="median_unbiased")
+                lower = self.quantile(-3)
             case _:
                 raise ValueError(
                     f"{self.key}: cannot evaluate a lower bound with {method} method."
@@ -254,11 +380,11 @@ class StackDim:
             case EvalType.WORSTCASE:
                 upper = self.nom + self.plus
             case EvalType.STATISTICAL_1S:
-                upper = quantile(self.data, norm.cdf(1), method="median_unbiased")
+                upper = self.quantile(1)
             case EvalType.STATISTICAL_2S:
-                upper = quantile(self.data, norm.cdf(2), method="median_unbiased")
+                upper = self.quantile(2)
             case EvalType.STATISTICAL_3S:
-                upper = quantile(self.data, norm.cdf(3), method="median_unbiased")
+                upper = self.quantile(3)
             case _:
                 raise ValueError(
                     f"{self.key}: cannot evaluate a lower bound with {method} method."
@@ -318,15 +444,28 @@ class StackDim:
             key=self.key,
         )
 
-    def _uniformDist(self) -> ndarray:
+    def _uniformDist(self, rng, out, unit=None) -> None:
         _low = self.nom + self.minus
         _high = self.nom + self.plus
-        return self.rng.uniform(_low, _high, (1, StackDim.N))
+        if unit is None:
+            rng.random(out=out)
+        else:
+            out[...] = unit
+        out *= _high - _low
+        out += _low
 
-    def _normalDist(self, scale) -> ndarray:
+    def _normalDist(self, scale, rng, out, unit=None) -> None:
         _mu = self.nom + 0.5 * (self.plus + self.minus)  # center of range, not nominal
         _sig = (self.plus - self.minus) / (2 * scale)  # 2x for +/- sigma
-        return self.rng.normal(_mu, _sig, (1, StackDim.N))
+        if unit is None:
+            rng.standard_normal(out=out)
+        else:
+            # scipy is imported on first use, so that importing the engine only loads numpy
+            from scipy.special import ndtri
+
+            ndtri(unit, out=out)  # inverse CDF of the standard normal
+        out *= _sig
+        out += _mu
 
     @staticmethod
     def _addStackDims(first: StackDim, second: StackDim) -> StackDim:
@@ -603,7 +742,8 @@ class StackDim:
         If both are StackDims, assumes distributions are uncorrelated.
 
         If other is a StackDim, flips the order of operators and calls the normal division
-        method. If other is a numeric value, creates a dummy constant StackDim for the division.
+        method. If other is a numeric value, creates a dummy constant StackDim for the division,
+        whose distribution is a scalar broadcast against this instance's samples.
 
         Parameters:
         other: Any
@@ -616,7 +756,9 @@ class StackDim:
         if isinstance(other, self.__class__):
             return StackDim._divStackDims(other, self)
         elif isinstance(other, (int, float)):
-            return StackDim._divStackDims(StackDim(other), self)
+            return StackDim._divStackDims(
+                StackDim(other, disttype=DistType.CONSTANT), self
+            )
         else:
             raise TypeError(
                 f"unsupported operand type(s) for /: '{self.__class__}' and '{type(other)}'"
@@ -640,7 +782,9 @@ class StackDim:
         if isinstance(other, self.__class__):
             return StackDim._expStackDims(self, other)
         elif isinstance(other, (int, float)):
-            return StackDim._expStackDims(self, StackDim(other))
+            return StackDim._expStackDims(
+                self, StackDim(other, disttype=DistType.CONSTANT)
+            )
         else:
             raise TypeError(
                 f"unsupported operand type(s) for **: '{self.__class__}' and '{type(other)}'"
@@ -664,7 +808,9 @@ class StackDim:
         if isinstance(other, self.__class__):
             return StackDim._expStackDims(other, self)
         elif isinstance(other, (int, float)):
-            return StackDim._expStackDims(StackDim(other), self)
+            return StackDim._expStackDims(
+                StackDim(other, disttype=DistType.CONSTANT), self
+            )
         else:
             raise TypeError(
                 f"unsupported operand type(s) for **: '{type(other)}' and '{self.__class__}'"
@@ -676,7 +822,7 @@ class StackDim:
             return StackDim(nominal=func(dim))
         elif isinstance(dim, StackDim):
             _nom = func(dim.nom)
-            (_plus, _minus) = bounds_func((dim.nom, dim.plus, dim.minus))
+            _plus, _minus = bounds_func((dim.nom, dim.plus, dim.minus))
             _type = DistType.DERIVED
             _sample = func(dim.dist())
             _note = "Derived."
@@ -0,0 +1,217 @@
+# Machine-readable export of the results of expressions, one record per expression
+
+from __future__ import annotations
+
+import csv
+import json
+from collections.abc import Iterator
+from math import isfinite
+from typing import TextIO
+
+from tolstack.StackAnalysis import AnalysisResult, ExpressionResult
+from tolstack.StackTypes import EngineType, ExportType
+
+# Version of the record schema, increased whenever fields are changed or removed. Fields are
+# only ever added at the end within a version.
+EXPORT_SCHEMA_VERSION = 1
+
+# Fields of each record, in order, which are also the columns of CSV exports. Missing bounds,
+# analyses that were not selected and values that are not finite are null in JSON Lines and
+# empty in CSV.
+EXPORT_FIELDS = (
+    "schema_version",
+    "source",
+    "key",
+    "note",
+    "method",
+    "engine",
+    "sampler",
+    "N",
+    "seed",
+    "nominal",
+    "center",
+    "lower",
+    "upper",
+    "upper_tol",
+    "lower_tol",
+    "lower_bound",
+    "upper_bound",
+    "lower_pass",
+    "upper_pass",
+    "pass",
+    "out_of_bounds_ppm",
+    "sensitivities",
+    "contributions",
+)
+
+# Fields holding numbers, booleans and maps of referenced values to numbers, as read from CSV
+_FLOAT_FIELDS = (
+    "nominal",
+    "center",
+    "lower",
+    "upper",
+    "upper_tol",
+    "lower_tol",
+    "lower_bound",
+    "upper_bound",
+    "out_of_bounds_ppm",
+)
+_INT_FIELDS = ("schema_version", "N", "seed")
+_BOOL_FIELDS = ("lower_pass", "upper_pass", "pass")
+_MAP_FIELDS = ("sensitivities", "contributions")
+
+
+def export_record(result: ExpressionResult, manifest: dict, source: str = None) -> dict:
+    """
+    Returns the export record of the result of an expression.
+
+    Parameters:
+    result (ExpressionResult): The result.
+    manifest (dict): The manifest of the analysis, see StackParser.manifest.
+    source (str): The analysis file, to tell apart records of several files.
+
+    Returns:
+    dict
+        The record, with the fields of EXPORT_FIELDS in order.
+    """
+    expr = result.expr
+    monte_carlo = result.engine is EngineType.MONTE_CARLO
+
+    # adaptive runs draw their own pseudo-random samples for each expression
+    sampler, N = manifest["sampler"], manifest["N"]
+    if manifest.get("adaptive") and result.value.data is not None:
+        sampler, N = "random", result.value.dist().size
+
+    return {
+        "schema_version": EXPORT_SCHEMA_VERSION,
+        "source": source,
+        "key": result.key,
+        "note": expr.note or "",
+        "method": str(expr.method),
+        "engine": str(result.engine),
+        "sampler": sampler if monte_carlo else None,
+        "N": N if monte_carlo else None,
+        "seed": manifest["seed"] if monte_carlo else None,
+        "nominal": _number(result.nom),
+        "center": _number(result.center),
+        "lower": _number(result.lower),
+        "upper": _number(result.upper),
+        "upper_tol": _number(result.upper_tol),
+        "lower_tol": _number(result.lower_tol),
+        "lower_bound": _number(expr.lower),
+        "upper_bound": _number(expr.upper),
+        "lower_pass": bool(result.lower_pass),
+        "upper_pass": bool(result.upper_pass),
+        "pass": bool(result.lower_pass and result.upper_pass),
+        "out_of_bounds_ppm": (
+            None
+            if result.yield_estimate is None
+            else _number(result.yield_estimate.ppm)
+        ),
+        "sensitivities": _map(result.sensitivities),
+        "contributions": _map(result.contributions),
+    }
+
+
+class ResultWriter:
+    """
+    Writes export records to a text stream one at a time, as JSON Lines or CSV.
+
+    Each record is written and flushed as soon as it is given, so exports of many expressions
+    or files never hold more than one record, and a partial export of an interrupted run is
+    still readable. JSON Lines hold one JSON object per line. CSV has a header row of
+    EXPORT_FIELDS, with booleans as true and false, and sensitivities and contributions as
+    JSON objects in their cells.
+
+    Attributes:
+    -----------
+    stream : TextIO
+        The stream written to, opened with newline="" for CSV.
+    export_type : ExportType
+        The format of the records.
+    count : int
+        The number of records written.
+    """
+
+    def __init__(self, stream: TextIO, export_type: ExportType) -> None:
+        self.stream = stream
+        self.export_type = export_type
+        self.count = 0
+
+        self._csv = None
+        if export_type is ExportType.CSV:
+            self._csv = csv.DictWriter(
+                stream, fieldnames=EXPORT_FIELDS, lineterminator="\n"
+            )
+            self._csv.writeheader()
+
+    def write(self, record: dict) -> None:
+        if self._csv is not None:
+            self._csv.writerow({key: _cell(value) for key, value in record.items()})
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.count += 1
+
+
+def export_results(
+    results: AnalysisResult, writers: list[ResultWriter], source: str = None
+) -> None:
+    """
+    Computes the results of an analysis one expression at a time, writing the record of each
+    as soon as it is computed.
+    """
+    manifest = results.parser.manifest()
+    for key in results.parser.expressions:
+        record = export_record(results.expression(key), manifest, source)
+        for writer in writers:
+            writer.write(record)
+
+
+def read_records(stream: TextIO, export_type: ExportType) -> Iterator[dict]:
+    """
+    Reads back the records written by a ResultWriter, with the types of their fields.
+    """
+    if export_type is not ExportType.CSV:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    for row in csv.DictReader(stream):
+        record = dict()
+        for key, cell in row.items():
+            if cell == "" and key != "note":
+                record[key] = None
+            elif key in _FLOAT_FIELDS:
+                record[key] = float(cell)
+            elif key in _INT_FIELDS:
+                record[key] = int(cell)
+            elif key in _BOOL_FIELDS:
+                record[key] = cell == "true"
+            elif key in _MAP_FIELDS:
+                record[key] = json.loads(cell)
+            else:
+                record[key] = cell
+        yield record
+
+
+def _number(value):
+    value = float(value)
+    return value if isfinite(value) else None
+
+
+def _map(values):
+    if values is None:
+        return None
+    return {var: _number(value) for var, value in values.items()}
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
@@ -2,9 +2,27 @@ from __future__ import annotations
 
 from tolstack.StackTree import TreeNode
 
-from tolstack.StackDim import StackDim
+from tolstack.StackDim import StackDim, SIGMA_LEVELS, QUANTILE_LEVELS
 
-from tolstack.StackTypes import get_eval_from_code
+from tolstack.StackOperators import get_operator
+
+from tolstack.StackProgram import StackProgram
+
+from tolstack.StackSampling import sample_parallel, sample_streaming, sample_adaptive
+
+from tolstack.StackConvolution import convolve_linear
+
+from tolstack.StackGrid import propagate_grid
+
+from tolstack.StackYield import estimate_yield, YieldEstimate
+
+from tolstack.StackTypes import (
+    get_eval_from_code,
+    get_sigma_from_eval,
+    EngineType,
+    EvalType,
+    DistType,
+)
 
 from tolstack.StackUtils import (
     parse_string_to_numeric,
@@ -13,6 +31,7 @@ from tolstack.StackUtils import (
     is_tree_operator,
     is_higher_precedence,
     needs_grouping,
+    main_effect,
 )
 
 from typing import Dict
@@ -20,7 +39,97 @@ from typing import Dict
 import numpy as np
 
 
+class EvaluationCache:
+    """
+    Memoizes the value computed for each node of an expression DAG.
+
+    Trees built by TreeParser splice the roots of previously defined expressions into later
+    expressions, so nodes are shared between StackExprs. Sharing one cache between all the
+    expressions of an analysis means each shared node is evaluated once, however many
+    expressions reference it. Entries are keyed on node identity and are only valid for the
+    value map they were computed with; binding a different value map clears the cache.
+    Compiled programs are cached the same way, keyed on the root node of the expression, as are
+    analyses of whole expressions such as tolerance contributions.
+
+    When values in the map are edited in place, invalidate drops only the entries that depend
+    on them, so the rest of the analysis is not recomputed.
+    """
+
+    def __init__(self) -> None:
+        self.value_map = None
+        self.values = dict()
+        self.references = dict()
+        self.programs = dict()
+        self.analyses = dict()
+
+    def bind(self, value_map) -> None:
+        if value_map is not self.value_map:
+            self.clear()
+            self.value_map = value_map
+
+    def clear(self) -> None:
+        self.values.clear()
+        self.references.clear()
+        self.programs.clear()
+        self.analyses.clear()
+
+    def referenced(self, node) -> set:
+        """
+        Returns the keys of the values in the map referenced by the subtree under a node.
+        """
+        if node in self.references:
+            return self.references[node]
+
+        if node.left is None and node.right is None:
+            references = {node.key} if node.key in self.value_map else set()
+        else:
+            _left = self.referenced(node.left) if node.left else set()
+            _right = self.referenced(node.right) if node.right else set()
+            references = _left | _right
+
+        self.references[node] = references
+        return references
+
+    def invalidate(self, keys) -> None:
+        """
+        Drops the cached results that depend on any of the given keys of the value map.
+        """
+        keys = set(keys)
+        for memo, node_of in (
+            (self.values, lambda entry: entry),
+            (self.programs, lambda entry: entry),
+            (self.analyses, lambda entry: entry[0]),
+        ):
+            for entry in [
+                entry for entry in memo if self.referenced(node_of(entry)) & keys
+            ]:
+                del memo[entry]
+
+    def prune(self, roots) -> None:
+        """
+        Drops the cached results of nodes that are no longer reachable from the given roots.
+        """
+        reachable = set()
+        pending = list(roots)
+        while pending:
+            node = pending.pop()
+            if node is None or node in reachable:
+                continue
+            reachable.add(node)
+            pending.extend((node.left, node.right))
+
+        for memo in (self.values, self.references, self.programs):
+            for node in [node for node in memo if node not in reachable]:
+                del memo[node]
+        for entry in [entry for entry in self.analyses if entry[0] not in reachable]:
+            del self.analyses[entry]
+
+
 class StackExpr:
+    # Default standard error of reported quantiles for adaptive evaluation, relative to the
+    # tolerance band, used unless an expression sets its own rtol
+    RTOL = 0.01
+
     def __init__(
         self,
         key: str,
@@ -30,6 +139,11 @@ class StackExpr:
         method: str,
         root: TreeNode,
         note: str = None,
+        cache: EvaluationCache = None,
+        rtol: float = None,
+        seed: np.random.SeedSequence = None,
+        results=None,
+        grid_size: int = None,
     ) -> None:
         self.key = key
         self.expr = expression
@@ -38,14 +152,137 @@ class StackExpr:
         self.method = get_eval_from_code(method)
         self.root = root
         self.note = note
+        self.value_map = None
+        self.cache = cache if cache is not None else EvaluationCache()
+        self.rtol = rtol
+        self.seed = seed
+        self.results = results
+        self.grid_size = grid_size
+        self.engine = None
 
     def __str__(self) -> str:
         return f"{self.expr} {self.note}"
 
-    def evaluate(self, value_map=None) -> StackDim:
+    def evaluate(
+        self,
+        value_map=None,
+        adaptive: bool = False,
+        seed=None,
+        engine: EngineType = EngineType.MONTE_CARLO,
+        grid_size: int = None,
+    ) -> StackDim:
+        """
+        Evaluates the expression, recording the evaluation engine used in self.engine.
+
+        Parameters:
+        value_map (dict): Map of defined values, if not already set.
+        adaptive (bool): Draw fresh Monte Carlo samples until the reported quantiles converge,
+            instead of using the shared samples of the analysis.
+        seed (int): Seed for adaptive sampling, defaults to the seed of the expression.
+        engine (EngineType): Highest order analytic engine to try for statistical expressions
+            before falling back to Monte Carlo, CONVOLUTION for the exact distribution of
+            expressions linear in their dimensions, or GRID for a deterministic grid over the
+            inputs of expressions with few inputs. Such results carry quantiles but no samples.
+        grid_size (int): The largest number of grid points of the GRID engine, defaults to the
+            grid size of the expression, see StackGrid.propagate_grid.
+
+        Monte Carlo values are looked up in the persistent results of the analysis, if set,
+        in which case they also carry a summary of their samples instead of the samples.
+        """
+        self._setValueOrError(value_map)
+
+        if engine is EngineType.CONVOLUTION:
+            result = self._evaluateConvolution()
+            if result is not None:
+                return result
+        elif engine is EngineType.GRID:
+            result = self._evaluateGrid(grid_size)
+            if result is not None:
+                return result
+        elif engine is not EngineType.MONTE_CARLO:
+            result = self._evaluateAnalytic(engine is EngineType.SECOND_ORDER)
+            if result is not None:
+                return result
+
+        self.engine = EngineType.MONTE_CARLO
+
+        if not adaptive:
+            if self.results is not None:
+                return self._analysis("value", self._evaluateCached)
+            return self._evaluate(self.root)
+
+        # draw fresh samples until the reported center and tolerance limits converge; worst
+        # case expressions only use samples for plots, so converge them at the 3 sigma limits
+        sigma = get_sigma_from_eval(self.method) or 3
+        levels = QUANTILE_LEVELS[[SIGMA_LEVELS.index(s) for s in (-sigma, 0, sigma)]]
+
+        program = self.compile()
+        return program.result(
+            sample_adaptive(program, levels, self._rtol(), self._seed(seed))
+        )
+
+    def evaluate_parallel(
+        self,
+        value_map=None,
+        N: int = None,
+        seed=None,
+        max_workers: int = None,
+        processes: bool = False,
+    ) -> StackDim:
+        """
+        Evaluates the expression over fresh samples drawn in chunks across a pool of workers.
+
+        Results are reproducible for a given seed and N, see StackSampling.sample_parallel.
+        """
+        program = self.compile(value_map)
+        sample = sample_parallel(
+            program, N, self._seed(seed), max_workers=max_workers, processes=processes
+        )
+        return program.result(sample)
+
+    def evaluate_streaming(
+        self,
+        value_map=None,
+        N: int = None,
+        seed=None,
+        max_workers: int = None,
+        processes: bool = False,
+    ) -> StackDim:
+        """
+        Evaluates the expression in bounded memory, keeping a quantile sketch instead of samples.
+
+        Quantiles match evaluate_parallel for the same seed and N, see
+        StackSampling.sample_streaming.
+        """
+        program = self.compile(value_map)
+        sketch, quantiles = sample_streaming(
+            program, N, self._seed(seed), max_workers=max_workers, processes=processes
+        )
+        return program.summary(sketch, quantiles)
+
+    def estimate_yield(self, value_map=None, N: int = None, seed=None) -> YieldEstimate:
+        """
+        Estimates the probability that the expression falls outside its lower and upper bounds.
+
+        Uses importance sampling toward the bounds, so reject rates of a few PPM are resolved with
+        a modest number of samples, see StackYield.estimate_yield.
+        """
         self._setValueOrError(value_map)
 
-        return self._evaluate(self.root)
+        def compute():
+            return estimate_yield(
+                self.compile(), self.lower, self.upper, N, self._seed(seed)
+            )
+
+        if N is not None or seed is not None:
+            return compute()
+
+        # only the default run is reproducible from the definition of the expression
+        if self.results is not None:
+            return self._analysis(
+                "yield", lambda: self.results.estimate_yield(self, compute)
+            )
+        return self._analysis("yield", compute)
 
     def derivative(self, key, value_map=None) -> float:
         self._setValueOrError(value_map)
@@ -54,43 +291,80 @@ class StackExpr:
 
         return partial
 
-    def sensitivities(self, value_map=None) -> Dict[str, float]:
+    def gradient(self, value_map=None) -> tuple[float, Dict[str, float]]:
         self._setValueOrError(value_map)
 
-        sensitivities = {}
         variables = self.referenced_values()
+        index = {var: i for i, var in enumerate(variables)}
+        nom, partials = self._evaluateGradient(self.root, index)
 
-        for var in variables:
-            partial = self.derivative(var)
-            sensitivities[var] = partial
+        return nom, dict(zip(variables, partials))
+
+    def sensitivities(self, value_map=None) -> Dict[str, float]:
+        nom, sensitivities = self.gradient(value_map)
 
         return sensitivities
 
     def contributions(self, value_map=None) -> Dict[str, float]:
         self._setValueOrError(value_map)
 
-        base = self.evaluate()
+        if self.results is not None:
+            return self._analysis(
+                "contributions",
+                lambda: self.results.contributions(self, self._contributions),
+            )
+        return self._analysis("contributions", self._contributions)
 
+    def _contributions(self) -> Dict[str, float]:
         contributions = {}
         variables = self.referenced_values()
 
+        if self.method is EvalType.WORSTCASE:
+            # worst case bounds are linear in each tolerance to first order, so removing the
+            # tolerance of a variable narrows the band by |df/dx| times its full width.
+            nom, partials = self.gradient()
+            for var in variables:
+                var_dim = self.value_map[var]
+                contributions[var] = abs(partials[var]) * var_dim.range() / 2
+            return contributions
+
+        # the samples of the result, which cached values do not keep, evaluated without
+        # changing the engine recorded for the reported result
+        base = self._evaluate(self.root)
+
         for var in variables:
-            mod = self._evaluate(self.root, var)
             var_dim = self.value_map[var]
 
             if var_dim.range() == 0:
                 contributions[var] = 0
             else:
-                # set contributions to zero if the statistical model happens to suggest
+                # Remove the main effect of the variable from the samples already used to
+                # evaluate the expression, approximating the result with that variable fixed.
+                residual = base.dist() - main_effect(var_dim.dist(), base.dist())
+                mod = StackDim(
+                    base.nom, base.plus, base.minus, DistType.DERIVED, residual
+                )
+
+                # set contributions to zero if the estimated main effect happens to suggest
                 # the tighter tolerance actually hurt overall tolerance, which should not be possible.
-                # If this happens, it is a result of limitations in the Monte Carlo simulation for a
-                # statistical analysis.
+                # If this happens, it is a result of sampling noise in the binned estimate.
                 contributions[var] = max(
                     (base.range(self.method) - mod.range(self.method)) / 2, 0
                 )
 
         return contributions
 
+    def compile(self, value_map=None) -> StackProgram:
+        self._setValueOrError(value_map)
+        self.cache.bind(self.value_map)
+
+        if self.root not in self.cache.programs:
+            self.cache.programs[self.root] = StackProgram(
+                self.root, self.value_map, self.key
+            )
+
+        return self.cache.programs[self.root]
+
     def expand(self):
         return self._format_tree(self.root)
 
@@ -100,15 +374,23 @@ class StackExpr:
     def set_value_map(self, value_map):
         self.value_map = value_map
 
-    def _evaluate(self, node, ideal_key=None):
+    def _evaluate(self, node):
+        self.cache.bind(self.value_map)
+        memo = self.cache.values
+
+        if node in memo:
+            return memo[node]
+
         # base case, node refers to a StackDim input variable or scalar
         if node.left is None and node.right is None:
-            return self._getLeafValue(node.key, ideal_key)
-
-        _left = self._evaluate(node.left, ideal_key) if node.left else None
-        _right = self._evaluate(node.right, ideal_key) if node.right else None
+            value = self._getLeafValue(node.key)
+        else:
+            _left = self._evaluate(node.left) if node.left else None
+            _right = self._evaluate(node.right) if node.right else None
+            value = self._apply_operation(node.key, _left, _right)
 
-        return self._apply_operation(node.key, _left, _right)
+        memo[node] = value
+        return value
 
     def _evaluateDerivative(self, node, key) -> tuple[float, float]:
         # base case, node refers to a StackDim input variable or scalar
@@ -135,80 +417,273 @@ class StackExpr:
 
         return self._apply_operation(node.key, _left, _right, _dleft, _dright)
 
-    def _apply_operation(self, op, left, right, dleft=None, dright=None):
-        operations = {
-            "+": (lambda l, r: l + r, lambda l, r, dl, dr: (l + r, dl + dr)),
-            "-": (lambda l, r: l - r, lambda l, r, dl, dr: (l - r, dl - dr)),
-            "*": (
-                lambda l, r: l * r,
-                # product rule
-                lambda l, r, dl, dr: (l * r, l * dr + r * dl),
-            ),
-            "/": (
-                lambda l, r: l / r,
-                # low dhigh minus high dlow, square the bottom and away we go
-                lambda l, r, dl, dr: (l / r, (r * dl - l * dr) / (r**2)),
-            ),
-            "^": (
-                lambda l, r: l**r,
-                lambda l, r, dl, dr: (l**r, l**r * (dl * (r / l) + dr * np.log(l))),
-            ),
-            "u-": (lambda _, r: -r, lambda _, r, __, dr: (-r, -dr)),
-            "sin": (
-                lambda _, r: StackDim.sin(r),
-                lambda _, r, __, dr: (np.sin(r), np.cos(r) * dr),
-            ),
-            "sind": (
-                lambda _, r: StackDim.sind(r),
-                lambda _, r, __, dr: (
-                    np.sin(r * np.pi / 180),
-                    np.cos(r * np.pi / 180) * (dr * np.pi / 180),
-                ),
-            ),
-            "cos": (
-                lambda _, r: StackDim.cos(r),
-                lambda _, r, __, dr: (np.cos(r), -np.sin(r) * dr),
-            ),
-            "cosd": (
-                lambda _, r: StackDim.cosd(r),
-                lambda _, r, __, dr: (
-                    np.cos(r * np.pi / 180),
-                    -np.sin(r * np.pi / 180) * (dr * np.pi / 180),
-                ),
-            ),
-            "tan": (
-                lambda _, r: StackDim.tan(r),
-                lambda _, r, __, dr: (
-                    np.tan(r),
-                    ((4 * np.cos(r) ** 2) / (np.cos(2 * r) + 1) ** 2) * dr,
-                ),
-            ),
-            "tand": (
-                lambda _, r: StackDim.tand(r),
-                lambda _, r, __, dr: (
-                    np.tan(r * np.pi / 180),
-                    (
-                        (4 * np.cos(r * np.pi / 180) ** 2)
-                        / (np.cos(2 * r * np.pi / 180) + 1) ** 2
-                    )
-                    * (dr * np.pi / 180),
-                ),
-            ),
-        }
-
-        try:
-            operation, derivative_operation = operations[op]
-            if (
-                dright is not None
-            ):  # applying derivative operation to unary or binary operator
-                return derivative_operation(left, right, dleft, dright)
+    def _evaluateAnalytic(self, second_order=False) -> StackDim:
+        # propagate the mean and variance of the inputs through a Taylor expansion of the
+        # expression about their means, returning None when the normal distribution with those
+        # moments would misplace the reported quantiles by more than rtol of the tolerance band
+        sigma = get_sigma_from_eval(self.method)
+        if sigma is None:
+            return None
+
+        if self._hasDerivedValues():
+            return None
+
+        variables = self.referenced_values()
+        means, variances, kurtosis = (
+            np.array([self.value_map[var].moments() for var in variables])
+            .reshape(-1, 3)
+            .T
+        )
+
+        index = {var: i for i, var in enumerate(variables)}
+        values = dict(zip(variables, means))
+        mean, gradient = self._evaluateGradient(self.root, index, values=values)
+
+        var = np.sum(gradient**2 * variances)
+        tol = self._rtol() * 2 * sigma * np.sqrt(var)
+
+        # second order terms, for independent inputs symmetric about their means
+        H = self._hessian(index, values, variances)
+        shift = 0.5 * np.sum(np.diag(H) * variances)
+        var2 = 0.5 * np.sum(H**2 * np.outer(variances, variances)) + 0.25 * np.sum(
+            np.diag(H) ** 2 * variances**2 * kurtosis
+        )
+
+        if var == 0:
+            # a constant result is exact, otherwise the linear terms vanish at the mean and
+            # the result is far from normal
+            if var2 > 0 or shift != 0:
+                return None
+            engine = EngineType.FIRST_ORDER
+        else:
+            # non-normal inputs make the result non-normal, estimate the shift of the quantiles
+            # from the excess kurtosis of the linear terms, and from the skewness added by the
+            # second order terms (Cornish-Fisher)
+            k4 = np.sum(gradient**4 * variances**2 * kurtosis) / var**2
+            if abs((sigma**3 - 3 * sigma) / 24 * k4) * np.sqrt(var) > tol:
+                return None
+
+            Sg = variances * gradient
+            HS = H * variances
+            k3 = 3 * Sg @ H @ Sg + np.trace(HS @ HS @ HS)
+            skew = abs((sigma**2 - 1) / 6 * k3 / (var + var2))
+
+            first_error = (
+                abs(shift) + sigma * (np.sqrt(var + var2) - np.sqrt(var)) + skew
+            )
+            if first_error <= tol:
+                engine = EngineType.FIRST_ORDER
+            elif second_order and skew <= tol:
+                engine = EngineType.SECOND_ORDER
+                mean += shift
+                var += var2
             else:
-                return operation(left, right)
-        except KeyError:
-            raise ValueError(
-                f"Error computing '{op}' when evaluating expression, operation not defined."
+                return None
+
+        quantiles = mean + np.sqrt(var) * np.array(SIGMA_LEVELS)
+
+        self.engine = engine
+        return self.compile().summary(None, quantiles)
+
+    def _evaluateConvolution(self) -> StackDim:
+        # the distribution of a linear combination of independent dimensions is the convolution
+        # of their scaled distributions, returning None for expressions that are not linear
+        if get_sigma_from_eval(self.method) is None or self._hasDerivedValues():
+            return None
+
+        linear = self._linearTerms(self.root, dict())
+        if linear is None:
+            return None
+
+        offset, coefficients = linear
+        terms = [
+            (coefficient, self.value_map[var])
+            for var, coefficient in coefficients.items()
+            if coefficient != 0
+        ]
+        quantiles = convolve_linear(offset, terms, QUANTILE_LEVELS)
+
+        self.engine = EngineType.CONVOLUTION
+        return self.compile().summary(None, quantiles)
+
+    def _evaluateGrid(self, grid_size=None) -> StackDim:
+        # propagate a weighted grid over the inputs through the compiled expression, returning
+        # None when there are too many inputs for the grid to resolve them
+        if get_sigma_from_eval(self.method) is None or self._hasDerivedValues():
+            return None
+
+        program = self.compile()
+        if grid_size is None:
+            grid_size = self.grid_size
+        quantiles = propagate_grid(program, QUANTILE_LEVELS, size=grid_size)
+        if quantiles is None:
+            return None
+
+        self.engine = EngineType.GRID
+        return program.summary(None, quantiles)
+
+    def _hasDerivedValues(self) -> bool:
+        # values known only by their samples, such as reloaded results, have no analytical
+        # distribution for the analytic engines, and cannot be compiled
+        return any(
+            self.value_map[var].disttype is DistType.DERIVED
+            for var in self.referenced_values()
+        )
+
+    def _linearTerms(self, node, memo) -> tuple[float, Dict[str, float]]:
+        # the expression as offset + sum(coefficient * dimension), or None if it is not linear
+        # in its dimensions. Repeated references to a dimension add to its coefficient.
+        if node in memo:
+            return memo[node]
+
+        if node.left is None and node.right is None:
+            value = self._getLeafValue(node.key)
+            if not isinstance(value, StackDim):
+                result = (value, dict())
+            elif value.is_scalar():
+                result = (float(value.dist()), dict())
+            elif value.disttype is DistType.DERIVED:
+                result = None
+            else:
+                result = (0.0, {value.key: 1.0})
+
+            memo[node] = result
+            return result
+
+        operator = get_operator(node.key)
+        children = (node.right,) if operator.unary else (node.left, node.right)
+        operands = [self._linearTerms(child, memo) for child in children]
+
+        if any(operand is None for operand in operands):
+            result = None
+        elif not any(coefficients for _, coefficients in operands):
+            # fold operations on constants
+            value = operator.kernel(*[np.float64(offset) for offset, _ in operands])
+            result = (float(value), dict())
+        else:
+            result = self._combineLinearTerms(node.key, operands)
+
+        memo[node] = result
+        return result
+
+    @staticmethod
+    def _combineLinearTerms(op, operands):
+        def scale(terms, factor):
+            offset, coefficients = terms
+            return (
+                offset * factor,
+                {var: c * factor for var, c in coefficients.items()},
             )
 
+        def add(first, second):
+            coefficients = dict(first[1])
+            for var, c in second[1].items():
+                coefficients[var] = coefficients.get(var, 0.0) + c
+            return (first[0] + second[0], coefficients)
+
+        match op:
+            case "u-":
+                return scale(operands[0], -1)
+            case "+":
+                return add(*operands)
+            case "-":
+                return add(operands[0], scale(operands[1], -1))
+            case "*":
+                left, right = operands
+                if not left[1]:
+                    return scale(right, left[0])
+                if not right[1]:
+                    return scale(left, right[0])
+            case "/":
+                left, right = operands
+                if not right[1] and right[0] != 0:
+                    return scale(left, 1 / right[0])
+
+        return None
+
+    def _hessian(self, index, values, variances) -> np.ndarray:
+        # central differences of the forward mode gradient, stepping each variable by a
+        # small fraction of its standard deviation
+        H = np.zeros((len(index), len(index)))
+
+        for var, i in index.items():
+            if variances[i] == 0:
+                continue
+
+            step = 1e-4 * np.sqrt(variances[i])
+            _, upper = self._evaluateGradient(
+                self.root, index, values=values | {var: values[var] + step}
+            )
+            _, lower = self._evaluateGradient(
+                self.root, index, values=values | {var: values[var] - step}
+            )
+            H[:, i] = (upper - lower) / (2 * step)
+
+        return (H + H.T) / 2
+
+    def _seed(self, seed):
+        # runs without their own seed use a fresh copy of the seed of the expression, so that
+        # repeated runs spawn the same child streams
+        if seed is not None or self.seed is None:
+            return seed
+        return np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key)
+
+    def _rtol(self) -> float:
+        return self.rtol if self.rtol is not None else StackExpr.RTOL
+
+    def _evaluateGradient(
+        self, node, index, memo=None, values=None
+    ) -> tuple[float, np.ndarray]:
+        # forward mode differentiation, carrying the partials with respect to all variables
+        # at once so that the full gradient takes a single pass over the expression DAG.
+        # Variables are evaluated at their centers unless given in values.
+        if memo is None:
+            memo = dict()
+
+        if node in memo:
+            return memo[node]
+
+        # base case, node refers to a StackDim input variable or scalar
+        if node.left is None and node.right is None:
+            value = self._getLeafValue(node.key)
+            partials = np.zeros(len(index))
+
+            if not isinstance(value, StackDim):
+                # scalars always have 0 derivative
+                result = (value, partials)
+            else:
+                if value.key in index:
+                    partials[index[value.key]] = 1
+                if values is not None and value.key in values:
+                    result = (values[value.key], partials)
+                else:
+                    result = (value.center(self.method), partials)
+        else:
+            _left, _dleft = (
+                self._evaluateGradient(node.left, index, memo, values)
+                if node.left
+                else (None, None)
+            )
+            _right, _dright = (
+                self._evaluateGradient(node.right, index, memo, values)
+                if node.right
+                else (None, None)
+            )
+            result = self._apply_operation(node.key, _left, _right, _dleft, _dright)
+
+        memo[node] = result
+        return result
+
+    def _apply_operation(self, op, left, right, dleft=None, dright=None):
+        operator = get_operator(op)
+
+        if (
+            dright is not None
+        ):  # applying derivative operation to unary or binary operator
+            return operator.derivative(left, right, dleft, dright)
+        else:
+            return operator.evaluate(left, right)
+
     def _format_tree(self, node):
         if (
             node.left is None and node.right is None
@@ -219,17 +694,19 @@ class StackExpr:
         _left = self._format_tree(node.left) if node.left else None
         _right = self._format_tree(node.right) if node.right else None
 
-        if _left:
-            _left_grouped = self._group_child(
-                _left, node.left.key, node.key, left_child=True
-            )
-            _right_grouped = self._group_child(
-                _right, node.right.key, node.key, left_child=False
-            )
+        operator = get_operator(node.key, "formatting tree")
 
-            return f"{_left_grouped} {node.key} {_right_grouped}"
-        else:
-            return self._handle_unary_operator(node.key, _right)
+        if operator.unary:
+            return operator.format(None, _right)
+
+        _left_grouped = self._group_child(
+            _left, node.left.key, node.key, left_child=True
+        )
+        _right_grouped = self._group_child(
+            _right, node.right.key, node.key, left_child=False
+        )
+
+        return operator.format(_left_grouped, _right_grouped)
 
     def _group_child(self, child_str, child_key, parent_key, left_child=True):
         if is_tree_operator(child_key):
@@ -248,44 +725,27 @@ class StackExpr:
 
         return child_str
 
-    def _handle_unary_operator(self, operator, operand):
-        match operator:
-            case "u-":
-                return f"-{operand}"
-            case "sin":
-                return f"sin({operand})"
-            case "sind":
-                return f"sind({operand})"
-            case "cos":
-                return f"cos({operand})"
-            case "cosd":
-                return f"cosd({operand})"
-            case "tan":
-                return f"tan({operand})"
-            case "tand":
-                return f"tand({operand})"
-            case _:
-                raise ValueError(
-                    f"Error computing '{operator}' when formatting tree, unary operation {operator} not defined."
-                )
-
     def _referenced_values(self, node):
-        if node.left is None and node.right is None:
-            return {node.key} if node.key in self.value_map else set()
+        self.cache.bind(self.value_map)
 
-        _left = self._referenced_values(node.left) if node.left else set()
-        _right = self._referenced_values(node.right) if node.right else set()
+        return self.cache.referenced(node)
 
-        return _left | _right
+    def _analysis(self, name, compute):
+        # results of the whole expression, kept until the values they depend on are edited;
+        # expressions can share a root node, so the key includes what else the result uses
+        self.cache.bind(self.value_map)
 
-    def _getLeafValue(self, key, ideal_key=None):
+        entry = (self.root, name, self.key, self.method, self.lower, self.upper)
+        if entry not in self.cache.analyses:
+            self.cache.analyses[entry] = compute()
+        return self.cache.analyses[entry]
+
+    def _evaluateCached(self):
+        return self.results.value(self, lambda: self._evaluate(self.root))
+
+    def _getLeafValue(self, key):
         if key in self.value_map:
-            value = self.value_map[key]
-            if not isinstance(value, StackDim):
-                return value
-            if ideal_key and ideal_key == key:
-                return value.ideal(self.method)
-            return value
+            return self.value_map[key]
 
         if is_numeric_string(key):
             return parse_string_to_numeric(key)
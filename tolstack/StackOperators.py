@@ -0,0 +1,224 @@
+# Registry of the operators that can appear in an expression tree
+
+from __future__ import annotations
+
+import numpy as np
+
+from tolstack.StackDim import StackDim
+
+from tolstack.StackUtils import (
+    mulCombination,
+    divCombination,
+    expCombination,
+    sinBounds,
+    cosBounds,
+    tanBounds,
+)
+
+# Degrees to radians
+DEG = np.pi / 180
+
+
+class Operator:
+    """
+    Everything needed to apply one operator of an expression tree.
+
+    Unary operators act on the right child of their node, and are called with None in place of
+    the left operand, matching the layout of the trees built by TreeParser.
+
+    Attributes:
+    -----------
+    symbol : str
+        The operator token used in expression trees.
+    unary : bool
+        Whether the operator takes a single operand.
+    evaluate : callable
+        (left, right) -> value, applied to StackDims or scalars.
+    derivative : callable
+        (left, right, dleft, dright) -> (value, partial), applied to nominal values and their
+        partials. Partials may be scalars or arrays of partials with respect to several variables.
+    kernel : callable
+        Vectorized sample kernel, called as kernel(*operands, out=buffer).
+    bounds : callable
+        Worst-case interval of the result, from the (nominal, plus, minus) tuples of the operands.
+    template : str
+        Format string used to write the operator and its operands back into an expression.
+    """
+
+    def __init__(
+        self, symbol, unary, evaluate, derivative, kernel, bounds, template
+    ) -> None:
+        self.symbol = symbol
+        self.unary = unary
+        self.evaluate = evaluate
+        self.derivative = derivative
+        self.kernel = kernel
+        self.bounds = bounds
+        self.template = template
+
+    def format(self, left, right) -> str:
+        if self.unary:
+            return self.template.format(right)
+        return self.template.format(left, right)
+
+
+def get_operator(op: str, action: str = "evaluating expression") -> Operator:
+    """
+    Returns the registered Operator for an operator token.
+
+    Raises:
+    ValueError: If the operator is not defined.
+    """
+    try:
+        return OPERATIONS[op]
+    except KeyError:
+        raise ValueError(
+            f"Error computing '{op}' when {action}, operation not defined."
+        )
+
+
+class _Degrees:
+    # sample kernel applying a trig function to an angle in degrees, as a class so that
+    # compiled programs can be pickled for worker processes
+    def __init__(self, func) -> None:
+        self.func = func
+
+    def __call__(self, a, out=None):
+        return self.func(np.multiply(a, DEG, out=out), out=out)
+
+
+def _radians(interval):
+    return tuple(value * DEG for value in interval)
+
+
+def _sub_bounds(a, b):
+    return (a[0] - b[0], a[1] - b[2], a[2] - b[1])
+
+
+def _trig_bounds(func, bounds_func, degrees=False):
+    def bounds(a):
+        if degrees:
+            a = _radians(a)
+        return (func(a[0]), *bounds_func(a))
+
+    return bounds
+
+
+OPERATIONS = {
+    "+": Operator(
+        "+",
+        False,
+        lambda l, r: l + r,
+        lambda l, r, dl, dr: (l + r, dl + dr),
+        np.add,
+        lambda a, b: (a[0] + b[0], a[1] + b[1], a[2] + b[2]),
+        "{} + {}",
+    ),
+    "-": Operator(
+        "-",
+        False,
+        lambda l, r: l - r,
+        lambda l, r, dl, dr: (l - r, dl - dr),
+        np.subtract,
+        _sub_bounds,
+        "{} - {}",
+    ),
+    "*": Operator(
+        "*",
+        False,
+        lambda l, r: l * r,
+        # product rule
+        lambda l, r, dl, dr: (l * r, l * dr + r * dl),
+        np.multiply,
+        lambda a, b: (a[0] * b[0], *mulCombination(a, b)),
+        "{} * {}",
+    ),
+    "/": Operator(
+        "/",
+        False,
+        lambda l, r: l / r,
+        # low dhigh minus high dlow, square the bottom and away we go
+        lambda l, r, dl, dr: (l / r, (r * dl - l * dr) / (r**2)),
+        np.divide,
+        lambda a, b: (a[0] / b[0], *divCombination(a, b)),
+        "{} / {}",
+    ),
+    "^": Operator(
+        "^",
+        False,
+        lambda l, r: l**r,
+        lambda l, r, dl, dr: (l**r, l**r * (dl * (r / l) + dr * np.log(l))),
+        np.power,
+        lambda a, b: (a[0] ** b[0], *expCombination(a, b)),
+        "{} ^ {}",
+    ),
+    "u-": Operator(
+        "u-",
+        True,
+        lambda _, r: -r,
+        lambda _, r, __, dr: (-r, -dr),
+        np.negative,
+        lambda a: (-a[0], -a[2], -a[1]),
+        "-{}",
+    ),
+    "sin": Operator(
+        "sin",
+        True,
+        lambda _, r: StackDim.sin(r),
+        lambda _, r, __, dr: (np.sin(r), np.cos(r) * dr),
+        np.sin,
+        _trig_bounds(np.sin, sinBounds),
+        "sin({})",
+    ),
+    "sind": Operator(
+        "sind",
+        True,
+        lambda _, r: StackDim.sind(r),
+        lambda _, r, __, dr: (np.sin(r * DEG), np.cos(r * DEG) * (dr * DEG)),
+        _Degrees(np.sin),
+        _trig_bounds(np.sin, sinBounds, degrees=True),
+        "sind({})",
+    ),
+    "cos": Operator(
+        "cos",
+        True,
+        lambda _, r: StackDim.cos(r),
+        lambda _, r, __, dr: (np.cos(r), -np.sin(r) * dr),
+        np.cos,
+        _trig_bounds(np.cos, cosBounds),
+        "cos({})",
+    ),
+    "cosd": Operator(
+        "cosd",
+        True,
+        lambda _, r: StackDim.cosd(r),
+        lambda _, r, __, dr: (np.cos(r * DEG), -np.sin(r * DEG) * (dr * DEG)),
+        _Degrees(np.cos),
+        _trig_bounds(np.cos, cosBounds, degrees=True),
+        "cosd({})",
+    ),
+    "tan": Operator(
+        "tan",
+        True,
+        lambda _, r: StackDim.tan(r),
+        lambda _, r, __, dr: (
+            np.tan(r),
+            ((4 * np.cos(r) ** 2) / (np.cos(2 * r) + 1) ** 2) * dr,
+        ),
+        np.tan,
+        _trig_bounds(np.tan, tanBounds),
+        "tan({})",
+    ),
+    "tand": Operator(
+        "tand",
+        True,
+        lambda _, r: StackDim.tand(r),
+        lambda _, r, __, dr: (
+            np.tan(r * DEG),
+            ((4 * np.cos(r * DEG) ** 2) / (np.cos(2 * r * DEG) + 1) ** 2) * (dr * DEG),
+        ),
+        _Degrees(np.tan),
+        _trig_bounds(np.tan, tanBounds, degrees=True),
+        "tand({})",
+    ),
+}
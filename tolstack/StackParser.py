@@ -1,25 +1,63 @@
 from collections import defaultdict
 
 from tolstack.StackDim import StackDim
-from tolstack.StackUtils import parse_string_to_numeric, percent_to_fraction, word_wrap
+from tolstack.StackUtils import (
+    parse_string_to_numeric,
+    percent_to_fraction,
+    word_wrap,
+    infix_to_rpn,
+)
 
-from tolstack.StackExpr import StackExpr
+from tolstack.StackExpr import StackExpr, EvaluationCache
 
 from tolstack.StackTree import TreeParser
 
-from tolstack.StackTypes import DistType
-from tolstack.StackTypes import get_dist_from_code
+from tolstack.StackSampling import (
+    SampleContext,
+    stream_seed,
+    is_leaf,
+    EXPRESSION_STREAM,
+)
+
+from tolstack.StackResultCache import ResultCache, AnalysisResults
+
+from tolstack.StackTypes import DistType, SamplerType, EngineType
+from tolstack.StackTypes import get_dist_from_code, get_code_from_sampler
+
+from tolstack.AppConfig import AppConfig
+
+import numpy as np
 
 
 class StackParser:
 
-    def __init__(self):
+    def __init__(
+        self,
+        sampler: SamplerType = SamplerType.RANDOM,
+        seed: int = None,
+        result_cache: ResultCache = None,
+        engine: EngineType = EngineType.MONTE_CARLO,
+        grid_size: int = None,
+        rtol: float = None,
+        adaptive: bool = False,
+    ):
+        self.sampler = sampler
+        self.seed = seed
+        self.engine = engine
+        self.grid_size = grid_size
+        self.rtol = rtol
+        self.adaptive = adaptive
+        self.result_cache = result_cache
         self.constants = dict()
         self.dimensions = dict()
         self.where_used = defaultdict(set)
         self.expressions = dict()
         self.category = None
         self.TP = None
+        self.context = None
+        self.cache = EvaluationCache()
+        self.results = None
+        self._rows = None
 
     def parse(self, constants_data, dimensions_data, expressions_data):
         for constant_row in constants_data:
@@ -27,11 +65,177 @@ class StackParser:
         for dimension_row in dimensions_data:
             self._handle_dimensions_tokens(dimension_row)
 
+        # Without a seed, reuse the one last drawn for the same dimensions, so that reopening
+        # an analysis finds the results cached by its last run.
+        seed = self.seed
+        if seed is None and self.result_cache is not None:
+            seed = self.result_cache.seed(
+                {
+                    "dimensions": [list(row) for row in dimensions_data],
+                    "sampler": get_code_from_sampler(self.sampler),
+                }
+            )
+
+        # Sample every dimension once, so all expressions share the same draws.
+        self.context = SampleContext(sampler=self.sampler, seed=seed)
+        self.context.draw(self.dimensions.values())
+
+        self.results = None
+        if self.result_cache is not None:
+            analysis = self.manifest()
+            if self.sampler is not SamplerType.RANDOM:
+                analysis["leaves"] = sorted(self.context.keys)
+            self.results = AnalysisResults(self.result_cache, analysis)
+
         self.TP = TreeParser(self.constants | self.dimensions)
 
         for expr_row in expressions_data:
             self._handle_expressions_tokens(expr_row)
 
+        self._rows = self._snapshot(constants_data, dimensions_data, expressions_data)
+
+    def update(self, constants_data, dimensions_data, expressions_data) -> set[str]:
+        """
+        Brings the analysis up to date with edited tables, recomputing only what the edits affect.
+
+        Rows are compared with those of the last parse or update. Constants and dimensions whose
+        rows changed are redefined in place, edited leaf dimensions are resampled from their own
+        streams (see SampleContext.redraw), and only the cached results that depend on them are
+        dropped. Expressions whose rows changed are rebuilt, along with the expressions built on
+        them. Everything else keeps its samples, compiled programs and cached results.
+
+        Adding, removing or reordering constants or dimensions, reordering expressions, or
+        turning a dimension into a constant or back, re-parses the whole analysis instead.
+
+        Returns:
+        set[str]
+            Keys of the expressions whose results may have changed.
+        """
+        rows = self._snapshot(constants_data, dimensions_data, expressions_data)
+
+        try:
+            affected = self._update(rows) if self._rows is not None else None
+        except Exception:
+            # the analysis is partly updated, so parse everything on the next update
+            self._rows = None
+            raise
+
+        if affected is None:
+            self._reset()
+            self.parse(constants_data, dimensions_data, expressions_data)
+            return set(self.expressions)
+
+        self._rows = rows
+        return affected
+
+    def manifest(self):
+        """
+        Returns what is needed to regenerate the results of the last parse bit-for-bit.
+
+        The seed is the one actually used, including one drawn or reused when no seed was given.
+        """
+        return {
+            "app_version": AppConfig.app_version,
+            "file_format_version": AppConfig.file_format_version,
+            "numpy_version": np.__version__,
+            "seed": self.context.seed if self.context else self.seed,
+            "N": self.context.N if self.context else None,
+            "sampler": get_code_from_sampler(self.sampler),
+            "engine": str(self.engine),
+            "grid_size": self.grid_size,
+            "rtol": self.rtol,
+            "adaptive": self.adaptive,
+        }
+
+    @staticmethod
+    def _snapshot(constants_data, dimensions_data, expressions_data):
+        return tuple(
+            [tuple(row) for row in data]
+            for data in (constants_data, dimensions_data, expressions_data)
+        )
+
+    def _reset(self):
+        self.constants = dict()
+        self.dimensions = dict()
+        self.where_used = defaultdict(set)
+        self.expressions = dict()
+        self.cache.clear()
+        self._rows = None
+
+    def _update(self, rows):
+        # returns the affected expressions, or None if the edits need a full parse
+        # keyed as in the maps of the parser, which strip the keys of values only
+        old_constants, old_dimensions = [
+            {row[0].strip(): row for row in data} for data in self._rows[:2]
+        ]
+        new_constants, new_dimensions = [
+            {row[0].strip(): row for row in data} for data in rows[:2]
+        ]
+        old_expressions = {row[0]: row for row in self._rows[2]}
+        new_expressions = {row[0]: row for row in rows[2]}
+
+        # repeated keys override each other, which only a full parse reproduces
+        for data, keyed in zip(rows, (new_constants, new_dimensions, new_expressions)):
+            if len(keyed) != len(data):
+                return None
+
+        if list(old_constants) != list(new_constants):
+            return None
+        if list(old_dimensions) != list(new_dimensions):
+            return None
+        kept = [key for key in new_expressions if key in old_expressions]
+        if kept != [key for key in old_expressions if key in new_expressions]:
+            return None
+
+        edited = []
+        for key, row in new_constants.items():
+            if row != old_constants[key]:
+                self._handle_constants_tokens(row)
+                edited.append(key)
+
+        for key, row in new_dimensions.items():
+            if row != old_dimensions[key]:
+                old = self.dimensions[key]
+                self._handle_dimensions_tokens(row)
+                if is_leaf(old) != is_leaf(self.dimensions[key]):
+                    return None
+                edited.append(key)
+
+        values = self.constants | self.dimensions
+        for key in edited:
+            value = values[key]
+            self.TP.value_map[key] = value
+            if key in self.dimensions and is_leaf(value):
+                self.context.redraw(value)
+        self.cache.invalidate(edited)
+
+        # rebuild edited expressions and those built on them, in order, so that rebuilt
+        # trees splice in the rebuilt roots of the expressions they reference
+        rebuilt = set(old_expressions) - set(new_expressions)
+        for key in rebuilt:
+            del self.expressions[key]
+            del self.TP.expression_map[key]
+
+        for key, row in new_expressions.items():
+            tokens = set(infix_to_rpn(row[1]))
+            if row != old_expressions.get(key) or tokens & rebuilt:
+                self._handle_expressions_tokens(list(row))
+                rebuilt.add(key)
+
+        self.expressions = {key: self.expressions[key] for key in new_expressions}
+
+        self.where_used = defaultdict(set)
+        for expr in self.expressions.values():
+            for var_key in expr.referenced_values():
+                self.where_used[var_key].add(expr.key)
+        self.cache.prune([expr.root for expr in self.expressions.values()])
+
+        return {
+            key
+            for key, expr in self.expressions.items()
+            if key in rebuilt or set(expr.referenced_values()) & set(edited)
+        }
+
     def _handle_category(self, line):
         match self.category:
             case "versioninfo":
@@ -166,6 +370,11 @@ class StackParser:
             method=_method,
             root=_root,
             note=_note,
+            cache=self.cache,
+            seed=stream_seed(self.context.seed, EXPRESSION_STREAM, _key),
+            results=self.results,
+            grid_size=self.grid_size,
+            rtol=self.rtol,
         )
         _expr.set_value_map(self.TP.value_map)
 
@@ -0,0 +1,260 @@
+# Expression trees compiled to a flat list of operations on preallocated sample buffers
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import numpy as np
+from numpy import ndarray
+
+from tolstack.StackDim import StackDim
+from tolstack.StackTree import TreeNode
+from tolstack.StackTypes import DistType
+
+from tolstack.StackOperators import get_operator
+
+from tolstack.StackUtils import parse_string_to_numeric, is_numeric_string
+
+# Operand kinds for compiled instructions
+REGISTER = 0
+LEAF = 1
+CONSTANT = 2
+
+
+class StackProgram:
+    """
+    An expression DAG lowered to a linear, register-based list of operations.
+
+    Compiling walks the DAG once: each shared node becomes a single instruction, operations on
+    constants are folded, and the worst-case interval (nominal, plus, minus) of the result is
+    computed in a parallel scalar pass. Running the program evaluates the instructions in order
+    with ufunc out= arguments over a set of sample buffers that is allocated on the first run and
+    reused by later runs with the same number of samples. Registers are reused as soon as their
+    value is no longer needed, so the buffers grow with the width of the DAG, not its size.
+
+    Attributes:
+    -----------
+    key : str
+        Key of the compiled expression.
+    leaves : list[str]
+        Keys of the sampled dimensions read by the program, in input order.
+    leaf_dims : list[StackDim]
+        The sampled dimensions read by the program, in input order.
+    instructions : list[tuple]
+        The operations, as (kernel, output register, operands).
+    n_registers : int
+        Number of sample buffers used by the program.
+    nom, plus, minus : float
+        The worst-case interval of the result.
+    """
+
+    def __init__(self, root: TreeNode, value_map, key: str = "") -> None:
+        self.key = key
+        self.leaves = []
+        self.instructions = []
+        self.leaf_dims = []
+        self.n_registers = 0
+        self._buffers = None
+
+        self._value_map = value_map
+        self._operands = dict()
+        self._intervals = dict()
+        self._last_use = dict()
+        self._free = []
+
+        self._count_uses(root, set())
+        self.output = self._compile(root)
+        self.nom, self.plus, self.minus = self._intervals[root]
+
+        # compilation state is not needed to run the program
+        del self._value_map, self._operands, self._intervals, self._last_use, self._free
+
+    def run(
+        self,
+        inputs: Sequence[ndarray] = None,
+        N: int = None,
+        buffers: ndarray = None,
+    ) -> ndarray:
+        """
+        Evaluates the program over samples of its leaf dimensions.
+
+        Parameters:
+        inputs (Sequence[ndarray]): One array of n samples for each key in leaves, for example the
+            rows of a leaf sample matrix. Defaults to the distributions of the leaf dimensions.
+        N (int): Number of samples, only needed when the program has no leaves.
+        buffers (ndarray): Optional (n_registers, n) scratch array to use instead of the buffers
+            owned by the program, so that one program can be run from several threads at once.
+
+        Returns:
+        ndarray
+            The n samples of the result. The array is a view into the scratch buffers, and is
+            overwritten by the next run using them.
+        """
+        if inputs is None:
+            inputs = [dim.dist() for dim in self.leaf_dims]
+        inputs = [np.ravel(row) for row in inputs]
+
+        if len(inputs) != len(self.leaves):
+            raise ValueError(
+                f"Program for {self.key} expects {len(self.leaves)} inputs, got {len(inputs)}."
+            )
+
+        n = inputs[0].size if inputs else (StackDim.N if N is None else N)
+        if buffers is None:
+            if self._buffers is None or self._buffers.shape[1] != n:
+                self._buffers = np.empty((self.n_registers, n))
+            buffers = self._buffers
+
+        sources = (buffers, inputs)
+
+        for kernel, out, operands in self.instructions:
+            args = [
+                value if kind == CONSTANT else sources[kind][value]
+                for kind, value in operands
+            ]
+            kernel(*args, out=buffers[out])
+
+        kind, value = self.output
+        if kind == CONSTANT:
+            return np.full(n, value)
+        return sources[kind][value]
+
+    def evaluate(self, inputs: Sequence[ndarray] = None) -> StackDim:
+        """
+        Runs the program and returns the result as a derived StackDim owning a copy of its samples.
+        """
+        return self.result(self.run(inputs).copy())
+
+    def result(self, sample: ndarray) -> StackDim:
+        """
+        Wraps samples of the result in a derived StackDim with the worst-case interval of the program.
+        """
+        return StackDim(
+            self.nom,
+            self.plus,
+            self.minus,
+            DistType.DERIVED,
+            sample.reshape(1, -1),
+            note="Derived.",
+            key=self.key,
+        )
+
+    def summary(self, sketch, quantiles: ndarray) -> StackDim:
+        """
+        Returns a derived StackDim with the worst-case interval of the program, described by a
+        streaming summary of its samples instead of the samples themselves.
+        """
+        result = StackDim(
+            self.nom,
+            self.plus,
+            self.minus,
+            DistType.DERIVED,
+            note="Derived.",
+            key=self.key,
+        )
+        result.summarize(sketch, quantiles)
+        return result
+
+    def __getstate__(self):
+        # programs sent to worker processes draw their own samples, so only send the
+        # distribution parameters of the leaf dimensions, and none of the sample buffers
+        state = self.__dict__.copy()
+        state["leaf_dims"] = [
+            StackDim(dim.nom, dim.plus, dim.minus, dim.disttype, key=dim.key)
+            for dim in self.leaf_dims
+        ]
+        state["_buffers"] = None
+        return state
+
+    def _count_uses(self, node, visited):
+        # number of instructions reading each node, to free registers after their last use
+        if node in visited:
+            return
+        visited.add(node)
+
+        for child in (node.left, node.right):
+            if child is not None:
+                self._last_use[child] = self._last_use.get(child, 0) + 1
+                self._count_uses(child, visited)
+
+    def _compile(self, node):
+        if node in self._operands:
+            return self._operands[node]
+
+        if node.left is None and node.right is None:
+            operand = self._compile_leaf(node)
+        else:
+            left = self._compile(node.left) if node.left else None
+            right = self._compile(node.right) if node.right else None
+            operand = self._compile_operation(node, left, right)
+
+        self._operands[node] = operand
+        return operand
+
+    def _compile_leaf(self, node):
+        key = node.key
+        if key in self._value_map:
+            value = self._value_map[key]
+            if not isinstance(value, StackDim):
+                self._intervals[node] = (value, 0, 0)
+                return (CONSTANT, value)
+
+            self._intervals[node] = (value.nom, value.plus, value.minus)
+            if value.is_scalar():
+                return (CONSTANT, float(value.dist()))
+
+            # programs draw fresh samples of their leaves, which derived values cannot give
+            if value.disttype is DistType.DERIVED:
+                raise ValueError(
+                    f"Compilation of {self.key}: {key} is known only by its samples, so it "
+                    + "cannot be sampled again."
+                )
+
+            if key not in self.leaves:
+                self.leaves.append(key)
+                self.leaf_dims.append(value)
+            return (LEAF, self.leaves.index(key))
+
+        if is_numeric_string(key):
+            number = parse_string_to_numeric(key)
+            self._intervals[node] = (number, 0, 0)
+            return (CONSTANT, number)
+
+        raise ValueError(f"Compilation of {self.key}: invalid leaf token {key}.")
+
+    def _compile_operation(self, node, left, right):
+        operator = get_operator(node.key, "compiling expression")
+        kernel = operator.kernel
+
+        if operator.unary:
+            children = (node.right,)
+            operands = (right,)
+        else:
+            children = (node.left, node.right)
+            operands = (left, right)
+
+        self._intervals[node] = operator.bounds(
+            *[self._intervals[child] for child in children]
+        )
+
+        # fold operations on constants at compile time
+        if all(kind == CONSTANT for kind, _ in operands):
+            value = kernel(*[np.float64(value) for _, value in operands])
+            return (CONSTANT, float(value))
+
+        # release registers whose last reader is this operation, then reuse the lowest free one
+        for child, (kind, value) in zip(children, operands):
+            if kind == REGISTER:
+                self._last_use[child] -= 1
+                if self._last_use[child] == 0:
+                    self._free.append(value)
+
+        if self._free:
+            out = min(self._free)
+            self._free.remove(out)
+        else:
+            out = self.n_registers
+            self.n_registers += 1
+
+        self.instructions.append((kernel, out, operands))
+        return (REGISTER, out)
@@ -0,0 +1,322 @@
+# Persistent cache of the results of expressions, keyed by a hash of everything they depend on
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from tolstack.AppConfig import AppConfig
+from tolstack.StackDim import StackDim, SIGMA_LEVELS
+from tolstack.StackSketch import QuantileSketch
+from tolstack.StackTypes import DistType, get_code_from_dist
+from tolstack.StackYield import YieldEstimate
+
+# Default limit on the total size of cached results, beyond which the least recently used are
+# removed
+CACHE_BYTES = 256 * 2**20
+
+# Number of histogram bins kept for plots of cached results
+PLOT_BINS = 1024
+
+# Suffix of cached result files
+CACHE_SUFFIX = ".json"
+
+
+class ResultCache:
+    """
+    A directory of results stored under hex keys, with least recently used eviction by size.
+
+    Each result is a small JSON file named by its key. Reading a result marks it as used by
+    touching its modification time, and whenever the total size of the directory grows past
+    max_bytes the files used longest ago are removed. Files are written to a temporary name and
+    renamed into place, so concurrent runs sharing a directory never read partial results.
+    Failing to read or write the directory is logged and treated as a miss, so a cache that is
+    unavailable only costs recomputation.
+
+    Attributes:
+    -----------
+    directory : Path
+        Directory holding the cached results.
+    max_bytes : int
+        Limit on the total size of the cached results.
+    """
+
+    def __init__(self, directory=None, max_bytes: int = None) -> None:
+        self.directory = Path(
+            AppConfig.path_to_cache if directory is None else directory
+        )
+        self.max_bytes = CACHE_BYTES if max_bytes is None else max_bytes
+        self._size = None
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns the result stored under a key, or None if there is none.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                record = json.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read cached result {path}: {e}")
+            return None
+        return record
+
+    def put(self, key: str, record: dict) -> None:
+        """
+        Stores a result under a key, then evicts results until the cache fits in max_bytes.
+        """
+        path = self._path(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.directory, suffix=".tmp", delete=False, encoding="utf-8"
+            ) as file:
+                json.dump(record, file)
+            size = os.path.getsize(file.name)
+            os.replace(file.name, path)
+        except OSError as e:
+            logging.warning(f"Could not write cached result {path}: {e}")
+            return
+
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_bytes:
+            self._evict()
+
+    def seed(self, definition: dict) -> int:
+        """
+        Returns the seed of unseeded runs of an analysis, drawing and storing one on first use.
+
+        Parameters:
+        definition (dict): What identifies the analysis, such as its dimensions and sampler.
+
+        Returns:
+        int
+            The seed stored for the analysis, or fresh entropy if none is stored yet.
+        """
+        text = json.dumps({"seed": definition}, sort_keys=True)
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        record = self.get(key)
+        if record is not None:
+            return int(record["seed"])
+
+        seed = int(np.random.SeedSequence().entropy)
+        self.put(key, {"seed": seed})
+        return seed
+
+    def size(self) -> int:
+        """
+        Returns the total size of the cached results, in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self) -> None:
+        """
+        Removes all cached results.
+        """
+        for path, _, _ in self._entries():
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+    def _path(self, key):
+        return self.directory / f"{key}{CACHE_SUFFIX}"
+
+    def _entries(self):
+        # (path, size, last use) of each cached result
+        entries = []
+        try:
+            for path in self.directory.glob(f"*{CACHE_SUFFIX}"):
+                stat = path.stat()
+                entries.append((path, stat.st_size, stat.st_mtime))
+        except OSError:
+            pass
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+
+
+class AnalysisResults:
+    """
+    The results of the expressions of one analysis in a ResultCache.
+
+    The key of each result hashes the resolved definition of its expression: the expanded tree,
+    the evaluation method, and the definition of every dimension and constant it references,
+    with the seed, number of samples, sampler and engine of the analysis. The samples of each
+    dimension come from a stream of the seed keyed by the name of the dimension (see
+    StackSampling.SampleContext), so the results of an expression depend on nothing else, and
+    editing a dimension only invalidates the expressions that reference it. Low-discrepancy
+    samplers assign coordinates over all dimensions of the analysis, so with those samplers the
+    names of all sampled dimensions are part of every key as well.
+
+    Attributes:
+    -----------
+    cache : ResultCache
+        The cache holding the results.
+    analysis : dict
+        Settings of the analysis shared by all of its results, see StackParser.manifest.
+    """
+
+    def __init__(self, cache: ResultCache, analysis: dict) -> None:
+        self.cache = cache
+        self.analysis = analysis
+
+    def key(self, expr, product: str, **params) -> str:
+        """
+        Returns the key of a result of an expression.
+
+        Parameters:
+        expr (StackExpr): The expression, with its map of defined values set.
+        product (str): The name of the result, such as "value" or "contributions".
+        params: Other arguments the result depends on.
+
+        Returns:
+        str
+            The hex digest of the definition of the result.
+        """
+        definition = {
+            "analysis": self.analysis,
+            "key": expr.key,
+            "expansion": expr.expand(),
+            "method": str(expr.method),
+            "values": {
+                var: _describe(expr.value_map[var]) for var in expr.referenced_values()
+            },
+            "product": product,
+            "params": params,
+        }
+        text = json.dumps(definition, sort_keys=True, default=float)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def value(self, expr, compute) -> StackDim:
+        """
+        Returns the Monte Carlo value of an expression, as a summary of its samples when cached.
+        """
+        key = self.key(expr, "value")
+
+        record = self.cache.get(key)
+        if record is not None:
+            value = StackDim(
+                record["nom"],
+                record["plus"],
+                record["minus"],
+                DistType.DERIVED,
+                note="Derived.",
+                key=expr.key,
+            )
+            value.summarize(_decode_sketch(record["sketch"]), record["quantiles"])
+            return value
+
+        value = compute()
+        if isinstance(value, StackDim) and value.data is not None:
+            samples = value.dist()
+            sketch = QuantileSketch(np.min(samples), np.max(samples), PLOT_BINS)
+            sketch.add(samples)
+            record = {
+                "nom": float(value.nom),
+                "plus": float(value.plus),
+                "minus": float(value.minus),
+                "quantiles": [float(value.quantile(s)) for s in SIGMA_LEVELS],
+                "sketch": _encode_sketch(sketch),
+            }
+            self.cache.put(key, record)
+        return value
+
+    def contributions(self, expr, compute) -> dict:
+        """
+        Returns the tolerance contributions of the variables of an expression.
+        """
+        key = self.key(expr, "contributions")
+
+        record = self.cache.get(key)
+        if record is not None:
+            return record
+
+        contributions = compute()
+        self.cache.put(key, {var: float(c) for var, c in contributions.items()})
+        return contributions
+
+    def estimate_yield(self, expr, compute) -> YieldEstimate:
+        """
+        Returns the estimated probability that an expression falls outside its bounds.
+        """
+        key = self.key(expr, "yield", lower=expr.lower, upper=expr.upper)
+
+        record = self.cache.get(key)
+        if record is not None:
+            return YieldEstimate(
+                record["probability"], record["standard_error"], record["N"]
+            )
+
+        estimate = compute()
+        record = {
+            "probability": float(estimate.probability),
+            "standard_error": float(estimate.standard_error),
+            "N": int(estimate.N),
+        }
+        self.cache.put(key, record)
+        return estimate
+
+
+def _describe(value):
+    # definition of a referenced dimension or constant
+    if isinstance(value, StackDim):
+        return [
+            float(value.nom),
+            float(value.plus),
+            float(value.minus),
+            get_code_from_dist(value.disttype),
+        ]
+    return float(value)
+
+
+def _encode_sketch(sketch):
+    counts, edges = sketch.histogram()
+    return {
+        "bins": sketch.bins,
+        "origin": sketch.origin,
+        "width": sketch.width,
+        "first": int(round((edges[0] - sketch.origin) / sketch.width)),
+        "counts": counts.tolist(),
+        "count": int(sketch.count),
+        "mean": float(sketch.mean),
+        "m2": float(sketch._m2),
+        "min": float(sketch.min),
+        "max": float(sketch.max),
+    }
+
+
+def _decode_sketch(record):
+    sketch = QuantileSketch.__new__(QuantileSketch)
+    sketch.bins = record["bins"]
+    sketch.origin = record["origin"]
+    sketch.width = record["width"]
+    sketch.counts = np.zeros(sketch.bins, dtype=np.int64)
+    first = record["first"]
+    sketch.counts[first : first + len(record["counts"])] = record["counts"]
+    sketch.count = record["count"]
+    sketch.mean = record["mean"]
+    sketch._m2 = record["m2"]
+    sketch.min = record["min"]
+    sketch.max = record["max"]
+    return sketch
@@ -0,0 +1,247 @@
+# Export of the Monte Carlo samples of an analysis, and memory mapped loading of exported samples
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zipfile
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+from numpy import ndarray
+
+from tolstack.StackAnalysis import AnalysisResult
+from tolstack.StackDim import StackDim
+from tolstack.StackSampling import is_leaf
+from tolstack.StackTypes import DistType, get_code_from_dist
+
+# Version of the layout of sample bundles, increased whenever the manifest or the arrays change
+SAMPLES_SCHEMA_VERSION = 1
+
+# Name of the manifest of a bundle, written last so that incomplete bundles have none
+SAMPLES_MANIFEST = "samples.json"
+
+# Suffix of bundles saved as a single archive rather than a directory of .npy files
+SAMPLES_ARCHIVE_SUFFIX = ".npz"
+
+# Groups of the arrays of a bundle, as subdirectories or archive folders
+DIMENSION_SAMPLES = "dimensions"
+EXPRESSION_SAMPLES = "expressions"
+
+# Length of the fixed part of the local file header of an archive member, and the signature
+# that starts it, see the ZIP file format specification
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+def save_samples(results: AnalysisResult, path) -> dict:
+    """
+    Saves the samples of the leaf dimensions and expressions of an analysis as a bundle.
+
+    Bundles whose path ends in SAMPLES_ARCHIVE_SUFFIX are a single uncompressed .npz archive,
+    others a directory of .npy files. Either way, each array is written on its own as a flat
+    .npy array of N samples, so the bundle never needs more memory than the analysis holds,
+    and can be memory mapped by load_samples. Column i of every array is the same joint draw
+    of the leaf dimensions. Expressions whose results carry no samples, such as those of the
+    analytic engines or evaluated in bounded memory, are left out.
+
+    Parameters:
+    results (AnalysisResult): The results of the analysis, computed as needed.
+    path (str | Path): The directory or archive to write, replacing any existing one.
+
+    Returns:
+    dict
+        The manifest of the bundle, listing the arrays written with the definitions of their
+        dimensions and expressions, and the manifest of the analysis.
+    """
+    path = Path(path)
+    manifest = {
+        "schema_version": SAMPLES_SCHEMA_VERSION,
+        "analysis": results.parser.manifest(),
+        DIMENSION_SAMPLES: [],
+        EXPRESSION_SAMPLES: [],
+    }
+
+    if path.suffix == SAMPLES_ARCHIVE_SUFFIX:
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for group, entry, data in _sample_arrays(results):
+                with archive.open(entry["file"], "w", force_zip64=True) as file:
+                    np.lib.format.write_array(file, data, allow_pickle=False)
+                manifest[group].append(entry)
+            archive.writestr(SAMPLES_MANIFEST, json.dumps(manifest, indent=4))
+        return manifest
+
+    (path / SAMPLES_MANIFEST).unlink(missing_ok=True)
+    for group in (DIMENSION_SAMPLES, EXPRESSION_SAMPLES):
+        (path / group).mkdir(parents=True, exist_ok=True)
+    for group, entry, data in _sample_arrays(results):
+        np.save(path / entry["file"], data, allow_pickle=False)
+        manifest[group].append(entry)
+    with open(path / SAMPLES_MANIFEST, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4)
+    return manifest
+
+
+class SampleBundle:
+    """
+    The samples of a bundle saved by save_samples, as derived dimensions.
+
+    The samples of each dimension and expression are memory mapped read only rather than read,
+    so bundles far larger than memory can be opened, and only the parts of the samples that are
+    used are ever read from disk. The dimensions support every operation of StackDim, so new
+    expressions can be evaluated from the exported samples without sampling again.
+
+    Attributes:
+    -----------
+    path : Path
+        The directory or archive of the bundle.
+    manifest : dict
+        The manifest of the bundle, see save_samples.
+    analysis : dict
+        The manifest of the analysis that drew the samples, see StackParser.manifest.
+    dimensions : dict[str, StackDim]
+        The samples of the leaf dimensions, keyed by dimension.
+    expressions : dict[str, StackDim]
+        The samples of the expressions, keyed by expression.
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+
+        archive = None
+        if self.path.suffix == SAMPLES_ARCHIVE_SUFFIX:
+            archive = zipfile.ZipFile(self.path)
+        try:
+            if archive is not None:
+                self.manifest = json.loads(archive.read(SAMPLES_MANIFEST))
+            else:
+                with open(self.path / SAMPLES_MANIFEST, encoding="utf-8") as file:
+                    self.manifest = json.load(file)
+
+            version = self.manifest.get("schema_version")
+            if version != SAMPLES_SCHEMA_VERSION:
+                raise ValueError(
+                    f"Samples {self.path} have schema version {version}, expected {SAMPLES_SCHEMA_VERSION}."
+                )
+
+            self.analysis = self.manifest["analysis"]
+            self.dimensions = self._load(archive, DIMENSION_SAMPLES)
+            self.expressions = self._load(archive, EXPRESSION_SAMPLES)
+        finally:
+            if archive is not None:
+                archive.close()
+
+    def __getitem__(self, key: str) -> StackDim:
+        if key in self.expressions:
+            return self.expressions[key]
+        return self.dimensions[key]
+
+    def _load(self, archive, group):
+        dims = dict()
+        for entry in self.manifest[group]:
+            if archive is None:
+                samples = np.load(
+                    self.path / entry["file"], mmap_mode="r", allow_pickle=False
+                )
+            else:
+                samples = _map_member(self.path, archive.getinfo(entry["file"]))
+            dims[entry["key"]] = _derived_dim(entry, samples)
+        return dims
+
+
+def load_samples(path) -> SampleBundle:
+    """
+    Opens a bundle saved by save_samples, memory mapping its samples.
+    """
+    return SampleBundle(path)
+
+
+def _sample_arrays(results):
+    # (group, manifest entry, flat samples) of each array of the bundle of an analysis
+    parser = results.parser
+    for dim in parser.dimensions.values():
+        if is_leaf(dim):
+            entry = _entry(DIMENSION_SAMPLES, dim.key, dim)
+            entry["dist"] = get_code_from_dist(dim.disttype)
+            entry["PN"] = dim.PN
+            yield DIMENSION_SAMPLES, entry, np.ravel(dim.data)
+
+    for key in parser.expressions:
+        result = results.expression(key)
+        value = result.value
+        if not isinstance(value, StackDim) or np.ndim(value.data) == 0:
+            continue
+        entry = _entry(EXPRESSION_SAMPLES, key, value)
+        entry["method"] = str(result.expr.method)
+        entry["note"] = result.expr.note
+        yield EXPRESSION_SAMPLES, entry, np.ravel(value.data)
+
+
+def _entry(group, key, dim):
+    return {
+        "key": key,
+        "file": f"{group}/{quote(key, safe='')}.npy",
+        "nom": float(dim.nom),
+        "plus": float(dim.plus),
+        "minus": float(dim.minus),
+        "note": dim.note,
+    }
+
+
+def _derived_dim(entry, samples: ndarray) -> StackDim:
+    # samples are kept as a (1, N) view, as sampled by SampleContext
+    return StackDim(
+        entry["nom"],
+        entry["plus"],
+        entry["minus"],
+        DistType.DERIVED,
+        distribution=samples.reshape(1, -1),
+        PN=entry.get("PN"),
+        note=entry.get("note"),
+        key=entry["key"],
+    )
+
+
+def _map_member(path: Path, info: zipfile.ZipInfo) -> ndarray:
+    """
+    Memory maps a .npy member of an archive, which numpy.load reads into memory instead.
+
+    Members stored without compression are a plain .npy file at a known offset of the archive,
+    after their local file header. Compressed members cannot be mapped and are read.
+    """
+    readers = {
+        (1, 0): np.lib.format.read_array_header_1_0,
+        (2, 0): np.lib.format.read_array_header_2_0,
+    }
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        with zipfile.ZipFile(path) as archive, archive.open(info) as member:
+            return np.lib.format.read_array(member, allow_pickle=False)
+
+    with open(path, "rb") as file:
+        file.seek(info.header_offset)
+        signature, name_length, extra_length = _LOCAL_HEADER.unpack(
+            file.read(_LOCAL_HEADER.size)
+        )
+        if signature != _LOCAL_SIGNATURE:
+            raise ValueError(f"Samples {path} are not a valid archive.")
+        file.seek(name_length + extra_length, os.SEEK_CUR)
+
+        version = np.lib.format.read_magic(file)
+        if version not in readers:
+            raise ValueError(
+                f"Samples {info.filename} have unsupported format {version}."
+            )
+        shape, fortran_order, dtype = readers[version](file)
+        offset = file.tell()
+
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        shape=shape,
+        order="F" if fortran_order else "C",
+        offset=offset,
+    )
@@ -0,0 +1,498 @@
+# Run-scoped sampling of the leaf dimensions of an analysis
+
+from __future__ import annotations
+
+import os
+import warnings
+
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from numpy import ndarray
+
+from tolstack.StackDim import StackDim, QUANTILE_LEVELS
+from tolstack.StackProgram import StackProgram
+from tolstack.StackSketch import (
+    QuantileSketch,
+    SKETCH_BINS,
+    quantile_ranks,
+    interpolate_quantiles,
+)
+from tolstack.StackTypes import DistType, SamplerType
+
+# Number of samples drawn per task by sample_parallel, fixed so results do not depend on the pool
+CHUNK_SIZE = 2**16
+
+# Initial and maximum number of samples drawn by sample_adaptive
+ADAPTIVE_BATCH = 2**12
+ADAPTIVE_MAX_N = 2**22
+
+# First word of the spawn key of each kind of random stream derived from the seed of an analysis
+DIMENSION_STREAM = 0
+SEQUENCE_STREAM = 1
+EXPRESSION_STREAM = 2
+
+
+def stream_seed(seed: int, stream: int, key: str = "") -> np.random.SeedSequence:
+    """
+    Returns the SeedSequence of one named random stream of an analysis.
+
+    Streams are keyed by their kind and the key of the dimension or expression they belong to,
+    so the stream of a dimension depends only on the seed and its key, and not on the order
+    or number of the other definitions in the analysis.
+
+    Parameters:
+    seed (int): Seed of the analysis.
+    stream (int): Kind of stream, DIMENSION_STREAM, SEQUENCE_STREAM or EXPRESSION_STREAM.
+    key (str): Key of the dimension or expression.
+
+    Returns:
+    SeedSequence
+        A new SeedSequence for the stream.
+    """
+    return np.random.SeedSequence(seed, spawn_key=(stream, *key.encode("utf-8")))
+
+
+class SampleContext:
+    """
+    Draws the Monte Carlo samples for every leaf dimension of an analysis exactly once.
+
+    The samples are stored as rows of a single contiguous (n_leaves, N) matrix, and each leaf
+    StackDim is given a (1, N) view of its row as its distribution. Every operation on StackDims
+    is elementwise, so column i of every derived distribution is the result of the same joint
+    draw of the leaf dimensions (common random numbers), and repeated references to a dimension
+    reuse its samples instead of drawing or permuting new ones.
+
+    Unless a generator is given, each dimension is drawn from its own stream of the seed of the
+    context (see stream_seed), so that its samples are reproducible from the seed and do not
+    change when other dimensions are added, removed or reordered.
+
+    Attributes:
+    -----------
+    N : int
+        Number of samples drawn for each leaf dimension.
+    seed : int
+        Seed of the analysis, fresh entropy if none was given, or None if rng was given.
+    rng : numpy.random.Generator
+        Random number generator used to draw all the samples instead of the seeded streams,
+        or None.
+    sampler : SamplerType
+        How the joint draws are generated, pseudo-random or from a low-discrepancy sequence.
+    keys : list[str]
+        Keys of the sampled leaf dimensions, in row order.
+    samples : ndarray
+        The (n_leaves, N) leaf sample matrix.
+    """
+
+    def __init__(
+        self,
+        N: int = None,
+        rng=None,
+        sampler: SamplerType = SamplerType.RANDOM,
+        seed: int = None,
+    ) -> None:
+        self.N = StackDim.N if N is None else N
+        self.rng = rng
+        self.seed = None
+        if rng is None:
+            self.seed = np.random.SeedSequence(seed).entropy
+        self.sampler = sampler
+        self.keys = []
+        self.samples = np.empty((0, self.N))
+
+    def draw(self, dimensions: Iterable[StackDim]) -> ndarray:
+        """
+        Samples each leaf dimension once into the leaf sample matrix.
+
+        Constants, zero-width and derived dimensions are not leaves and are left untouched.
+
+        Parameters:
+        dimensions (Iterable[StackDim]): The dimensions defined for the analysis.
+
+        Returns:
+        ndarray
+            The (n_leaves, N) leaf sample matrix.
+        """
+        leaves = [dim for dim in dimensions if is_leaf(dim)]
+
+        self.keys = [dim.key for dim in leaves]
+        self.samples = np.empty((len(leaves), self.N))
+
+        if self.rng is None:
+            rngs = [
+                np.random.default_rng(stream_seed(self.seed, DIMENSION_STREAM, key))
+                for key in self.keys
+            ]
+            sequence_rng = np.random.default_rng(
+                stream_seed(self.seed, SEQUENCE_STREAM)
+            )
+            # give low-discrepancy coordinates to the dimensions in key order, not file order
+            coordinates = np.argsort(np.argsort(self.keys, kind="stable"))
+        else:
+            rngs = [self.rng] * len(leaves)
+            sequence_rng = self.rng
+            coordinates = range(len(leaves))
+
+        unit = unit_samples(self.sampler, len(leaves), self.N, sequence_rng)
+
+        for row, (dim, rng, coordinate) in enumerate(zip(leaves, rngs, coordinates)):
+            dim.sample(
+                rng,
+                self.N,
+                out=self.samples[row],
+                unit=None if unit is None else unit[coordinate],
+            )
+            dim.data = self.samples[row : row + 1]
+
+        return self.samples
+
+    def redraw(self, dim: StackDim) -> None:
+        """
+        Resamples an edited leaf dimension into its row of the leaf sample matrix.
+
+        The dimension draws from the same stream and low-discrepancy coordinate as before, so its
+        samples are those a fresh draw of the whole analysis would give it, and the samples of the
+        other dimensions are left untouched. The set of leaf dimensions must not have changed.
+
+        Parameters:
+        dim (StackDim): The new definition of a leaf dimension of the context.
+        """
+        if self.rng is not None:
+            raise RuntimeError(
+                f"Cannot redraw dimension {dim.key} from a generator shared by all dimensions."
+            )
+        row = self.keys.index(dim.key)
+
+        sequence_rng = np.random.default_rng(stream_seed(self.seed, SEQUENCE_STREAM))
+        unit = unit_samples(self.sampler, len(self.keys), self.N, sequence_rng)
+        coordinate = sorted(self.keys).index(dim.key)
+
+        dim.sample(
+            np.random.default_rng(stream_seed(self.seed, DIMENSION_STREAM, dim.key)),
+            self.N,
+            out=self.samples[row],
+            unit=None if unit is None else unit[coordinate],
+        )
+        dim.data = self.samples[row : row + 1]
+
+    def leaf_samples(self, key: str) -> ndarray:
+        """
+        Returns the (1, N) samples drawn for the leaf dimension with the given key.
+        """
+        try:
+            row = self.keys.index(key)
+        except ValueError:
+            raise KeyError(f"No samples have been drawn for dimension {key}.")
+        return self.samples[row : row + 1]
+
+
+def is_leaf(dim: StackDim) -> bool:
+    """
+    Whether a StackDim is sampled from an analytical distribution, and so has a row in the leaf sample matrix.
+
+    Constants and zero-width distributions are represented by scalars instead, see StackDim.is_scalar().
+    """
+    return dim.disttype is not DistType.DERIVED and not dim.is_scalar()
+
+
+def unit_samples(sampler: SamplerType, d: int, N: int, rng=None) -> ndarray:
+    """
+    Generates N points of the d-dimensional unit hypercube for a quasi-Monte Carlo sampler.
+
+    Sobol points are scrambled, and Latin hypercube points are randomized within their strata,
+    so that repeated runs give independent estimates. Each row holds one coordinate, to be
+    mapped through the inverse CDF of one leaf dimension.
+
+    Parameters:
+    sampler (SamplerType): The sampling method.
+    d (int): Number of dimensions.
+    N (int): Number of points.
+    rng (numpy.random.Generator): Generator used to randomize the sequence.
+
+    Returns:
+    ndarray
+        The (d, N) points, or None for pseudo-random sampling, which draws directly from rng.
+    """
+    if d == 0:
+        return np.empty((0, N))
+
+    # scipy.stats takes longer to import than the rest of the engine, so only the quasi-Monte
+    # Carlo samplers import it
+    match sampler:
+        case SamplerType.RANDOM:
+            return None
+        case SamplerType.SOBOL:
+            from scipy.stats import qmc
+
+            engine = qmc.Sobol(d, scramble=True, seed=rng)
+        case SamplerType.LHS:
+            from scipy.stats import qmc
+
+            engine = qmc.LatinHypercube(d, seed=rng)
+        case _:
+            raise ValueError(f"Sampling method {sampler} is not defined.")
+
+    with warnings.catch_warnings():
+        # Sobol sequences are best balanced at powers of two, but remain low-discrepancy otherwise
+        warnings.filterwarnings("ignore", message=".*balance properties.*")
+        points = engine.random(N)
+
+    return np.ascontiguousarray(points.T)
+
+
+def sample_parallel(
+    program: StackProgram,
+    N: int = None,
+    seed=None,
+    chunk_size: int = CHUNK_SIZE,
+    max_workers: int = None,
+    processes: bool = False,
+) -> ndarray:
+    """
+    Evaluates a compiled program over fresh samples, split into chunks run on a pool of workers.
+
+    The samples are drawn in fixed-size chunks, each from its own generator spawned from a
+    SeedSequence, so the result depends only on the seed, N and the chunk size, and not on
+    the number of workers or whether threads or processes are used. NumPy releases the GIL
+    in the sampling and ufunc kernels, so threads scale well for large chunks and avoid
+    sending the program to each worker.
+
+    Parameters:
+    program (StackProgram): The compiled expression to evaluate.
+    N (int): Total number of samples, defaults to StackDim.N.
+    seed (int | SeedSequence): Seed for the run, defaults to fresh entropy.
+    chunk_size (int): Number of samples drawn and evaluated per task.
+    max_workers (int): Number of workers, defaults to the number of CPUs.
+    processes (bool): Use a process pool instead of a thread pool.
+
+    Returns:
+    ndarray
+        The (1, N) samples of the result, in chunk order.
+    """
+    chunks = _chunk_seeds(N, seed, chunk_size)
+    result = np.empty((1, sum(n for _, n in chunks)))
+
+    start = 0
+    for sample in _map_chunks(_run_chunk, program, chunks, max_workers, processes):
+        result[0, start : start + sample.size] = sample
+        start += sample.size
+
+    return result
+
+
+def sample_streaming(
+    program: StackProgram,
+    N: int = None,
+    seed=None,
+    chunk_size: int = CHUNK_SIZE,
+    max_workers: int = None,
+    processes: bool = False,
+    bins: int = SKETCH_BINS,
+) -> tuple[QuantileSketch, ndarray]:
+    """
+    Evaluates a compiled program over fresh samples without keeping them, in bounded memory.
+
+    Chunks are drawn and evaluated exactly as by sample_parallel, but each one is reduced to a
+    QuantileSketch and discarded, so memory does not grow with N. The histogram locates the
+    bins holding the order statistics needed for the reported quantiles, then a second pass
+    replays the same chunks and keeps only the samples in those bins, so the quantiles are
+    exactly those np.quantile would give on the full set of samples with the same seed.
+
+    Parameters are as for sample_parallel, with:
+    bins (int): Number of histogram bins, a power of two.
+
+    Returns:
+    tuple[QuantileSketch, ndarray]
+        The sketch of the result, and its quantiles at the levels QUANTILE_LEVELS.
+    """
+    chunks = _chunk_seeds(N, seed, chunk_size)
+    lower = program.nom + program.minus
+    upper = program.nom + program.plus
+
+    sketch = QuantileSketch(lower, upper, bins)
+    for chunk_sketch in _map_chunks(
+        _sketch_chunk, program, chunks, max_workers, processes, lower, upper, bins
+    ):
+        sketch.merge(chunk_sketch)
+
+    if sketch.count == 0:
+        return sketch, np.full(len(QUANTILE_LEVELS), np.nan)
+
+    below, above, gamma = quantile_ranks(sketch.count, QUANTILE_LEVELS)
+    ranks = np.unique(np.concatenate((below, above)))
+
+    # select the bin of each order statistic and its neighbours, so that samples rounded
+    # into a neighbouring bin when the histogram grew are still kept
+    intervals = []
+    for rank in ranks:
+        index = sketch.order_statistic_bin(rank)
+        intervals.append(
+            (sketch.bin_edges(index - 1)[0], sketch.bin_edges(index + 1)[1])
+        )
+    intervals = np.array(intervals)
+
+    counts_below = np.zeros(len(ranks), dtype=np.int64)
+    selected = [[] for _ in ranks]
+    for chunk_below, chunk_selected in _map_chunks(
+        _select_chunk, program, chunks, max_workers, processes, intervals
+    ):
+        counts_below += chunk_below
+        for values, chunk_values in zip(selected, chunk_selected):
+            values.append(chunk_values)
+
+    order_statistics = dict()
+    for rank, count, values in zip(ranks, counts_below, selected):
+        values = np.sort(np.concatenate(values))
+        if not 0 <= rank - count < values.size:
+            raise RuntimeError(
+                f"Streaming evaluation of {program.key}: order statistic {rank} was not found."
+            )
+        order_statistics[rank] = values[rank - count]
+
+    quantiles = interpolate_quantiles(
+        [order_statistics[rank] for rank in below],
+        [order_statistics[rank] for rank in above],
+        gamma,
+    )
+    return sketch, quantiles
+
+
+def sample_adaptive(
+    program: StackProgram,
+    levels: ndarray,
+    rtol: float,
+    seed=None,
+    batch: int = ADAPTIVE_BATCH,
+    max_N: int = ADAPTIVE_MAX_N,
+) -> ndarray:
+    """
+    Evaluates a compiled program over as many fresh samples as needed for its quantiles to converge.
+
+    Samples are drawn in batches, doubling the total each time, until the standard error of
+    every requested quantile is at most rtol times the spread of the quantiles, or max_N
+    samples have been drawn. Each batch is drawn from its own generator spawned from a
+    SeedSequence, so the result is reproducible for a given seed.
+
+    Parameters:
+    program (StackProgram): The compiled expression to evaluate.
+    levels (ndarray): Quantile levels that must converge, for example those of the reported
+        center and tolerance limits.
+    rtol (float): Allowed standard error, relative to the spread of the quantiles.
+    seed (int | SeedSequence): Seed for the run, defaults to fresh entropy.
+    batch (int): Number of samples in the first batch.
+    max_N (int): Maximum number of samples.
+
+    Returns:
+    ndarray
+        The (1, n) samples of the result.
+    """
+    seed_seq = (
+        seed
+        if isinstance(seed, np.random.SeedSequence)
+        else np.random.SeedSequence(seed)
+    )
+
+    batches = []
+    n = 0
+    size = min(batch, max_N)
+
+    while True:
+        batches.append(_run_chunk(program, seed_seq.spawn(1)[0], size))
+        n += size
+
+        samples = np.concatenate(batches)
+        ordered = np.sort(samples)
+        quantiles = np.quantile(ordered, levels, method="median_unbiased")
+        errors = quantile_standard_error(ordered, levels, is_sorted=True)
+
+        if np.all(errors <= rtol * (quantiles.max() - quantiles.min())) or n >= max_N:
+            return samples.reshape(1, -1)
+
+        size = min(n, max_N - n)
+
+
+def quantile_standard_error(
+    samples: ndarray, levels: ndarray, is_sorted: bool = False
+) -> ndarray:
+    """
+    Estimates the standard error of sample quantiles from the spread of the order statistics.
+
+    The rank of the sample quantile at level p is binomial with standard deviation
+    sqrt(n p (1 - p)), so half the distance between the order statistics one standard
+    deviation either side of n p estimates the standard error without assuming a distribution.
+
+    Parameters:
+    samples (ndarray): The samples.
+    levels (ndarray): Quantile levels.
+    is_sorted (bool): Whether the samples are already sorted in increasing order.
+
+    Returns:
+    ndarray
+        The standard error of the quantile at each level.
+    """
+    ordered = np.ravel(samples) if is_sorted else np.sort(samples, axis=None)
+    n = ordered.size
+    levels = np.asarray(levels)
+
+    spread = np.sqrt(n * levels * (1 - levels))
+    lower = np.clip(np.floor(n * levels - spread), 0, n - 1).astype(np.int64)
+    upper = np.clip(np.ceil(n * levels + spread), 0, n - 1).astype(np.int64)
+
+    return (ordered[upper] - ordered[lower]) / 2
+
+
+def _chunk_seeds(N, seed, chunk_size):
+    # the same chunks are replayed by every pass of an evaluation, so spawn them once
+    _N = StackDim.N if N is None else N
+    seed_seq = (
+        seed
+        if isinstance(seed, np.random.SeedSequence)
+        else np.random.SeedSequence(seed)
+    )
+
+    sizes = [min(chunk_size, _N - start) for start in range(0, _N, chunk_size)]
+    return list(zip(seed_seq.spawn(len(sizes)), sizes))
+
+
+def _map_chunks(func, program, chunks, max_workers, processes, *args):
+    # yields func(program, seed, n, *args) for each chunk in order, keeping a bounded number
+    # of tasks in flight so that finished results do not pile up
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    window = 2 * (max_workers or os.cpu_count() or 1)
+
+    with executor(max_workers=max_workers) as pool:
+        pending = deque()
+        for seed_seq, n in chunks:
+            pending.append(pool.submit(func, program, seed_seq, n, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _run_chunk(program: StackProgram, seed_seq, n: int) -> ndarray:
+    rng = np.random.default_rng(seed_seq)
+
+    inputs = np.empty((len(program.leaf_dims), n))
+    for row, dim in enumerate(program.leaf_dims):
+        dim.sample(rng, n, out=inputs[row])
+
+    buffers = np.empty((program.n_registers, n))
+    return program.run(inputs, N=n, buffers=buffers)
+
+
+def _sketch_chunk(program, seed_seq, n, lower, upper, bins) -> QuantileSketch:
+    sketch = QuantileSketch(lower, upper, bins)
+    sketch.add(_run_chunk(program, seed_seq, n))
+    return sketch
+
+
+def _select_chunk(program, seed_seq, n, intervals) -> tuple[ndarray, list[ndarray]]:
+    sample = _run_chunk(program, seed_seq, n)
+    sample = sample[np.isfinite(sample)]
+
+    below = np.array([np.count_nonzero(sample < lo) for lo, _ in intervals])
+    selected = [sample[(sample >= lo) & (sample < hi)] for lo, hi in intervals]
+    return below, selected
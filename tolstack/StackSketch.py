@@ -0,0 +1,217 @@
+# Bounded-memory summaries of streams of Monte Carlo samples
+
+from __future__ import annotations
+
+from math import inf, isfinite, sqrt
+
+import numpy as np
+from numpy import ndarray
+
+# Default number of histogram bins, a power of two so that grown sketches stay mergeable
+SKETCH_BINS = 2**16
+
+# Plotting position used for quantiles, matching np.quantile(method="median_unbiased")
+QUANTILE_ALPHA = 1 / 3
+QUANTILE_BETA = 1 / 3
+
+
+class QuantileSketch:
+    """
+    Mergeable summary of a stream of samples, as a fixed-bin histogram with running moments.
+
+    The histogram covers [origin, origin + bins * width) with equal-width bins. When samples
+    fall outside it, the bin width is doubled and pairs of bins are merged, extending the range
+    left or right, until the samples fit. Sketches created with the same range and number of
+    bins therefore keep nested bin edges however they grow, so they can be merged exactly, and
+    the histogram gives the bin holding any order statistic of the stream. Exact quantiles are
+    found by replaying the stream and keeping only the samples in those bins, see
+    StackSampling.sample_streaming.
+
+    Attributes:
+    -----------
+    bins : int
+        Number of histogram bins.
+    origin : float
+        Lower edge of the first bin.
+    width : float
+        Width of each bin.
+    counts : ndarray
+        Number of samples in each bin.
+    count : int
+        Total number of samples.
+    mean : float
+        Running mean of the samples.
+    min, max : float
+        Smallest and largest samples.
+    """
+
+    def __init__(self, lower: float, upper: float, bins: int = SKETCH_BINS) -> None:
+        if not (isfinite(lower) and isfinite(upper)) or upper <= lower:
+            center = lower if isfinite(lower) else 0.0
+            lower, upper = center - 0.5, center + 0.5
+
+        self.bins = bins
+        self.origin = lower
+        self.width = (upper - lower) / bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = inf
+        self.max = -inf
+
+    @property
+    def upper_edge(self) -> float:
+        return self.origin + self.bins * self.width
+
+    @property
+    def var(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return sqrt(self.var)
+
+    def add(self, samples: ndarray) -> None:
+        """
+        Adds a chunk of samples to the sketch. Samples that are not finite are ignored.
+        """
+        x = np.ravel(samples)
+        if x.size == 0:
+            return
+
+        lo, hi = x.min(), x.max()
+        if not (isfinite(lo) and isfinite(hi)):
+            x = x[np.isfinite(x)]
+            if x.size == 0:
+                return
+            lo, hi = x.min(), x.max()
+
+        self._cover(lo, hi)
+        self.counts += np.bincount(self.bin_index(x), minlength=self.bins)
+
+        mean = x.mean()
+        self._merge_moments(x.size, mean, np.square(x - mean).sum(), lo, hi)
+
+    def merge(self, other: QuantileSketch) -> None:
+        """
+        Adds the samples summarized by another sketch created with the same range and bins.
+        """
+        if other.count == 0:
+            return
+
+        other = other.copy()
+        while True:
+            if self.width < other.width:
+                self._double(other.min < self.origin)
+            elif other.width < self.width:
+                other._double(self.min < other.origin)
+            else:
+                shift = round((other.origin - self.origin) / self.width)
+                occupied = np.flatnonzero(other.counts)
+                first, last = occupied[0] + shift, occupied[-1] + shift
+                if 0 <= first and last < self.bins:
+                    break
+                self._double(first < 0)
+
+        occupied = slice(occupied[0], occupied[-1] + 1)
+        target = slice(occupied.start + shift, occupied.stop + shift)
+        self.counts[target] += other.counts[occupied]
+        self._merge_moments(other.count, other.mean, other._m2, other.min, other.max)
+
+    def bin_index(self, samples: ndarray) -> ndarray:
+        index = np.floor((samples - self.origin) / self.width).astype(np.int64)
+        return np.clip(index, 0, self.bins - 1, out=index)
+
+    def bin_edges(self, index: int) -> tuple[float, float]:
+        return (
+            self.origin + index * self.width,
+            self.origin + (index + 1) * self.width,
+        )
+
+    def order_statistic_bin(self, rank: int) -> int:
+        """
+        Returns the bin holding the sample of the given zero-based rank in sorted order.
+        """
+        return int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+
+    def histogram(self) -> tuple[ndarray, ndarray]:
+        """
+        Returns the occupied bins of the histogram, as (counts, edges) like np.histogram.
+        """
+        occupied = np.flatnonzero(self.counts)
+        if occupied.size == 0:
+            return np.zeros(0, dtype=np.int64), np.array([self.origin])
+
+        first, last = occupied[0], occupied[-1] + 1
+        edges = self.origin + np.arange(first, last + 1) * self.width
+        return self.counts[first:last], edges
+
+    def copy(self) -> QuantileSketch:
+        sketch = QuantileSketch.__new__(QuantileSketch)
+        sketch.__dict__.update(self.__dict__)
+        sketch.counts = self.counts.copy()
+        return sketch
+
+    def _cover(self, lo, hi):
+        while lo < self.origin or hi >= self.upper_edge:
+            self._double(lo < self.origin)
+
+    def _double(self, extend_left):
+        # merge pairs of bins, doubling the width and extending the range by the old span
+        half = self.bins // 2
+        merged = self.counts.reshape(half, 2).sum(axis=1)
+
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        if extend_left:
+            self.origin -= self.bins * self.width
+            self.counts[half:] = merged
+        else:
+            self.counts[:half] = merged
+        self.width *= 2
+
+    def _merge_moments(self, count, mean, m2, lo, hi):
+        # combine running moments with those of another batch of samples (Chan et al.)
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.mean += delta * count / total
+        self._m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+
+def quantile_ranks(n: int, levels: ndarray) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    Returns the zero-based ranks of the order statistics below and above each quantile level
+    of n samples, and the interpolation weight between them, as used by
+    np.quantile(method="median_unbiased").
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    virtual = (
+        n * levels
+        + (QUANTILE_ALPHA + levels * (1 - QUANTILE_ALPHA - QUANTILE_BETA))
+        - 1
+    )
+
+    below = np.clip(np.floor(virtual), 0, n - 1).astype(np.int64)
+    above = np.clip(below + 1, 0, n - 1)
+    gamma = np.clip(virtual - np.floor(virtual), 0, 1)
+    gamma[virtual < 0] = 0
+    gamma[virtual >= n - 1] = 0
+
+    return below, above, gamma
+
+
+def interpolate_quantiles(below: ndarray, above: ndarray, gamma: ndarray) -> ndarray:
+    """
+    Interpolates between the order statistics bracketing each quantile, as np.quantile does.
+    """
+    below = np.asarray(below, dtype=np.float64)
+    above = np.asarray(above, dtype=np.float64)
+    diff = above - below
+
+    result = below + diff * gamma
+    return np.where(gamma >= 0.5, above - diff * (1 - gamma), result)
@@ -10,6 +10,12 @@ class DistType(Enum):
     DERIVED = 99
 
 
+class SamplerType(Enum):
+    RANDOM = 1
+    SOBOL = 2
+    LHS = 3
+
+
 class EvalType(Enum):
     WORSTCASE = 1
     STATISTICAL_1S = 2
@@ -33,6 +39,34 @@ class EvalType(Enum):
                 return super().__str__()
 
 
+class EngineType(Enum):
+    MONTE_CARLO = 1
+    FIRST_ORDER = 2
+    SECOND_ORDER = 3
+    CONVOLUTION = 4
+    GRID = 5
+
+    def __str__(self) -> str:
+        match self:
+            case EngineType.MONTE_CARLO:
+                return "Monte Carlo"
+            case EngineType.FIRST_ORDER:
+                return "First-order moments"
+            case EngineType.SECOND_ORDER:
+                return "Second-order moments"
+            case EngineType.CONVOLUTION:
+                return "Convolution"
+            case EngineType.GRID:
+                return "Density grid"
+            case _:
+                return super().__str__()
+
+
+class ExportType(Enum):
+    JSON_LINES = 1
+    CSV = 2
+
+
 def get_dist_from_code(code):
     _code = code.strip().upper()
     match _code:
@@ -81,3 +115,69 @@ def get_eval_from_code(code):
             return EvalType.STATISTICAL_3S
         case _:
             return EvalType.UNKNOWN
+
+
+def get_sigma_from_eval(evaltype: EvalType):
+    match evaltype:
+        case EvalType.STATISTICAL_1S:
+            return 1
+        case EvalType.STATISTICAL_2S:
+            return 2
+        case EvalType.STATISTICAL_3S:
+            return 3
+        case _:
+            return None
+
+
+def get_sampler_from_code(code):
+    _code = code.strip().lower()
+    match _code:
+        case "random":
+            return SamplerType.RANDOM
+        case "sobol":
+            return SamplerType.SOBOL
+        case "lhs":
+            return SamplerType.LHS
+        case _:
+            return None
+
+
+def get_code_from_sampler(sampler: SamplerType):
+    match sampler:
+        case SamplerType.SOBOL:
+            return "sobol"
+        case SamplerType.LHS:
+            return "lhs"
+        case _:
+            return "random"
+
+
+def get_engine_from_code(code):
+    _code = code.strip().lower()
+    match _code:
+        case "mc":
+            return EngineType.MONTE_CARLO
+        case "first-order":
+            return EngineType.FIRST_ORDER
+        case "second-order":
+            return EngineType.SECOND_ORDER
+        case "convolution":
+            return EngineType.CONVOLUTION
+        case "grid":
+            return EngineType.GRID
+        case _:
+            return None
+
+
+def get_code_from_engine(engine: EngineType):
+    match engine:
+        case EngineType.FIRST_ORDER:
+            return "first-order"
+        case EngineType.SECOND_ORDER:
+            return "second-order"
+        case EngineType.CONVOLUTION:
+            return "convolution"
+        case EngineType.GRID:
+            return "grid"
+        case _:
+            return "mc"
@@ -351,6 +351,44 @@ def expCombination(
     return max(deviations), min(deviations)
 
 
+def main_effect(x, y, bins: int = None) -> np.ndarray:
+    """
+    Estimates the main effect E[y|x] - E[y] of an input on an output from paired samples.
+
+    The samples are sorted by x and split into bins of equal count, and the conditional mean of y
+    is interpolated between the bin means. Subtracting the main effect from y approximates the
+    output that would be observed with x fixed, without re-sampling or re-evaluating anything.
+
+    Parameters:
+    x (array_like): Samples of the input variable.
+    y (array_like): Samples of the output, paired elementwise with x.
+    bins (int): Number of bins, defaults to the square root of the number of samples.
+
+    Returns:
+    ndarray: The main effect of x evaluated at each sample, flattened to the size of y.
+    """
+    x = np.ravel(x)
+    y = np.ravel(y)
+    n = y.size
+
+    # a scalar input has no variation, and so no effect
+    if x.size != n or n < 2:
+        return np.zeros(n)
+
+    if bins is None:
+        bins = int(np.sqrt(n))
+    bins = min(max(bins, 1), n)
+
+    starts = (np.arange(bins) * n) // bins
+    counts = np.diff(np.append(starts, n))
+
+    order = np.argsort(x, kind="stable")
+    x_means = np.add.reduceat(x[order], starts) / counts
+    y_means = np.add.reduceat(y[order], starts) / counts
+
+    return np.interp(x, x_means, y_means) - y.mean()
+
+
 def sinBounds(dim: tuple[float, float, float]) -> tuple[float, float]:
     """
     Utility function to compute min/max of the sine of a toleranced value.
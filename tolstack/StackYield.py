@@ -0,0 +1,177 @@
+# Importance sampling estimates of the probability that a result falls outside its bounds
+
+from __future__ import annotations
+
+from math import inf, isinf, sqrt
+
+import numpy as np
+from numpy import ndarray
+from numpy.random import default_rng
+
+from tolstack.StackSampling import is_leaf
+
+# Default number of importance samples
+YIELD_SAMPLES = 2**16
+
+# Default confidence level of reported intervals
+CONFIDENCE = 0.95
+
+# Iterations and step of the search for the most likely failure of each bound
+DESIGN_ITERATIONS = 50
+DESIGN_STEP = 1e-4
+
+# Largest shift of the sampling distribution, in standard deviations of the inputs
+MAX_SHIFT = 10.0
+
+
+class YieldEstimate:
+    """
+    An estimate of the probability that a result falls outside its bounds.
+
+    Attributes:
+    -----------
+    probability : float
+        Estimated probability of falling below the lower bound or above the upper bound.
+    standard_error : float
+        Standard error of the estimated probability.
+    N : int
+        Number of samples used for the estimate.
+    """
+
+    def __init__(self, probability: float, standard_error: float, N: int) -> None:
+        self.probability = probability
+        self.standard_error = standard_error
+        self.N = N
+
+    @property
+    def ppm(self) -> float:
+        return self.probability * 1e6
+
+    def interval(self, confidence: float = CONFIDENCE) -> tuple[float, float]:
+        """
+        Returns the normal approximation confidence interval of the estimate, in PPM.
+        """
+        from scipy.special import ndtri
+
+        half_width = ndtri(0.5 + confidence / 2) * self.standard_error * 1e6
+        return (max(self.ppm - half_width, 0.0), self.ppm + half_width)
+
+    def __str__(self) -> str:
+        lower, upper = self.interval()
+        return f"{self.ppm:.4g} PPM ({CONFIDENCE:.0%} CI {lower:.4g} to {upper:.4g})"
+
+
+def estimate_yield(
+    program,
+    lower: float = -inf,
+    upper: float = inf,
+    N: int = None,
+    seed=None,
+) -> YieldEstimate:
+    """
+    Estimates the probability that the result of a program falls outside [lower, upper].
+
+    The inputs are mapped to independent standard normal variables, and for each finite bound the
+    most likely point of failure (the design point, closest to the origin in the normal
+    variables) is found by linearizing the program (Hasofer-Lind-Rackwitz-Fiessler iteration).
+    Samples are drawn from an equal mixture of standard normals centered on the origin and on each
+    design point, and weighted by the ratio of the densities of the inputs and of the mixture.
+    Tails of a few PPM are then estimated to a few percent with tens of thousands of samples
+    instead of billions. The component at the origin keeps the weights bounded, so the estimate
+    stays unbiased, if less efficient, for failure regions that are far from linear.
+
+    Parameters:
+    program (StackProgram): The compiled expression.
+    lower (float): Lower bound, or -inf.
+    upper (float): Upper bound, or inf.
+    N (int): Number of samples, defaults to YIELD_SAMPLES.
+    seed (int): Seed for the samples, so that estimates are reproducible.
+
+    Returns:
+    YieldEstimate
+        The estimated probability of falling outside the bounds, with its standard error.
+    """
+    _N = YIELD_SAMPLES if N is None else N
+    dims = program.leaf_dims
+
+    if not all(is_leaf(dim) for dim in dims):
+        raise ValueError(
+            f"Cannot estimate yield of {program.key}, inputs must have analytical distributions."
+        )
+
+    if not dims:
+        outside = program.nom < lower or program.nom > upper
+        return YieldEstimate(float(outside), 0.0, _N)
+
+    d = len(dims)
+    shifts = [np.zeros(d)]
+    for bound in (lower, upper):
+        if not isinf(bound):
+            shifts.append(_design_point(program, bound))
+    shifts = np.array(shifts)
+
+    # draw an equal share of the samples around each center of the mixture
+    rng = default_rng(seed)
+    counts = rng.multinomial(_N, np.full(len(shifts), 1 / len(shifts)))
+    z = rng.standard_normal((d, _N))
+    z += np.repeat(shifts, counts, axis=0).T
+
+    values = _run(program, z)
+    outside = (values < lower) | (values > upper)
+
+    # density of the inputs over the density of the mixture
+    from scipy.special import logsumexp
+
+    log_ratio = shifts @ z - 0.5 * np.sum(shifts**2, axis=1)[:, np.newaxis]
+    weights = np.exp(np.log(len(shifts)) - logsumexp(log_ratio, axis=0))
+
+    terms = np.where(outside, weights, 0.0)
+    return YieldEstimate(float(terms.mean()), float(terms.std(ddof=1) / sqrt(_N)), _N)
+
+
+def _design_point(program, bound):
+    # HL-RF iteration for the point closest to the origin where the program equals the bound,
+    # with gradients by central differences taken in a single run of the program
+    d = len(program.leaf_dims)
+    steps = np.hstack(
+        [np.zeros((d, 1)), DESIGN_STEP * np.eye(d), -DESIGN_STEP * np.eye(d)]
+    )
+
+    z = np.zeros(d)
+    for _ in range(DESIGN_ITERATIONS):
+        # the search may step outside the domain of the program, which ends it below
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            values = _run(program, z[:, np.newaxis] + steps)
+            g = values[0] - bound
+            gradient = (values[1 : d + 1] - values[d + 1 :]) / (2 * DESIGN_STEP)
+
+        norm2 = gradient @ gradient
+        if not np.isfinite(g) or not np.isfinite(norm2) or norm2 == 0:
+            break
+
+        step = (gradient @ z - g) / norm2 * gradient
+        converged = np.linalg.norm(step - z) < 1e-6 * (1 + np.linalg.norm(z))
+        z = step
+        if converged or np.linalg.norm(z) > MAX_SHIFT:
+            break
+
+    norm = np.linalg.norm(z)
+    if not np.isfinite(norm):
+        return np.zeros(d)
+    return z * min(1.0, MAX_SHIFT / norm) if norm > 0 else z
+
+
+def _run(program, z) -> ndarray:
+    # evaluates the program at standard normal variables z, one row for each input
+    from scipy.special import ndtr
+
+    inputs = []
+    for dim, row in zip(program.leaf_dims, z):
+        # ndtr rounds to 1 above about 8 sigma, so upper tails are mapped from the lower tail
+        # and reflected about the center, about which every leaf distribution is symmetric
+        value = dim.sample(N=row.size, out=np.empty(row.size), unit=ndtr(-np.abs(row)))
+        upper = row > 0
+        value[upper] = 2 * dim.nom + dim.plus + dim.minus - value[upper]
+        inputs.append(value)
+    buffers = np.empty((program.n_registers, z.shape[1]))
+    return program.run(inputs, buffers=buffers).copy()
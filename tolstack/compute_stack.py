@@ -1,37 +1,167 @@
 import argparse
-
+import glob
 import logging
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
 
+from tolstack.StackAnalysis import AnalysisResult
+from tolstack.StackExport import ResultWriter, export_record, export_results
 from tolstack.StackParser import StackParser
+from tolstack.StackResultCache import ResultCache
+from tolstack.StackSamples import save_samples
 
 from tolstack.gui.FormatText import format_text
-from tolstack.gui.FormatPDF import format_pdf
 
-from tolstack.gui.FileIO import open_from_name
+from tolstack.gui.FileIO import open_from_name, save_manifest, get_manifest_name
 from tolstack.gui.GUITypes import OptionsWidget, DataWidget
 
+from tolstack.StackTypes import (
+    EngineType,
+    ExportType,
+    SamplerType,
+    get_sampler_from_code,
+    get_code_from_sampler,
+    get_engine_from_code,
+    get_code_from_engine,
+)
 
-def process_info(info):
-    SP = StackParser()
-    SP.parse(
-        constants_data=info[DataWidget.CONSTANTS],
-        dimensions_data=info[DataWidget.DIMENSIONS],
-        expressions_data=info[DataWidget.EXPRESSIONS],
-    )
 
-    print_lines = format_text(SP, info)
-    return print_lines
+def parse_seed(text):
+    if not text.strip():
+        return None
+
+    try:
+        seed = int(text)
+    except ValueError:
+        seed = -1
+    if seed < 0:
+        raise ValueError(f"Random seed {text} is not a non-negative integer.")
+    return seed
+
+
+def parse_precision(text):
+    if not text.strip():
+        return None
+
+    try:
+        rtol = float(text)
+    except ValueError:
+        rtol = 0.0
+    if not rtol > 0 or rtol == float("inf"):
+        raise ValueError(f"Adaptive precision {text} is not a positive number.")
+    return rtol
+
+
+def parse_info(info, result_cache=None, parser=None):
+    sampler = get_sampler_from_code(info[OptionsWidget.SAMPLER])
+    if sampler is None:
+        raise ValueError(
+            f"Sampling method {info[OptionsWidget.SAMPLER]} is not defined."
+        )
+
+    seed = parse_seed(info[OptionsWidget.SEED])
+
+    engine = get_engine_from_code(info[OptionsWidget.ENGINE])
+    if engine is None:
+        raise ValueError(
+            f"Evaluation engine {info[OptionsWidget.ENGINE]} is not defined."
+        )
 
+    # sample each expression until it reaches the precision, if one is set
+    rtol = parse_precision(info[OptionsWidget.PRECISION])
+    adaptive = rtol is not None
 
-def process_info_to_pdf(info, filename):
-    SP = StackParser()
+    # a live parser with the same options only recomputes what was edited since it was parsed
+    if (
+        parser is not None
+        and parser.sampler is sampler
+        and parser.seed == seed
+        and parser.engine is engine
+        and parser.rtol == rtol
+        and parser.adaptive is adaptive
+        and parser.result_cache is result_cache
+    ):
+        parser.update(
+            constants_data=info[DataWidget.CONSTANTS],
+            dimensions_data=info[DataWidget.DIMENSIONS],
+            expressions_data=info[DataWidget.EXPRESSIONS],
+        )
+        return parser
+
+    SP = StackParser(
+        sampler=sampler,
+        seed=seed,
+        result_cache=result_cache,
+        engine=engine,
+        rtol=rtol,
+        adaptive=adaptive,
+    )
     SP.parse(
         constants_data=info[DataWidget.CONSTANTS],
         dimensions_data=info[DataWidget.DIMENSIONS],
         expressions_data=info[DataWidget.EXPRESSIONS],
     )
+    return SP
+
+
+# the analyses selected in the options, for the expressions of a parsed analysis
+def analyze_info(parser, info):
+    return AnalysisResult(
+        parser,
+        sensitivity=info[OptionsWidget.SENSITIVITY],
+        contributions=info[OptionsWidget.CONTRIBUTIONS],
+        yield_analysis=info[OptionsWidget.YIELD],
+        histograms=info[OptionsWidget.SHOW_PLOTS],
+    )
+
 
-    format_pdf(output_filename=filename, parser=SP, info=info)
+def process_info(info, result_cache=None, parser=None):
+    SP = parse_info(info, result_cache, parser)
+    results = analyze_info(SP, info).compute()
+
+    print_lines = format_text(results, info)
+    return print_lines, SP.manifest()
+
+
+def process_info_to_pdf(info, filename, result_cache=None, parser=None):
+    # matplotlib and reportlab take longer to import than a text run takes to compute
+    from tolstack.gui.FormatPDF import format_pdf
+
+    SP = parse_info(info, result_cache, parser)
+    results = analyze_info(SP, info).compute()
+
+    format_pdf(output_filename=filename, results=results, info=info)
+    return SP.manifest()
+
+
+def set_options(
+    info,
+    print_usage,
+    conduct_sensitivity_analysis,
+    conduct_tolerance_contribution,
+    sampler=None,
+    conduct_yield_analysis=False,
+    seed=None,
+    engine=None,
+    precision=None,
+):
+    # options given on the command line override those of the file
+    info[OptionsWidget.WHERE_USED] = print_usage
+    info[OptionsWidget.SENSITIVITY] = conduct_sensitivity_analysis
+    info[OptionsWidget.CONTRIBUTIONS] = conduct_tolerance_contribution
+    info[OptionsWidget.YIELD] = conduct_yield_analysis
+    if sampler:
+        info[OptionsWidget.SAMPLER] = sampler
+    if seed is not None:
+        info[OptionsWidget.SEED] = str(seed)
+    if engine:
+        info[OptionsWidget.ENGINE] = engine
+    if precision is not None:
+        info[OptionsWidget.PRECISION] = str(precision)
 
 
 def process_file(
@@ -40,21 +170,42 @@ def process_file(
     print_usage,
     conduct_sensitivity_analysis,
     conduct_tolerance_contribution,
+    sampler=None,
+    conduct_yield_analysis=False,
+    seed=None,
+    manifest_file=None,
+    use_cache=True,
+    exports=(),
+    samples_file=None,
+    engine=None,
+    precision=None,
 ):
     try:
         info = open_from_name(input_file)
-        info[OptionsWidget.WHERE_USED] = print_usage
-        info[OptionsWidget.SENSITIVITY] = conduct_sensitivity_analysis
-        info[OptionsWidget.CONTRIBUTIONS] = conduct_tolerance_contribution
-
-        SP = StackParser()
-        SP.parse(
-            constants_data=info[DataWidget.CONSTANTS],
-            dimensions_data=info[DataWidget.DIMENSIONS],
-            expressions_data=info[DataWidget.EXPRESSIONS],
+        set_options(
+            info,
+            print_usage,
+            conduct_sensitivity_analysis,
+            conduct_tolerance_contribution,
+            sampler,
+            conduct_yield_analysis,
+            seed,
+            engine,
+            precision,
         )
 
-        print_lines = format_text(SP, info)
+        # cached results only keep a summary of their samples, so exported samples are computed
+        use_cache = use_cache and not samples_file
+        SP = parse_info(info, ResultCache() if use_cache else None)
+        results = analyze_info(SP, info)
+
+        with open_exports(exports) as writers:
+            export_results(results, writers, source=input_file)
+
+        print_lines = format_text(results.compute(), info)
+
+        if samples_file:
+            save_samples(results, samples_file)
 
         if output_file:
             with open(output_file, "w", encoding="utf-8") as out_file:
@@ -65,6 +216,12 @@ def process_file(
             for line in print_lines:
                 print(line)
 
+        # record the seed actually used, so that the run can be regenerated
+        if manifest_file is None and output_file:
+            manifest_file = get_manifest_name(output_file)
+        if manifest_file:
+            save_manifest(manifest_file, SP.manifest())
+
     except FileNotFoundError:
         logging.error(f"Error: The file '{input_file}' was not found.", exc_info=True)
         print(f"Error: The file '{input_file}' was not found.")
@@ -73,6 +230,258 @@ def process_file(
         print(f"An error occurred: {e}")
 
 
+@contextmanager
+def open_exports(exports):
+    # writers of the (file name, ExportType) pairs of a run
+    with ExitStack() as stack:
+        yield [
+            ResultWriter(
+                stack.enter_context(open(file_name, "w", encoding="utf-8", newline="")),
+                export_type,
+            )
+            for file_name, export_type in exports
+        ]
+
+
+# Outputs written next to each input file by batch runs, in place of its suffix
+BATCH_TEXT_SUFFIX = ".report.txt"
+BATCH_PDF_SUFFIX = ".report.pdf"
+BATCH_RESULTS_SUFFIX = ".results.jsonl"
+
+# Results of the files of a batch run
+BATCH_PASS = "PASS"
+BATCH_FAIL = "FAIL"
+BATCH_ERROR = "ERROR"
+
+
+def get_batch_output_name(input_file, suffix):
+    return os.path.splitext(input_file)[0] + suffix
+
+
+def is_batch_output(file_name):
+    return file_name.endswith(
+        (BATCH_TEXT_SUFFIX, BATCH_PDF_SUFFIX, BATCH_RESULTS_SUFFIX, ".manifest.json")
+    )
+
+
+def expand_batch(patterns=(), list_file=None):
+    """
+    Finds the input files of a batch run.
+
+    Parameters:
+    patterns (list[str]): Input files or glob patterns, where ** matches any subdirectories.
+    list_file (str): A file listing input files or glob patterns, one per line, relative to
+        the directory of the list file. Blank lines and lines starting with # are skipped.
+
+    Returns:
+    list[str]
+        The matching files in order of the patterns, without repeats or the outputs of earlier
+        batch runs.
+    """
+    patterns = list(patterns)
+    if list_file is not None:
+        directory = os.path.dirname(list_file)
+        with open(list_file, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(os.path.join(directory, line))
+
+    input_files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches and not glob.has_magic(pattern):
+            # missing files are reported as errors of the run
+            matches = [pattern]
+        for match in matches:
+            if os.path.isdir(match) or is_batch_output(match):
+                continue
+            if match not in input_files:
+                input_files.append(match)
+    return input_files
+
+
+def process_batch_file(input_file, options, use_cache=False, write_pdf=True):
+    """
+    Processes one input file of a batch run, writing its outputs next to it.
+
+    Errors are logged and reported in the returned row instead of raised, so that one failing
+    file does not stop the others.
+
+    Parameters:
+    input_file (str): The input file.
+    options (dict): Keyword arguments of set_options overriding the options of the file.
+    use_cache (bool): Reuse results cached by earlier runs.
+    write_pdf (bool): Write a PDF report as well as the text report and exported results.
+
+    Returns:
+    dict
+        The row of the file in the batch table: file, result, number of expressions, keys of
+        the expressions out of bounds, error message and seconds taken, with the export
+        records of its expressions.
+    """
+    start = time.perf_counter()
+    row = _batch_row(input_file)
+
+    try:
+        info = open_from_name(input_file)
+        info["SAVE_FILE"] = os.path.abspath(input_file)
+        set_options(info, **options)
+
+        SP = parse_info(info, ResultCache() if use_cache else None)
+        results = analyze_info(SP, info).compute()
+
+        manifest = SP.manifest()
+        records = [
+            export_record(R, manifest, input_file) for R in results.expressions.values()
+        ]
+        results_file = get_batch_output_name(input_file, BATCH_RESULTS_SUFFIX)
+        with open(results_file, "w", encoding="utf-8") as out_file:
+            writer = ResultWriter(out_file, ExportType.JSON_LINES)
+            for record in records:
+                writer.write(record)
+
+        text_file = get_batch_output_name(input_file, BATCH_TEXT_SUFFIX)
+        with open(text_file, "w", encoding="utf-8") as out_file:
+            for line in format_text(results, info):
+                out_file.write(line + "\n")
+        save_manifest(get_manifest_name(text_file), manifest)
+
+        if write_pdf:
+            from tolstack.gui.FormatPDF import format_pdf
+
+            format_pdf(
+                output_filename=get_batch_output_name(input_file, BATCH_PDF_SUFFIX),
+                results=results,
+                info=info,
+            )
+
+        row["expressions"] = len(results.expressions)
+        row["failed"] = [
+            R.key
+            for R in results.expressions.values()
+            if not (R.lower_pass and R.upper_pass)
+        ]
+        row["result"] = BATCH_FAIL if row["failed"] else BATCH_PASS
+        row["records"] = records
+    except Exception as e:
+        # the message is reported in the batch table
+        logging.debug(f"An error occurred in {input_file}: {e}", exc_info=True)
+        row["error"] = str(e) or type(e).__name__
+
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def _batch_row(input_file):
+    # row of a file that has not been processed
+    return {
+        "file": input_file,
+        "result": BATCH_ERROR,
+        "expressions": None,
+        "failed": [],
+        "error": None,
+        "seconds": None,
+        "records": [],
+    }
+
+
+def _init_batch_worker(write_pdf):
+    # import the PDF modules once per worker rather than with its first file
+    if write_pdf:
+        import tolstack.gui.FormatPDF
+
+
+def process_batch(
+    input_files, options, use_cache=False, write_pdf=True, jobs=None, exports=()
+):
+    """
+    Processes the input files of a batch run across a pool of worker processes.
+
+    Each worker imports the engine once and processes many files, so only the first file of
+    each worker pays for starting the interpreter and importing. Runs share the result
+    cache, whose writes are atomic, so workers never read each other's partial results.
+
+    Parameters:
+    input_files (list[str]): The input files, see expand_batch.
+    options (dict): Keyword arguments of set_options overriding the options of the files.
+    use_cache (bool): Reuse results cached by earlier runs.
+    write_pdf (bool): Write PDF reports as well as the text reports and exported results.
+    jobs (int): Number of worker processes, defaults to the number of CPUs. With 1, the
+        files are processed in this process.
+    exports (list[tuple[str, ExportType]]): Files to save the export records of all input
+        files to, written as each file is done.
+
+    Returns:
+    list[dict]
+        The rows of the batch table, in order of the input files, see process_batch_file.
+    """
+    if jobs is None:
+        jobs = min(os.cpu_count() or 1, len(input_files))
+
+    rows = []
+    with open_exports(exports) as writers:
+        for row in _process_batch_rows(
+            input_files, options, use_cache, write_pdf, jobs
+        ):
+            for record in row["records"]:
+                for writer in writers:
+                    writer.write(record)
+            rows.append(row)
+    return rows
+
+
+def _process_batch_rows(input_files, options, use_cache, write_pdf, jobs):
+    # rows of the input files in order, as they are done
+    if jobs <= 1:
+        for input_file in input_files:
+            yield process_batch_file(input_file, options, use_cache, write_pdf)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_batch_worker, initargs=(write_pdf,)
+    ) as pool:
+        futures = [
+            pool.submit(process_batch_file, input_file, options, use_cache, write_pdf)
+            for input_file in input_files
+        ]
+        for input_file, future in zip(input_files, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # the worker itself failed, such as by running out of memory
+                logging.debug(f"An error occurred in {input_file}: {e}", exc_info=True)
+                row = _batch_row(input_file)
+                row["error"] = str(e) or type(e).__name__
+                yield row
+
+
+def format_batch_table(rows, cache_directory=None):
+    width = max([len("FILE")] + [len(row["file"]) for row in rows])
+
+    print_lines = [f"{'FILE':<{width}}  {'RESULT':<6}{'EXPRS':>6}{'TIME':>8}  DETAILS"]
+    for row in rows:
+        expressions = "" if row["expressions"] is None else row["expressions"]
+        seconds = "" if row["seconds"] is None else f"{row['seconds']:.1f}s"
+        details = row["error"] if row["error"] else ", ".join(row["failed"])
+        print_lines.append(
+            f"{row['file']:<{width}}  {row['result']:<6}{expressions:>6}{seconds:>8}  {details}"
+        )
+
+    counts = {
+        result: sum(row["result"] == result for row in rows)
+        for result in (BATCH_PASS, BATCH_FAIL, BATCH_ERROR)
+    }
+    print_lines.append("")
+    print_lines.append(
+        f"{len(rows)} files: {counts[BATCH_PASS]} passed, {counts[BATCH_FAIL]} out of bounds, "
+        + f"{counts[BATCH_ERROR]} failed to process."
+    )
+    if cache_directory is not None:
+        print_lines.append(f"Results cached in {cache_directory}.")
+    return print_lines
+
+
 if __name__ == "__main__":
     # Create the parser
     parser = argparse.ArgumentParser(
@@ -82,11 +491,57 @@ if __name__ == "__main__":
         "filename", type=str, nargs="?", help="The input file to process."
     )
     parser.add_argument(
-        "-o", "--output", type=str, help="The file to save the human-readable output."
+        "-o",
+        "--output",
+        type=str,
+        help="The file to save the human-readable output, or the batch table of batch runs.",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        type=str,
+        nargs="+",
+        metavar="PATTERN",
+        help="Process every input file matching the glob patterns, saving the text report, "
+        + "PDF report and summary of each next to it",
+    )
+    parser.add_argument(
+        "--batch-list",
+        type=str,
+        metavar="FILE",
+        help="A file listing input files or glob patterns, one per line, to process as with --batch",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes of batch runs, by default the number of CPUs",
+    )
+    parser.add_argument(
+        "--no-pdf",
+        action="store_true",
+        help="Save only the text reports and summaries of batch runs",
+    )
+    parser.add_argument(
+        "-c",
+        "--csv-output",
+        type=str,
+        help="The file to save the results of each expression as CSV, of all files of batch runs",
+    )
+    parser.add_argument(
+        "-J",
+        "--json-output",
+        type=str,
+        help="The file to save the results of each expression as JSON Lines, of all files of "
+        + "batch runs",
+    )
+    parser.add_argument(
+        "--samples",
+        type=str,
+        metavar="PATH",
+        help="The directory of .npy files, or .npz archive, to save the Monte Carlo samples of "
+        + "the dimensions and expressions",
     )
-    # parser.add_argument(
-    #     "-c", "--csv-output", type=str, help="The file to save a CSV report."
-    # )
     parser.add_argument(
         "-U",
         "--usage",
@@ -105,6 +560,56 @@ if __name__ == "__main__":
         action="store_true",
         help="Conduct tolerance contribution analysis",
     )
+    parser.add_argument(
+        "-Y",
+        "--yield-analysis",
+        action="store_true",
+        help="Estimate the out of bounds rate of each expression in PPM",
+    )
+
+    parser.add_argument(
+        "--sampler",
+        choices=[get_code_from_sampler(sampler) for sampler in SamplerType],
+        help="Sampling method for Monte Carlo analysis, overriding the file options",
+    )
+
+    parser.add_argument(
+        "--engine",
+        choices=[get_code_from_engine(engine) for engine in EngineType],
+        help="Evaluation engine of statistical expressions, falling back to Monte Carlo for "
+        + "expressions it cannot evaluate, overriding the file options",
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=float,
+        metavar="RTOL",
+        help="Sample each expression until the standard error of its reported limits is below "
+        + "RTOL times its tolerance band, overriding the file options",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Random seed for Monte Carlo analysis, overriding the file options",
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        help="The file to save the run manifest, by default next to the output file",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse and keep results in the result cache in batch runs, which are not cached "
+        + "by default",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every expression instead of reusing results cached by earlier runs, drawing a new seed for unseeded runs",
+    )
 
     # Parse the arguments
     args = parser.parse_args()
@@ -114,6 +619,58 @@ if __name__ == "__main__":
     print_usage = args.usage
     conduct_sensitivity_analysis = args.sensitivity_analysis
     conduct_tolerance_contribution = args.tolerance_contribution
+    sampler = args.sampler
+    conduct_yield_analysis = args.yield_analysis
+    seed = args.seed
+    manifest_file = args.manifest
+    use_cache = not args.no_cache
+
+    exports = []
+    if args.csv_output:
+        exports.append((args.csv_output, ExportType.CSV))
+    if args.json_output:
+        exports.append((args.json_output, ExportType.JSON_LINES))
+
+    if args.batch or args.batch_list:
+        # each file of a batch saves its own reports and manifest next to it
+        if input_file is not None:
+            parser.error("a filename cannot be given with --batch or --batch-list")
+        if manifest_file:
+            parser.error("--manifest cannot be used with --batch or --batch-list")
+        if args.samples:
+            parser.error("--samples cannot be used with --batch or --batch-list")
+
+        input_files = expand_batch(args.batch or [], args.batch_list)
+        options = dict(
+            print_usage=print_usage,
+            conduct_sensitivity_analysis=conduct_sensitivity_analysis,
+            conduct_tolerance_contribution=conduct_tolerance_contribution,
+            sampler=sampler,
+            conduct_yield_analysis=conduct_yield_analysis,
+            seed=seed,
+            engine=args.engine,
+            precision=args.precision,
+        )
+        rows = process_batch(
+            input_files, options, args.cache, not args.no_pdf, args.jobs, exports
+        )
+
+        print_lines = format_batch_table(
+            rows, ResultCache().directory if args.cache else None
+        )
+        if output_file:
+            with open(output_file, "w", encoding="utf-8") as out_file:
+                for line in print_lines:
+                    out_file.write(line + "\n")
+        else:
+            for line in print_lines:
+                print(line)
+
+        # out of bounds results are reported in the table, only errors fail the run
+        sys.exit(1 if any(row["result"] == BATCH_ERROR for row in rows) else 0)
+
+    if input_file is None:
+        parser.error("a filename or --batch is required")
 
     process_file(
         input_file,
@@ -121,4 +678,13 @@ if __name__ == "__main__":
         print_usage,
         conduct_sensitivity_analysis,
         conduct_tolerance_contribution,
+        sampler,
+        conduct_yield_analysis,
+        seed,
+        manifest_file,
+        use_cache,
+        exports,
+        args.samples,
+        args.engine,
+        args.precision,
     )
@@ -0,0 +1,104 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from tolstack.compute_stack import parse_info, analyze_info
+
+from tolstack.gui.FormatText import format_text_header, format_expression_block
+
+
+class ComputeWorker(QThread):
+    """
+    Runs an analysis off the GUI thread, one expression at a time.
+
+    The analysis is parsed (or updated, given the live parser of the GUI), then the result of
+    each expression is computed with the analyses selected in the options. For text output, the
+    header and then the finished block of each expression are emitted as they are ready, so the
+    results pane fills in while later expressions are computed. For PDF output, the document is
+    rendered from the results once all expressions are computed. Given the results of an
+    earlier run for the same information, nothing is parsed or computed again.
+
+    Cancellation is cooperative: requestInterruption stops the run before the next expression.
+    The parser is left consistent, keeping the results computed so far for the next run.
+
+    Signals:
+    --------
+    block_ready(list)
+        Lines of the header, then of each expression, for text output.
+    progress(int, int)
+        Number of steps done and total number of steps.
+    succeeded(object)
+        The AnalysisResult, after every expression was computed and the output produced.
+    cancelled(object)
+        The partial AnalysisResult, or None if the run was cancelled before parsing finished.
+    failed(object)
+        The exception that stopped the run.
+    """
+
+    block_ready = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(object)
+    cancelled = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(
+        self,
+        info,
+        result_cache=None,
+        parser=None,
+        pdf_filename=None,
+        parent=None,
+        results=None,
+    ):
+        super().__init__(parent)
+
+        self.info = info
+        self.result_cache = result_cache
+        self.parser = parser
+        self.pdf_filename = pdf_filename
+        self.results = results
+
+    def run(self):
+        results = self.results
+        if results is None:
+            try:
+                parser = parse_info(self.info, self.result_cache, self.parser)
+                results = analyze_info(parser, self.info)
+            except Exception as e:
+                self.failed.emit(e)
+                return
+
+        try:
+            # rendering the PDF takes about as long as computing an expression
+            keys = list(results.parser.expressions)
+            total = len(keys) + (self.pdf_filename is not None)
+            self.progress.emit(0, total)
+
+            if self.pdf_filename is None:
+                self.block_ready.emit(format_text_header(results, self.info))
+
+            for done, key in enumerate(keys, start=1):
+                if self.isInterruptionRequested():
+                    self.cancelled.emit(results)
+                    return
+
+                result = results.expression(key)
+                if self.pdf_filename is None:
+                    self.block_ready.emit(format_expression_block(result, self.info))
+                self.progress.emit(done, total)
+            results.compute()
+
+            if self.pdf_filename is not None:
+                if self.isInterruptionRequested():
+                    self.cancelled.emit(results)
+                    return
+
+                from tolstack.gui.FormatPDF import format_pdf
+
+                format_pdf(
+                    output_filename=self.pdf_filename, results=results, info=self.info
+                )
+                self.progress.emit(total, total)
+        except Exception as e:
+            self.failed.emit(e)
+            return
+
+        self.succeeded.emit(results)
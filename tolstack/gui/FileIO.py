@@ -7,13 +7,51 @@ from tolstack.gui.GUITypes import (
     get_default_options,
 )
 
-from distutils.util import strtobool
 from packaging.version import Version
 
+import json
 import re
 import os
 
 
+# as distutils.util.strtobool, without importing distutils
+def _strtobool(text):
+    value = text.strip().lower()
+    if value in ("y", "yes", "t", "true", "on", "1"):
+        return True
+    if value in ("n", "no", "f", "false", "off", "0"):
+        return False
+    raise ValueError(f"invalid truth value {text!r}")
+
+
+def _options_without(*added):
+    return [key for key in OptionsWidget if key not in added]
+
+
+# Options written by older file format versions whose options line can still be read, in file
+# order. Options added since then take their default values.
+LEGACY_OPTIONS = {
+    "4.0": _options_without(
+        OptionsWidget.SAMPLER,
+        OptionsWidget.YIELD,
+        OptionsWidget.SEED,
+        OptionsWidget.ENGINE,
+        OptionsWidget.PRECISION,
+    ),
+    "5.0": _options_without(
+        OptionsWidget.YIELD,
+        OptionsWidget.SEED,
+        OptionsWidget.ENGINE,
+        OptionsWidget.PRECISION,
+    ),
+    "6.0": _options_without(
+        OptionsWidget.SEED, OptionsWidget.ENGINE, OptionsWidget.PRECISION
+    ),
+    "7.0": _options_without(OptionsWidget.ENGINE, OptionsWidget.PRECISION),
+    "8.0": _options_without(OptionsWidget.PRECISION),
+}
+
+
 def save_to_name(file_name, info):
     if file_name:
         with open(file_name, "w", encoding="utf-8") as file:
@@ -69,10 +107,22 @@ def open_from_name(file_name):
         raise ValueError("Attempting to open file but no version information present.")
 
     default_options = False
+    option_keys = list(OptionsWidget)
     if Version(file_format_version) < Version(AppConfig.file_format_version):
-        if file_format_version in ["2.0", "3.0"] and AppConfig.file_format_version in [
+        if file_format_version in LEGACY_OPTIONS:
+            option_keys = LEGACY_OPTIONS[file_format_version]
+            info.update(get_default_options())
+        elif file_format_version in [
+            "2.0",
+            "3.0",
+        ] and AppConfig.file_format_version in [
             "3.0",
             "4.0",
+            "5.0",
+            "6.0",
+            "7.0",
+            "8.0",
+            "9.0",
         ]:
             default_options = True
             info.update(get_default_options())
@@ -97,11 +147,11 @@ def open_from_name(file_name):
 
         if line.startswith("*OPTIONS") and not default_options:
             options = line.replace("*OPTIONS,", "").split(
-                ",", maxsplit=len(OptionsWidget) - 1
+                ",", maxsplit=len(option_keys) - 1
             )
-            for idx, key in enumerate(OptionsWidget):
+            for idx, key in enumerate(option_keys):
                 if is_boolean_option(key):
-                    info[key] = True if strtobool(options[idx]) else False
+                    info[key] = _strtobool(options[idx])
                 else:
                     info[key] = options[idx]
         elif line.startswith("*ANALYSISINFO"):
@@ -148,6 +198,21 @@ def open_from_name(file_name):
     return info
 
 
+def get_manifest_name(file_name):
+    return f"{file_name}.manifest.json"
+
+
+def save_manifest(file_name, manifest):
+    with open(file_name, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+        file.write("\n")
+
+
+def open_manifest(file_name):
+    with open(file_name, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
 def get_absolute_path(file_str, relative_str):
     # Get the directory name of the file (i.e., the folder containing the file)
     parent_directory = os.path.dirname(file_str)
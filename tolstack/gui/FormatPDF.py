@@ -9,7 +9,7 @@ from math import isinf, isclose
 
 # Third-Party Library Imports
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet
@@ -31,25 +31,28 @@ from tolstack.gui.GUITypes import AnalysisWidget, DataWidget, OptionsWidget
 from tolstack.gui.CustomPDFElements import TitleFlowable
 from tolstack.gui.PDFStyles import PDFStyles, update_paragraph_style
 from tolstack.StackParser import StackParser
+from tolstack.StackAnalysis import AnalysisResult, ExpressionResult
 from tolstack.gui.FormatText import format_shortest
 from tolstack.StackTypes import get_code_from_dist
 from tolstack.StackExpr import StackExpr
 from tolstack.StackDim import StackDim
+from tolstack.StackYield import CONFIDENCE
 
 # TODO: imports only for debugging, remove later
 from tolstack.gui.FileIO import open_from_name, get_absolute_path
 
 
 # Primary function to format and generate the PDF
-def format_pdf(output_filename: str, parser: StackParser, info):
+def format_pdf(output_filename: str, results: AnalysisResult, info):
     doc = SimpleDocTemplate(output_filename, pagesize=letter)
 
-    contents = create_content_elements(parser, info)
+    contents = create_content_elements(results, info)
 
     doc.build(contents)
 
 
-def create_content_elements(parser: StackParser, info):
+def create_content_elements(results: AnalysisResult, info):
+    parser = results.parser
     contents = []
 
     # Generate top matter
@@ -77,14 +80,12 @@ def create_content_elements(parser: StackParser, info):
 
     # Expressions
     append_or_extend(contents, PageBreak())
-    append_or_extend(contents, create_expression_details(parser, info))
+    append_or_extend(contents, create_expression_details(results, info))
 
     # DEBUG
-    # expr = parser.expressions["E1"]
-    # value = expr.evaluate()
-    # append_or_extend(contents, create_tolerance_table(expr, value))
-    # append_or_extend(contents, create_expression_details(parser, info))
-    # append_or_extend(contents, create_single_expression(parser.expressions["E6"], info))
+    # append_or_extend(contents, create_tolerance_table(results.expressions["E1"]))
+    # append_or_extend(contents, create_expression_details(results, info))
+    # append_or_extend(contents, create_single_expression(results.expressions["E6"], info))
 
     # append_or_extend(
     #     contents, generate_center_bar_image(0.95, width=3 * inch, height=40)
@@ -420,18 +421,18 @@ def create_expression_summary(parser: StackParser, info):
     return elements
 
 
-def create_expression_details(parser: StackParser, info):
+def create_expression_details(results: AnalysisResult, info):
     elements = []
 
-    for E in parser.expressions.values():
-        append_or_extend(elements, create_single_expression(E, info))
+    for R in results.expressions.values():
+        append_or_extend(elements, create_single_expression(R, info))
 
     return elements
 
 
-def create_single_expression(expr: StackExpr, info):
+def create_single_expression(result: ExpressionResult, info):
+    expr = result.expr
     elements = []
-    value = expr.evaluate()
     image_search_path = get_absolute_path(
         info["SAVE_FILE"], info[OptionsWidget.IMAGE_FOLDER]
     )
@@ -454,19 +455,18 @@ def create_single_expression(expr: StackExpr, info):
             pass # Just skip image if not present
 
     expression = Paragraph(f"{expr.expr}", PDFStyles["PlainStyle"])
-    expansion = Paragraph(f"{expr.expand()}", PDFStyles["PlainStyle"])
+    expansion = Paragraph(f"{result.expansion}", PDFStyles["PlainStyle"])
     evaluation = Paragraph(f"{expr.method}", PDFStyles["PlainStyle"])
-    nominal = Paragraph(f"{format_shortest(value.nom,3)}")
+    nominal = Paragraph(f"{format_shortest(result.nom,3)}")
 
-    value_table = create_tolerance_table(expr, value)
+    value_table = create_tolerance_table(result)
 
-    lb_table = create_bound_table(expr, value, lower=True)
-    ub_table = create_bound_table(expr, value, lower=False)
+    lb_table = create_bound_table(result, lower=True)
+    ub_table = create_bound_table(result, lower=False)
 
-    if info[OptionsWidget.SHOW_PLOTS]:
+    if info[OptionsWidget.SHOW_PLOTS] and result.histogram is not None:
         graph = generate_dist_plot(
-            expr,
-            value=value,
+            result,
             width=3 * inch,
             height=1 * inch,
             axis_font_size=10,
@@ -519,20 +519,21 @@ def create_single_expression(expr: StackExpr, info):
     output = [expr_group]
 
     if info[OptionsWidget.SENSITIVITY]:
-        s = expr.sensitivities()
-        append_or_extend(output, create_sensitivity_table(expr, s))
+        append_or_extend(output, create_sensitivity_table(expr, result.sensitivities))
 
     if info[OptionsWidget.CONTRIBUTIONS]:
-        c = expr.contributions()
-        append_or_extend(output, create_contribution_table(expr, c))
+        append_or_extend(output, create_contribution_table(expr, result.contributions))
+
+    if info[OptionsWidget.YIELD] and result.yield_estimate is not None:
+        append_or_extend(output, create_yield_table(expr, result.yield_estimate))
 
     return output
 
 
-def create_tolerance_table(expr: StackExpr, value: StackDim) -> Table:
-    center_text = f"{format_shortest(value.center(expr.method),3)}"
-    plus_text = f"{format_shortest(value.upper_tol(expr.method),2)}"
-    minus_text = f"{format_shortest(value.lower_tol(expr.method),2)}"
+def create_tolerance_table(result: ExpressionResult) -> Table:
+    center_text = f"{format_shortest(result.center,3)}"
+    plus_text = f"{format_shortest(result.upper_tol,2)}"
+    minus_text = f"{format_shortest(result.lower_tol,2)}"
 
     center = Paragraph(center_text, PDFStyles["PlainStyle"])
     plus = Paragraph(
@@ -583,12 +584,10 @@ def create_tolerance_table(expr: StackExpr, value: StackDim) -> Table:
     return table
 
 
-def create_bound_table(expr: StackExpr, value: StackDim, lower=True) -> Table:
-    bound = expr.lower if lower else expr.upper
-    actual = value.lower(expr.method) if lower else value.upper(expr.method)
-    meet_req = bound <= actual if lower else actual <= bound
-    if isclose(bound, actual, abs_tol=1e-9):
-        meet_req = True
+def create_bound_table(result: ExpressionResult, lower=True) -> Table:
+    bound = result.expr.lower if lower else result.expr.upper
+    actual = result.lower if lower else result.upper
+    meet_req = result.lower_pass if lower else result.upper_pass
 
     text1 = "NONE" if isinf(bound) else f"{format_shortest(bound,4)}"
     para1 = Paragraph(
@@ -709,10 +708,38 @@ def create_contribution_table(E: StackExpr, contributions):
     return KeepTogether(elements)
 
 
+def create_yield_table(E: StackExpr, estimate):
+    elements = []
+
+    elements.append(Spacer(0, 3))
+    elements.append(Paragraph("Yield:", PDFStyles["ExpressionSubheadStyle"]))
+
+    lower, upper = estimate.interval()
+    data = [
+        ["Out of bounds:", f"{estimate.ppm:.4g} PPM"],
+        [f"{CONFIDENCE:.0%} CI:", f"{lower:.4g} to {upper:.4g} PPM"],
+    ]
+    style = TableStyle(
+        [
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 0),
+            ("LEFTPADDING", (0, 0), (0, -1), 30),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
+            ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ]
+    )
+    col_widths = [1.05 * inch, "*"]
+    table = Table(data, colWidths=col_widths)
+    table.setStyle(style)
+    elements.append(table)
+
+    return KeepTogether(elements)
+
+
 # Helper function to convert a plot into an image suitable for ReportLab
 def generate_dist_plot(
-    expr: StackExpr,
-    value: StackDim = None,
+    result: ExpressionResult,
     width=3 * inch,
     height=1 * inch,
     axis_font_size=10,
@@ -723,21 +750,21 @@ def generate_dist_plot(
     pixel_scale = dpi / inch
 
     # Extracting data for points and statistical lines
-    if value is None:
-        value = expr.evaluate()
+    expr = result.expr
 
-    points = value.dist().flatten()
-    l = value.lower(method=expr.method)
+    l = result.lower
     lb = expr.lower
-    m = value.center(method=expr.method)
+    m = result.center
     ub = expr.upper
-    u = value.upper(method=expr.method)
+    u = result.upper
 
     # Creating the plot with specified dimensions and font sizes
-    fig, ax = plt.subplots(
+    fig = Figure(
         figsize=((width / inch) * pixel_scale, (height / inch) * pixel_scale), dpi=dpi
     )
-    ax.hist(points, bins=71, color="lightgrey", edgecolor="none")
+    ax = fig.subplots()
+    counts, edges = result.histogram
+    ax.hist(edges[:-1], bins=edges, weights=counts, color="lightgrey", edgecolor="none")
 
     # Drawing vertical lines at specified points with adjustable line weight
     ax.axvline(l, color="black", linestyle="--", linewidth=line_weight)
@@ -809,12 +836,11 @@ def generate_dist_plot(
 
     # Adjust layout to ensure the labels are not cut off
     # TODO: https://github.com/lemon1324/tolstack/issues/1
-    plt.tight_layout(pad=1.5)
+    fig.tight_layout(pad=1.5)
 
     # Saving the plot to a BytesIO buffer with higher DPI for better quality
     buf = BytesIO()
-    plt.savefig(buf, format="png", dpi=dpi)
-    plt.close(fig)
+    fig.savefig(buf, format="png", dpi=dpi)
 
     buf.seek(0)
     graph = Image(buf, width=width, height=height)
@@ -829,9 +855,10 @@ def generate_center_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
 
     # Creating the plot with specified dimensions and DPI
     pixel_scale = dpi / inch
-    fig, ax = plt.subplots(
+    fig = Figure(
         figsize=(width / inch * pixel_scale, height / inch * pixel_scale), dpi=dpi
     )
+    ax = fig.subplots()
 
     # Set all spines to be invisible
     for spine in ax.spines.values():
@@ -845,7 +872,7 @@ def generate_center_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
     # Draw the bar using axhspan
     left = min(0, val)
     right = max(0, val)
-    plt.fill((left, right, right, left), (0.15, 0.15, 0.85, 0.85), "#56B4E9", alpha=0.5)
+    ax.fill((left, right, right, left), (0.15, 0.15, 0.85, 0.85), "#56B4E9", alpha=0.5)
     #     0.15,
     #     0.85,
     #     xmin=left,
@@ -861,12 +888,11 @@ def generate_center_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
     ax.set_ylim((0, 1))
 
     # Adjust layout to ensure the plot looks nice
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Saving the plot to a BytesIO buffer
     buf = BytesIO()
-    plt.savefig(buf, format="png", dpi=dpi)
-    plt.close(fig)
+    fig.savefig(buf, format="png", dpi=dpi)
     buf.seek(0)
 
     bar = Image(buf, width=width, height=height)
@@ -880,9 +906,10 @@ def generate_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
 
     # Creating the plot with specified dimensions and DPI
     pixel_scale = dpi / inch
-    fig, ax = plt.subplots(
+    fig = Figure(
         figsize=(width / inch * pixel_scale, height / inch * pixel_scale), dpi=dpi
     )
+    ax = fig.subplots()
 
     # Set all spines to be invisible
     for spine in ax.spines.values():
@@ -895,7 +922,7 @@ def generate_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
     # Draw the bar using axhspan
     left = 0
     right = val
-    plt.fill((left, right, right, left), (0.15, 0.15, 0.85, 0.85), "#56B4E9", alpha=0.5)
+    ax.fill((left, right, right, left), (0.15, 0.15, 0.85, 0.85), "#56B4E9", alpha=0.5)
 
     # Remove x and y axis labels
     ax.set_xticks([])
@@ -903,12 +930,11 @@ def generate_bar_image(val, width=3 * inch, height=1 * inch, dpi=300):
     ax.set_ylim((0, 1))
 
     # Adjust layout to ensure the plot looks nice
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Saving the plot to a BytesIO buffer
     buf = BytesIO()
-    plt.savefig(buf, format="png", dpi=dpi)
-    plt.close(fig)
+    fig.savefig(buf, format="png", dpi=dpi)
     buf.seek(0)
 
     bar = Image(buf, width=width, height=height)
@@ -1073,4 +1099,7 @@ if __name__ == "__main__":
         expressions_data=info[DataWidget.EXPRESSIONS],
     )
 
-    format_pdf(output_filename, SP, info)
+    results = AnalysisResult(
+        SP, sensitivity=True, histograms=info[OptionsWidget.SHOW_PLOTS]
+    ).compute()
+    format_pdf(output_filename, results, info)
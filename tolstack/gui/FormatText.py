@@ -1,7 +1,8 @@
+from tolstack.StackAnalysis import AnalysisResult, ExpressionResult
 from tolstack.StackDim import StackDim
 from tolstack.StackExpr import StackExpr
 from tolstack.StackTypes import get_code_from_dist
-from tolstack.StackParser import StackParser
+from tolstack.StackYield import CONFIDENCE
 
 from tolstack.StackUtils import word_wrap
 
@@ -15,10 +16,20 @@ FORMAT_WIDTH = 80
 
 
 # info as defined by the gui get_info method
-def format_text(parser: StackParser, info):
+def format_text(results: AnalysisResult, info):
+    print_lines = format_text_header(results, info)
+
+    for R in results.expressions.values():
+        print_lines.extend(format_expression_block(R, info))
+
+    return print_lines
+
+
+# everything before the details of each expression, which need no evaluation
+def format_text_header(results: AnalysisResult, info):
     print_lines = []
 
-    value_map = parser.constants | parser.dimensions
+    parser = results.parser
 
     # Print Analysis Info
     print_lines.append(f"{info[AnalysisWidget.TITLE].upper()}")
@@ -57,17 +68,23 @@ def format_text(parser: StackParser, info):
         print_lines.append("\n")
 
         print_lines.append("EXPRESSIONS:")
-        for key, SE in parser.expressions.items():
-            print_lines.append(format_expression(SE))
 
-            if info[OptionsWidget.SENSITIVITY]:
-                s = SE.sensitivities()
-                print_lines.append(format_sensitivity(SE, s))
+    return print_lines
+
+
+# the details of one expression, with the analyses selected in the options
+def format_expression_block(R: ExpressionResult, info):
+    print_lines = [format_expression(R)]
+
+    if info[OptionsWidget.SENSITIVITY]:
+        print_lines.append(format_sensitivity(R.expr, R.sensitivities))
 
-            if info[OptionsWidget.CONTRIBUTIONS]:
-                c = SE.contributions()
-                print_lines.append(format_contribution(SE, c))
-            print_lines[-1] = print_lines[-1] + "\n"
+    if info[OptionsWidget.CONTRIBUTIONS]:
+        print_lines.append(format_contribution(R.expr, R.contributions))
+
+    if info[OptionsWidget.YIELD] and R.yield_estimate is not None:
+        print_lines.append(format_yield(R.expr, R.yield_estimate))
+    print_lines[-1] = print_lines[-1] + "\n"
 
     return print_lines
 
@@ -115,7 +132,9 @@ def format_expression_summary(E: StackExpr):
     return "\n".join(lines)
 
 
-def format_expression(E: StackExpr):
+def format_expression(R: ExpressionResult):
+    E = R.expr
+
     lines = []
     lines.append(word_wrap(f"{E.key:>5}: {E.note}", FORMAT_WIDTH, 7))
     lines.append(
@@ -127,35 +146,30 @@ def format_expression(E: StackExpr):
     )
     lines.append(
         word_wrap(
-            f"{7*' '}Expansion:  {E.expand()}",
+            f"{7*' '}Expansion:  {R.expansion}",
             FORMAT_WIDTH,
             19,
         )
     )
     lines.append(f"{7*' '}Evaluation: {E.method}")
-    _val = E.evaluate()
-    lines.append(f"{7*' '}Nominal: {format_shortest(_val.nom,3):>15}")
+    lines.append(f"{7*' '}Nominal: {format_shortest(R.nom,3):>15}")
     lines.append(
-        f"{7*' '}Value:   {format_shortest(_val.center(E.method),3):>15} {format_shortest(_val.upper_tol(E.method),2)} {format_shortest(_val.lower_tol(E.method),2)}"
+        f"{7*' '}Value:   {format_shortest(R.center,3):>15} {format_shortest(R.upper_tol,2)} {format_shortest(R.lower_tol,2)}"
     )
 
     if not isinf(E.lower) or not isinf(E.upper):
         if not isinf(E.lower):
-            _pass = E.lower <= _val.lower(E.method) or isclose(
-                E.lower, _val.lower(E.method), abs_tol=1e-9
-            )
+            _pass = R.lower_pass
             lines.append(
-                f"{'' if _pass else '***':<9}Lower Bound:{E.lower:10.4g}  {'PASS' if _pass else f'FAIL: {format_shortest(_val.lower(E.method),3)}'}"
+                f"{'' if _pass else '***':<9}Lower Bound:{E.lower:10.4g}  {'PASS' if _pass else f'FAIL: {format_shortest(R.lower,3)}'}"
             )
         else:
             lines.append(f"{9*' '}Lower Bound:{'NONE':>10}  PASS")
 
         if not isinf(E.upper):
-            _pass = E.upper >= _val.upper(E.method) or isclose(
-                E.upper, _val.upper(E.method), abs_tol=1e-9
-            )
+            _pass = R.upper_pass
             lines.append(
-                f"{'' if _pass else '***':<9}Upper Bound:{E.upper:10.4g}  {'PASS' if _pass else f'FAIL: {format_shortest(_val.upper(E.method),3)}'}"
+                f"{'' if _pass else '***':<9}Upper Bound:{E.upper:10.4g}  {'PASS' if _pass else f'FAIL: {format_shortest(R.upper,3)}'}"
             )
         else:
             lines.append(f"{9*' '}Upper Bound:{'NONE':>10}  PASS")
@@ -203,6 +217,17 @@ def format_contribution(E: StackExpr, contributions):
     return "\n".join(lines)
 
 
+def format_yield(E: StackExpr, estimate):
+    lower, upper = estimate.interval()
+
+    lines = []
+    lines.append(f"{7*' '}Yield:")
+    lines.append(f"{'Out of bounds':>16}: {estimate.ppm:>10.4g} PPM")
+    lines.append(f"{f'{CONFIDENCE:.0%} CI':>16}: {lower:>10.4g} to {upper:.4g} PPM")
+
+    return "\n".join(lines)
+
+
 def format_bar(number, width=19) -> str:
     if not 0 <= number <= 1:
         raise ValueError("The number must be in the range [0, 1]")
@@ -20,9 +20,14 @@ class OptionsWidget(Enum):
     WHERE_USED = 2
     SENSITIVITY = 3
     CONTRIBUTIONS = 4
+    YIELD = 5
     UNITS = 50
     MAX_IMG_WIDTH = 51
     MAX_IMG_HEIGHT = 52
+    SAMPLER = 53
+    SEED = 54
+    ENGINE = 55
+    PRECISION = 56
     IMAGE_FOLDER = 100
 
 
@@ -32,6 +37,7 @@ BOOLEAN_OPTIONS = [
     OptionsWidget.WHERE_USED,
     OptionsWidget.SENSITIVITY,
     OptionsWidget.CONTRIBUTIONS,
+    OptionsWidget.YIELD,
 ]
 
 
@@ -47,8 +53,13 @@ def get_default_options():
         OptionsWidget.WHERE_USED: False,
         OptionsWidget.SENSITIVITY: False,
         OptionsWidget.CONTRIBUTIONS: False,
+        OptionsWidget.YIELD: False,
         OptionsWidget.UNITS: "inches",
         OptionsWidget.MAX_IMG_WIDTH: "6",
         OptionsWidget.MAX_IMG_HEIGHT: "4",
+        OptionsWidget.SAMPLER: "random",
+        OptionsWidget.SEED: "",
+        OptionsWidget.ENGINE: "mc",
+        OptionsWidget.PRECISION: "",
         OptionsWidget.IMAGE_FOLDER: "images",
     }
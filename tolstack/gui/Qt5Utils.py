@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QTextEdit, QLineEdit
+from PyQt5.QtWidgets import QTextEdit, QLineEdit, QComboBox
 
 
 def get_widget_text(widget):
@@ -6,6 +6,8 @@ def get_widget_text(widget):
         return widget.text()
     elif isinstance(widget, QTextEdit):
         return widget.toPlainText()
+    elif isinstance(widget, QComboBox):
+        return widget.currentText()
     else:
         return None
 
@@ -15,5 +17,7 @@ def set_widget_text(widget, text):
         widget.setText(text)
     elif isinstance(widget, QTextEdit):
         widget.setPlainText(text)
+    elif isinstance(widget, QComboBox):
+        widget.setCurrentText(text)
     else:
         raise TypeError("Unsupported widget type")
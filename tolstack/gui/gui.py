@@ -7,16 +7,17 @@ import requests
 from pathlib import Path
 from packaging.version import Version
 
-import logging 
+import logging
 
 # Third-Party Library Imports
 import markdown
 from PyQt5.QtCore import Qt, QItemSelectionModel, QSettings, QSize, QPoint, QTimer
-from PyQt5.QtGui import QFont, QKeySequence, QPixmap, QFontDatabase
+from PyQt5.QtGui import QFont, QKeySequence, QPixmap, QFontDatabase, QTextCursor
 from PyQt5.QtWidgets import (
     QAction,
     QApplication,
     QCheckBox,
+    QComboBox,
     QDialog,
     QFileDialog,
     QLabel,
@@ -38,14 +39,25 @@ from PyQt5.QtWidgets import (
     QProgressBar,
 )
 
-
 # Local Application Imports
 from tolstack.AppConfig import AppConfig
-from tolstack.compute_stack import process_info, process_info_to_pdf
-from tolstack.gui.FileIO import save_to_name, open_from_name
+from tolstack.gui.ComputeWorker import ComputeWorker
+from tolstack.gui.FileIO import (
+    save_to_name,
+    open_from_name,
+    save_manifest,
+    get_manifest_name,
+)
 from tolstack.gui.GUIWidgets import *
 from tolstack.gui.GUITypes import *
 from tolstack.gui.Qt5Utils import get_widget_text, set_widget_text
+from tolstack.StackTypes import (
+    EngineType,
+    SamplerType,
+    get_code_from_engine,
+    get_code_from_sampler,
+)
+from tolstack.StackResultCache import ResultCache
 
 
 class MainWindow(QMainWindow):
@@ -64,6 +76,26 @@ class MainWindow(QMainWindow):
 
         self.widgets = dict()
 
+        # manifest of the run shown in the results pane
+        self.manifest = None
+
+        # results kept between updates, exports and sessions
+        self.result_cache = ResultCache()
+
+        # parser of the last update, which later updates only recompute where edited
+        self.parser = None
+
+        # results of the last completed run and the information they were computed for, which
+        # runs for the same information format again instead of computing
+        self.results = None
+        self.results_info = None
+
+        # background run of the analysis, and the run requested while it was busy
+        self.worker = None
+        self.pending_computation = None
+        self.streamed_blocks = 0
+        self.restore_scroll = None
+
         # Central widget
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -197,7 +229,7 @@ class MainWindow(QMainWindow):
         ]
 
         for title, widget_class, key in groups_info:
-            (group_widget, data_widget) = self.create_data_group(
+            group_widget, data_widget = self.create_data_group(
                 title,
                 widget_class(),
             )
@@ -253,6 +285,27 @@ class MainWindow(QMainWindow):
                 OptionsWidget.MAX_IMG_HEIGHT,
                 "4",
             ),
+            ("Random seed (blank for automatic):", QLineEdit, OptionsWidget.SEED, ""),
+            (
+                "Adaptive precision (blank for fixed N):",
+                QLineEdit,
+                OptionsWidget.PRECISION,
+                "",
+            ),
+        ]
+
+        # Define a list of tuples with labeled selection specifications:
+        selections = [
+            (
+                "Sampling method:",
+                OptionsWidget.SAMPLER,
+                [get_code_from_sampler(sampler) for sampler in SamplerType],
+            ),
+            (
+                "Evaluation engine:",
+                OptionsWidget.ENGINE,
+                [get_code_from_engine(engine) for engine in EngineType],
+            ),
         ]
 
         # Checkbox Fields
@@ -281,6 +334,17 @@ class MainWindow(QMainWindow):
             options_layout.addLayout(layout)
             label_widgets.append(label)
 
+        for item_label, widget_key, items in selections:
+            layout = QHBoxLayout()
+            label = QLabel(item_label)
+            self.widgets[widget_key] = QComboBox()
+            self.widgets[widget_key].addItems(items)
+            layout.addWidget(label)
+            layout.addWidget(self.widgets[widget_key])
+
+            options_layout.addLayout(layout)
+            label_widgets.append(label)
+
         # Calculate the maximum label width
         max_label_width = max(label.sizeHint().width() for label in label_widgets)
 
@@ -377,6 +441,7 @@ class MainWindow(QMainWindow):
         self.widgets[OptionsWidget.WHERE_USED] = QCheckBox("Where Used")
         self.widgets[OptionsWidget.SENSITIVITY] = QCheckBox("Sensitivity")
         self.widgets[OptionsWidget.CONTRIBUTIONS] = QCheckBox("Tolerance Contribution")
+        self.widgets[OptionsWidget.YIELD] = QCheckBox("Yield")
 
         # Update button
         update_button = QPushButton("Update")
@@ -387,6 +452,7 @@ class MainWindow(QMainWindow):
         checkbox_layout.addWidget(self.widgets[OptionsWidget.WHERE_USED])
         checkbox_layout.addWidget(self.widgets[OptionsWidget.SENSITIVITY])
         checkbox_layout.addWidget(self.widgets[OptionsWidget.CONTRIBUTIONS])
+        checkbox_layout.addWidget(self.widgets[OptionsWidget.YIELD])
         checkbox_layout.addStretch()
         checkbox_layout.addWidget(update_button)
 
@@ -524,6 +590,12 @@ class MainWindow(QMainWindow):
         self.progress_bar.hide()  # Initially hide the progress bar
         self.statusBar().addPermanentWidget(self.progress_bar)
 
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.setStatusTip("Stop computing results")
+        self.cancel_button.clicked.connect(self.cancel_computation)
+        self.cancel_button.hide()
+        self.statusBar().addPermanentWidget(self.cancel_button)
+
     def add_item(
         self, widget: EditableTableWidget, position: InsertPosition = InsertPosition.ADD
     ):
@@ -540,38 +612,145 @@ class MainWindow(QMainWindow):
             widget.removeRow(row)
 
     def update_results(self):
-        info = self.get_analysis_information()
+        self.start_computation(self.get_analysis_information())
 
-        try:
-            # TODO: progress bar so if this takes a long time it doesn't unnerve user.
-            print_lines = process_info(info)
+    def generate_pdf(self, filename):
+        self.start_computation(self.get_analysis_information(), filename)
+
+    def start_computation(self, info, pdf_filename=None):
+        # runs share the live parser, so only one runs at a time. A request made while busy
+        # waits for the current run, replacing any earlier request, and interrupts a running
+        # update whose results it would replace anyway.
+        if self.worker is not None:
+            self.pending_computation = (info, pdf_filename)
+            if self.worker.pdf_filename is None:
+                self.worker.requestInterruption()
+            return
 
-            saved_scroll = self.text_edit.verticalScrollBar().value()
-            self.text_edit.setPlainText("\n".join(print_lines))
-            self.text_edit.verticalScrollBar().setValue(saved_scroll)
+        # runs update the live parser in place, so results kept for other information no
+        # longer match the parser they would be shown with
+        if info != self.results_info:
+            self.results = None
+            self.results_info = None
 
-            self.statusBar().showMessage("Updated results", 1500)
-        except RuntimeError as r:
-            self.show_non_fatal_error(r)
-        except ValueError as v:
-            self.show_non_fatal_error(v)
-        except Exception as e:
-            self.show_non_fatal_error(e)
+        worker = ComputeWorker(
+            info, self.result_cache, self.parser, pdf_filename, self, self.results
+        )
+        worker.block_ready.connect(lambda lines: self.show_result_block(worker, lines))
+        worker.progress.connect(
+            lambda done, total: self.show_progress(worker, done, total)
+        )
+        worker.succeeded.connect(
+            lambda results: self.computation_succeeded(worker, results)
+        )
+        worker.cancelled.connect(
+            lambda results: self.computation_cancelled(worker, results)
+        )
+        worker.failed.connect(lambda e: self.computation_failed(worker, e))
+        worker.finished.connect(lambda: self.computation_finished(worker))
+
+        self.worker = worker
+        self.streamed_blocks = 0
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        self.statusBar().showMessage(
+            "Computing results..." if pdf_filename is None else "Generating pdf..."
+        )
 
-    def generate_pdf(self, filename):
-        info = self.get_analysis_information()
+        worker.start()
+
+    def cancel_computation(self):
+        self.pending_computation = None
+        if self.worker is not None:
+            self.worker.requestInterruption()
+
+    def stop_computation(self):
+        # a run for the analysis being replaced, whose results are not wanted
+        self.pending_computation = None
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+            self.worker = None
+            self.progress_bar.hide()
+            self.cancel_button.hide()
+            self.statusBar().clearMessage()
+
+    def show_result_block(self, worker, lines):
+        if worker is not self.worker:
+            return
 
-        try:
-            # TODO: progress bar so if this takes a long time it doesn't unnerve user.
-            process_info_to_pdf(info, filename)
+        scroll_bar = self.text_edit.verticalScrollBar()
+        if self.streamed_blocks == 0:
+            # keep the view where it was once the results are long enough again
+            self.restore_scroll = scroll_bar.value()
+            self.text_edit.setPlainText("\n".join(lines))
+        else:
+            cursor = QTextCursor(self.text_edit.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText("\n" + "\n".join(lines))
+        self.streamed_blocks += 1
+
+        if self.restore_scroll is not None:
+            scroll_bar.setValue(self.restore_scroll)
+            if scroll_bar.value() == self.restore_scroll:
+                self.restore_scroll = None
+
+    def show_progress(self, worker, done, total):
+        if worker is not self.worker:
+            return
+
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
 
+    def computation_succeeded(self, worker, results):
+        if worker is not self.worker:
+            return
+
+        self.parser = results.parser
+        self.results = results
+        self.results_info = worker.info
+        if worker.pdf_filename is None:
+            self.manifest = results.parser.manifest()
             self.statusBar().showMessage("Updated results", 1500)
-        except RuntimeError as r:
-            self.show_non_fatal_error(r)
-        except ValueError as v:
-            self.show_non_fatal_error(v)
-        except Exception as e:
-            self.show_non_fatal_error(e)
+        else:
+            save_manifest(
+                get_manifest_name(worker.pdf_filename), results.parser.manifest()
+            )
+            self.statusBar().showMessage(
+                f"Saved output pdf to {worker.pdf_filename}", 3000
+            )
+
+    def computation_cancelled(self, worker, results):
+        if worker is not self.worker:
+            return
+
+        # the results computed so far are kept for the next run
+        if results is not None:
+            self.parser = results.parser
+        if self.pending_computation is None:
+            self.statusBar().showMessage("Cancelled", 1500)
+
+    def computation_failed(self, worker, e):
+        if worker is not self.worker:
+            return
+
+        self.statusBar().clearMessage()
+        self.show_non_fatal_error(e)
+
+    def computation_finished(self, worker):
+        worker.deleteLater()
+        if worker is not self.worker:
+            return
+
+        self.worker = None
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+
+        if self.pending_computation is not None:
+            info, pdf_filename = self.pending_computation
+            self.pending_computation = None
+            self.start_computation(info, pdf_filename)
 
     def new_analysis(self):
         if self.has_unsaved_changes():
@@ -584,7 +763,12 @@ class MainWindow(QMainWindow):
         self.widgets[DataWidget.DIMENSIONS].clear_all_data()
         self.widgets[DataWidget.EXPRESSIONS].clear_all_data()
 
+        self.stop_computation()
         self.text_edit.setText("")
+        self.manifest = None
+        self.parser = None
+        self.results = None
+        self.results_info = None
 
         self.widgets[AnalysisWidget.TITLE].setText("")
         self.widgets[AnalysisWidget.DOCNO].setText("")
@@ -804,7 +988,12 @@ class MainWindow(QMainWindow):
 
         self.store_state_at_save()
 
+        self.stop_computation()
         self.text_edit.setText("")
+        self.manifest = None
+        self.parser = None
+        self.results = None
+        self.results_info = None
 
         # Set the analysis information
         for key in AnalysisWidget:
@@ -874,14 +1063,14 @@ class MainWindow(QMainWindow):
         if file_name:
             if file_name.lower().endswith(".pdf"):
                 self.generate_pdf(file_name)
-                self.statusBar().showMessage(f"Saved output pdf to {file_name}", 3000)
-                # TODO: for pdf output, add progress bar so we don't unnerve the user.
             else:
                 with open(file_name, "w", encoding="utf-8") as file:
                     file.write(self.text_edit.toPlainText())
                     self.statusBar().showMessage(
                         f"Saved output text to {file_name}", 3000
                     )
+                if self.manifest is not None:
+                    save_manifest(get_manifest_name(file_name), self.manifest)
 
     def show_non_fatal_error(self, e):
         # Create a message box
@@ -1067,6 +1256,7 @@ class MainWindow(QMainWindow):
             will_accept = True
 
         if will_accept:
+            self.stop_computation()
             self.save_settings()
             event.accept()
         else:
@@ -1085,7 +1275,7 @@ def run_app():
         if pyi_splash.is_alive():
             pyi_splash.close()
     except ModuleNotFoundError as m:
-        pass # ignore splash not found if run as a script
+        pass  # ignore splash not found if run as a script
     except Exception as e:
         logging.exception(e)
 